@@ -1,12 +1,15 @@
-import openai
+import atexit
+import hashlib
 import os
 from dotenv import load_dotenv
+from llm_client import AsyncLLMClient, DEFAULT_BASE_URL
+from response_cache import ResponseCache
 if os.path.exists('local.env'):
     load_dotenv('local.env')
 else:
     load_dotenv()
 
-openai.api_key = os.getenv("OPENAI_KEY")
+OPENAI_KEY = os.getenv("OPENAI_KEY")
 
 # completion = client.chat.completions.create(
 #   model="gpt-3.5-turbo",
@@ -16,14 +19,7 @@ openai.api_key = os.getenv("OPENAI_KEY")
 #   ]
 # )
 
-def callGPT(user_input):
-    completion = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {
-                "role": "system", 
-                "content": 
-"""
+EDIT_SYSTEM_PROMPT = """
 You are text editor GPT.
 You will be given input in the format text command.
 You must edit the text based on the command. 
@@ -58,34 +54,122 @@ Example 8
 input: 'Hellow how are you?'
 output: 'Hellow how are you?'
 """
-            },
-            {"role": "user", "content": user_input}
-        ]
+
+# Sent with windowed edits, see edit_window.py. The model only sees the end of the dictation.
+EDIT_CONTEXT_PROMPT = """
+The input is the end of a longer text. For context only, the text before it ends with:
+{context}
+Do not return or edit that part, only the input.
+"""
+
+EDIT_MODEL = "gpt-3.5-turbo"
+VISION_MODEL = "gpt-4-turbo"
+
+# Bumps whenever the edit prompt or model changes, so cached edits from an older prompt are never reused.
+PROMPT_VERSION = hashlib.sha256(f"{EDIT_MODEL}\0{EDIT_SYSTEM_PROMPT}\0{EDIT_CONTEXT_PROMPT}".encode("utf-8")).hexdigest()[:16]
+
+edit_cache = ResponseCache(version=PROMPT_VERSION)
+# Queued cache writes are committed on exit.
+atexit.register(edit_cache.close)
+
+# Async client for the event loop, OPENAI_BASE_URL can point it at a local stand-in.
+llm = AsyncLLMClient(OPENAI_KEY, base_url=os.getenv("OPENAI_BASE_URL", DEFAULT_BASE_URL))
+
+
+def edit_messages(user_input, context=None):
+    messages = [{"role": "system", "content": EDIT_SYSTEM_PROMPT}]
+    if context:
+        messages.append({"role": "system", "content": EDIT_CONTEXT_PROMPT.format(context=context)})
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+
+def cache_text(user_input, context=None):
+    # The context changes the answer, so it is part of the cache key.
+    return user_input if not context else f"{context}\0{user_input}"
+
+
+def vision_messages(base64_image, prompt):
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}",
+                    },
+                },
+            ],
+        }
+    ]
+
+
+def _openai():
+    # The SDK is only needed by the blocking calls, so it is imported on first use.
+    import openai
+    openai.api_key = OPENAI_KEY
+    return openai
+
+
+def callGPT(user_input, context=None):
+    cached = edit_cache.get(cache_text(user_input, context))
+    if cached is not None:
+        return cached
+    completion = _openai().ChatCompletion.create(
+        model=EDIT_MODEL,
+        messages=edit_messages(user_input, context)
     )
-    return completion.choices[0].message.content
+    result = completion.choices[0].message.content
+    edit_cache.put(cache_text(user_input, context), result)
+    return result
 
 
 def callVisionGPT(base64_image, prompt):
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo",
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}",
-                        },
-                    },
-                ],
-            }
-        ],
+    response = _openai().ChatCompletion.create(
+        model=VISION_MODEL,
+        messages=vision_messages(base64_image, prompt),
         max_tokens=300,
     )
     return response.choices[0].message.content
 
+
+async def acallGPT(user_input, context=None, timeout=None):
+    """
+    Non-blocking callGPT for the event loop. Cancelling the task aborts the request.
+    """
+    cached = edit_cache.get(cache_text(user_input, context))
+    if cached is not None:
+        return cached
+    result = await llm.chat(edit_messages(user_input, context), EDIT_MODEL, timeout=timeout)
+    edit_cache.put(cache_text(user_input, context), result)
+    return result
+
+
+async def astreamGPT(user_input, context=None, timeout=None):
+    """
+    Streaming acallGPT. Yields the edited text accumulated so far as tokens arrive,
+    a cached response is yielded in one piece.
+    """
+    cached = edit_cache.get(cache_text(user_input, context))
+    if cached is not None:
+        yield cached
+        return
+    result = ""
+    async for delta in llm.stream_chat(edit_messages(user_input, context), EDIT_MODEL, timeout=timeout):
+        result += delta
+        yield result
+    edit_cache.put(cache_text(user_input, context), result)
+
+
+async def acallVisionGPT(base64_image, prompt, timeout=None):
+    """
+    Non-blocking callVisionGPT for the event loop. Cancelling the task aborts the request.
+    """
+    return await llm.chat(vision_messages(base64_image, prompt), VISION_MODEL, timeout=timeout, max_tokens=300)
+
+
 # print(callGPT())
 
 
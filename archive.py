@@ -0,0 +1,343 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import wave
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from session_search import ensure_index, search
+from util import MappedWav
+
+ARCHIVE_DIRECTORY = "logs/archive"
+MANIFEST_NAME = "manifest.sqlite3"
+# Where the batch and benchmark tools find the archived sessions, see SessionArchive.recordings.
+RECORDINGS_DIRECTORY = "recordings"
+
+# pydub export format for the audio, needs ffmpeg. "wav" keeps the audio uncompressed.
+DEFAULT_CODEC = "flac"
+
+# Legacy log names: logs/<date>/<HH-MM>_<satisfaction>-<TitleCasedTranscript>.json, or older
+# ones without a date directory and satisfaction flag.
+_LEGACY_NAME = re.compile(r"^(?P<time>\d{2}-\d{2})_(?:(?P<satisfaction>[^-]{0,4})-)?")
+_LEGACY_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+SESSION_COLUMNS = (
+    "id", "created", "provider", "satisfaction", "duration", "channels", "sample_rate", "sample_width",
+    "codec", "audio", "audio_bytes", "original_bytes", "transcript", "source",
+)
+
+
+def audio_hash(wav):
+    """
+    sha256 of the sample data and format of a MappedWav, the archive name of its audio.
+    """
+    digest = hashlib.sha256(f"{wav.channels}:{wav.sample_rate}:{wav.sample_width}:".encode("ascii"))
+    digest.update(wav.data)
+    return digest.hexdigest()
+
+
+def session_hash(audio_id, created, source):
+    """
+    Id of one archived session: its audio hash together with when it was recorded and
+    where it came from, so the same audio recorded or migrated twice keeps both records.
+    """
+    return hashlib.sha256(f"{audio_id}:{created}:{source or ''}".encode("utf-8")).hexdigest()
+
+
+def compress(wav_filename, target_base, codec=DEFAULT_CODEC):
+    """
+    Encodes a WAV file with pydub to `target_base + "." + codec`. Falls back to copying
+    the WAV when pydub or ffmpeg is missing. Returns (filename, codec).
+    """
+    if codec != "wav":
+        try:
+            from pydub import AudioSegment
+
+            target = f"{target_base}.{codec}"
+            AudioSegment.from_wav(wav_filename).export(target, format=codec)
+            return target, codec
+        except Exception as e:
+            print(f"🔴 ERROR: Could not encode {wav_filename} as {codec}, keeping it as WAV. {e}")
+    target = f"{target_base}.wav"
+    with open(wav_filename, "rb") as source, open(target, "wb") as f:
+        while True:
+            block = source.read(1 << 20)
+            if not block:
+                break
+            f.write(block)
+    return target, "wav"
+
+
+class SessionArchive:
+    """
+    Compressed, content-addressed store for recorded dictation sessions.
+
+    Audio is encoded once and stored as `audio/<hash[:2]>/<hash>.<codec>`, named after
+    the sha256 of its samples, so the same recording is never stored twice and names
+    never collide. One SQLite manifest holds everything else: time, provider,
+    satisfaction, duration, format, sizes and the full transcript. Sessions that share
+    their audio each keep their own row, pointing at the same file.
+
+    Args:
+    - directory: Root of the archive.
+    - codec: pydub export format, "flac" by default.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIRECTORY, codec=DEFAULT_CODEC):
+        self.directory = directory
+        self.codec = codec
+        os.makedirs(os.path.join(directory, "audio"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, MANIFEST_NAME))
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                created TEXT NOT NULL,
+                provider TEXT,
+                satisfaction TEXT,
+                duration REAL NOT NULL,
+                channels INTEGER NOT NULL,
+                sample_rate INTEGER NOT NULL,
+                sample_width INTEGER NOT NULL,
+                codec TEXT NOT NULL,
+                audio TEXT NOT NULL,
+                audio_bytes INTEGER NOT NULL,
+                original_bytes INTEGER NOT NULL,
+                transcript TEXT NOT NULL,
+                source TEXT
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created)")
+        self._db.commit()
+        ensure_index(self._db)
+
+    def add(self, wav_filename, transcription, provider, satisfaction, created=None, source=None):
+        """
+        Archives a WAV recording and its transcript. Returns the session id, see
+        session_hash. The audio is only encoded the first time it is seen, adding the
+        same session (audio, time and source) again only updates its manifest row.
+
+        Args:
+        - wav_filename: The recording, left in place.
+        - transcription: The full transcript.
+        - provider: The transcription provider used.
+        - satisfaction: The user's satisfaction flag.
+        - created: When the session was recorded, defaults to now.
+        - source: Where the recording came from, e.g. the legacy log it was migrated from.
+        """
+        with MappedWav(wav_filename) as wav:
+            audio_id = audio_hash(wav)
+            channels, sample_rate, sample_width = wav.channels, wav.sample_rate, wav.sample_width
+            duration = len(wav.data) / (channels * sample_rate * sample_width)
+        created = (created or datetime.now()).isoformat(timespec="seconds")
+        session_id = session_hash(audio_id, created, source)
+
+        # The audio file is named after its hash, whatever codec it was stored with.
+        audio_directory = os.path.join(self.directory, "audio", audio_id[:2])
+        stored = sorted(Path(audio_directory).glob(f"{audio_id}.*"))
+        if stored:
+            target, codec = str(stored[0]), stored[0].suffix[1:]
+        else:
+            os.makedirs(audio_directory, exist_ok=True)
+            target, codec = compress(wav_filename, os.path.join(audio_directory, audio_id), self.codec)
+        audio = os.path.relpath(target, self.directory)
+        audio_bytes = os.path.getsize(target)
+
+        # An upsert rather than INSERT OR REPLACE, so the full-text index triggers see an update.
+        self._db.execute(
+            f"INSERT INTO sessions ({', '.join(SESSION_COLUMNS)}) VALUES ({', '.join('?' * len(SESSION_COLUMNS))}) "
+            f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in SESSION_COLUMNS[1:])}",
+            (
+                session_id,
+                created,
+                provider,
+                None if satisfaction is None else str(satisfaction),
+                duration,
+                channels,
+                sample_rate,
+                sample_width,
+                codec,
+                audio,
+                audio_bytes,
+                os.path.getsize(wav_filename),
+                transcription or "",
+                source,
+            ),
+        )
+        self._db.commit()
+        return session_id
+
+    def get(self, session_id):
+        """
+        Returns the manifest row of a session as a dict, with `audio` as a full path, or None.
+        """
+        row = self._db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session["audio"] = os.path.join(self.directory, session["audio"])
+        return session
+
+    def search(self, text=None, **filters):
+        """
+        Full-text and metadata search over the archived sessions, see session_search.search.
+        """
+        return search(self._db, text, **filters)
+
+    def recordings(self):
+        """
+        Lays the sessions out the way batch.py and provider_benchmark.py read recordings:
+        `recordings/<id>.json` holds the transcript like a legacy sidecar, and their
+        results go next to it. The audio stays in the archive, `<id>.wav` only exists
+        while recording_wav has it decoded. Returns the `<id>.wav` filenames.
+        """
+        directory = os.path.join(self.directory, RECORDINGS_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+        filenames = []
+        for row in self._db.execute("SELECT id, created, provider, satisfaction, transcript, codec, audio FROM sessions ORDER BY created"):
+            sidecar = dict(row)
+            base = os.path.join(directory, sidecar.pop("id"))
+            filename = base + ".json"
+            existing = None
+            if os.path.exists(filename):
+                with open(filename) as f:
+                    existing = json.load(f)
+            if existing != sidecar:
+                with open(filename, "w") as f:
+                    json.dump(sidecar, f)
+            filenames.append(base + ".wav")
+        return filenames
+
+    def recent(self, limit=20):
+        return [dict(row) for row in self._db.execute("SELECT * FROM sessions ORDER BY created DESC LIMIT ?", (limit,))]
+
+    def stats(self):
+        stats = dict(self._db.execute("SELECT COUNT(*) AS sessions, COALESCE(SUM(duration), 0) AS seconds FROM sessions").fetchone())
+        # Sizes of the stored audio, once per file even when several sessions share it.
+        stats.update(self._db.execute(
+            "SELECT COUNT(*) AS audio_files, COALESCE(SUM(audio_bytes), 0) AS audio_bytes, COALESCE(SUM(original_bytes), 0) AS original_bytes "
+            "FROM (SELECT audio, MAX(audio_bytes) AS audio_bytes, MAX(original_bytes) AS original_bytes FROM sessions GROUP BY audio)"
+        ).fetchone())
+        stats["compressionRatio"] = stats["original_bytes"] / stats["audio_bytes"] if stats["audio_bytes"] else None
+        return stats
+
+    def close(self):
+        self._db.close()
+
+
+@contextmanager
+def recording_wav(wav_filename):
+    """
+    Yields the name of a WAV file with the audio of a recording: the file itself, or for
+    an archived session listed by SessionArchive.recordings its audio in the archive,
+    decoded next to the sidecar for as long as it is in use when it is compressed.
+    """
+    if os.path.exists(wav_filename):
+        yield wav_filename
+        return
+    with open(os.path.splitext(wav_filename)[0] + ".json") as f:
+        details = json.load(f)
+    source = os.path.join(os.path.dirname(os.path.dirname(wav_filename)), details["audio"])
+    if details["codec"] == "wav":
+        yield source
+        return
+    from pydub import AudioSegment
+
+    AudioSegment.from_file(source, format=details["codec"]).export(wav_filename, format="wav")
+    try:
+        yield wav_filename
+    finally:
+        os.remove(wav_filename)
+
+
+def _legacy_session(json_filename):
+    # Reads a legacy sidecar and works out when the session was recorded.
+    with open(json_filename) as f:
+        details = json.load(f)
+    directory, name = os.path.split(json_filename)
+    match = _LEGACY_NAME.match(name)
+    date = os.path.basename(directory)
+    created = None
+    if match and _LEGACY_DATE.match(date):
+        created = datetime.strptime(f"{date} {match.group('time')}", "%Y-%m-%d %H-%M")
+    if created is None:
+        created = datetime.fromtimestamp(os.path.getmtime(json_filename))
+    satisfaction = details.get("satisfaction")
+    if satisfaction is None and match and match.group("satisfaction") not in (None, "", "None"):
+        satisfaction = match.group("satisfaction")
+    return details, created, satisfaction
+
+
+def migrate_logs(logs_directory="logs", archive=None, delete=False):
+    """
+    Moves the legacy `logs/**/<name>.wav` + `<name>.json` sessions into the archive.
+
+    Args:
+    - logs_directory: The legacy logs tree.
+    - archive: The SessionArchive to add to, defaults to the one under `logs_directory`.
+    - delete: Remove the legacy files once they are archived.
+
+    Returns the number of sessions archived.
+    """
+    archive = archive or SessionArchive(os.path.join(logs_directory, "archive"))
+    archived = 0
+    archive_directory = Path(archive.directory).resolve()
+    for directory, subdirectories, files in os.walk(logs_directory):
+        # Skip the archive itself, however its path is spelled, and the recorder's scratch files.
+        subdirectories[:] = [d for d in subdirectories if Path(directory, d).resolve() != archive_directory and not d.startswith(".")]
+        for name in sorted(files):
+            if not name.endswith(".wav"):
+                continue
+            wav_filename = os.path.join(directory, name)
+            json_filename = wav_filename[:-len(".wav")] + ".json"
+            details, created, satisfaction = {}, None, None
+            if os.path.exists(json_filename):
+                details, created, satisfaction = _legacy_session(json_filename)
+            try:
+                archive.add(
+                    wav_filename,
+                    details.get("transcript", ""),
+                    details.get("provider"),
+                    satisfaction,
+                    created or datetime.fromtimestamp(os.path.getmtime(wav_filename)),
+                    source=os.path.relpath(wav_filename, logs_directory),
+                )
+            except (wave.Error, OSError) as e:
+                print(f"🔴 ERROR: Skipping {wav_filename}, {e}")
+                continue
+            archived += 1
+            if delete:
+                os.remove(wav_filename)
+                if os.path.exists(json_filename):
+                    os.remove(json_filename)
+    return archived
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compressed archive of dictation sessions.")
+    parser.add_argument("-d", "--directory", default=ARCHIVE_DIRECTORY, help="Archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Archive the legacy WAV + JSON logs")
+    migrate.add_argument("--logs", default="logs", help="Legacy logs directory")
+    migrate.add_argument("--delete", action="store_true", help="Delete the legacy files once archived")
+    migrate.add_argument("--codec", default=DEFAULT_CODEC, help="pydub export format")
+    commands.add_parser("stats", help="Print the archive size")
+    recent = commands.add_parser("recent", help="List the latest sessions")
+    recent.add_argument("-n", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        archive = SessionArchive(args.directory, args.codec)
+        print(f"🟢 Archived {migrate_logs(args.logs, archive, args.delete)} sessions")
+        print(f"ℹ️  {archive.stats()}")
+    elif args.command == "stats":
+        print(SessionArchive(args.directory).stats())
+    else:
+        for session in SessionArchive(args.directory).recent(args.n):
+            print(f"{session['created']}  {session['id'][:12]}  {session['provider']}  {session['satisfaction']}  {session['duration']:6.1f}s  {session['transcript'][:80]!r}")
@@ -0,0 +1,389 @@
+import asyncio
+import threading
+import time
+
+from event_log import events
+from ring_buffer import BLOCK, DROP_NEWEST, DROP_OLDEST, OVERFLOW_POLICIES, RingBuffer
+
+# pyaudio.paInt16 and pyaudio.paContinue, without importing PyAudio before the device is opened.
+PA_INT16 = 8
+PA_CONTINUE = 0
+
+# How much audio the shared ring holds. A subscriber that falls further behind skips ahead.
+CAPACITY_SECONDS = 30
+# Longest the device callback waits for room for a BLOCK subscriber before it drops the frame.
+BLOCK_TIMEOUT = 0.5
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CaptureCursor:
+    """
+    One subscriber's read position in an AudioCapture's ring. Every cursor sees the
+    same frame objects the device delivered, nothing is copied per subscriber.
+
+    Blocking `read` is for threads, `await get()` for coroutines, iterating yields
+    frames until the cursor or the capture is closed.
+
+    What happens when the cursor falls `capacity` frames behind depends on its policy.
+    DROP_OLDEST reads the shared ring directly and skips what the device overwrote.
+    DROP_NEWEST and BLOCK must keep their oldest frames, which the shared ring cannot
+    do, so the device also queues each frame's reference in a RingBuffer of the
+    cursor's own, which drops the new frame or holds up the device callback for up to
+    `block_timeout` seconds.
+    """
+
+    def __init__(self, capture, position, policy=DROP_OLDEST, block_timeout=BLOCK_TIMEOUT):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"policy must be one of {OVERFLOW_POLICIES}, got {policy!r}")
+        self.capture = capture
+        self.position = position
+        self.policy = policy
+        self.closed = False
+        self.frames = 0
+        # time.perf_counter_ns() when the last frame read was captured.
+        self.captured_ns = None
+        self._lapped = 0
+        self._high_water_mark = 0
+        self._ring = None if policy == DROP_OLDEST else RingBuffer(capture.capacity, policy, block_timeout)
+
+    @property
+    def dropped(self):
+        return self._ring.dropped if self._ring is not None else self._lapped
+
+    @property
+    def high_water_mark(self):
+        """
+        Most frames the cursor has been behind the device.
+        """
+        return self._ring.high_water_mark if self._ring is not None else self._high_water_mark
+
+    @property
+    def behind(self):
+        return len(self._ring) if self._ring is not None else self.capture._tail - self.position
+
+    def _take(self):
+        # Returns the next frame, None if there is none yet.
+        if self._ring is not None:
+            try:
+                item, captured_ns, seq = self._ring.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+            self.position = seq + 1
+            self.frames += 1
+            self.captured_ns = captured_ns
+            return item
+        capture = self.capture
+        self._high_water_mark = max(self._high_water_mark, min(capture._tail - self.position, capture.capacity))
+        while self.position < capture._tail:
+            position = self.position
+            index = position % capture.capacity
+            item, captured_ns = capture._slots[index], capture._captured[index]
+            if capture._reserved - position > capture.capacity:
+                # The device lapped us while we were reading, resync to the oldest live frame.
+                oldest = max(position + 1, capture._tail - capture.capacity)
+                self._lapped += oldest - position
+                self.position = oldest
+                continue
+            self.position = position + 1
+            self.frames += 1
+            self.captured_ns = captured_ns
+            return item
+        return None
+
+    def read(self, timeout=None):
+        """
+        Waits for the next frame and returns it, or None when the cursor or the capture
+        is closed or `timeout` seconds passed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.capture._condition:
+            while not self.closed:
+                item = self._take()
+                if item is not None:
+                    return item
+                if self.capture.closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.capture._condition.wait(remaining)
+        return None
+
+    async def get(self):
+        """
+        Waits for the next frame without blocking the event loop. Returns None when the
+        cursor or the capture is closed.
+        """
+        while not self.closed:
+            item = self._take()
+            if item is not None:
+                return item
+            if self.capture.closed:
+                return None
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiter = (loop, future)
+            with self.capture._condition:
+                self.capture._waiters.add(waiter)
+            # Re-check after publishing the waiter so a frame racing with us is not lost.
+            if self.behind > 0 or self.capture.closed:
+                with self.capture._condition:
+                    self.capture._waiters.discard(waiter)
+                continue
+            try:
+                await future
+            finally:
+                with self.capture._condition:
+                    self.capture._waiters.discard(waiter)
+        return None
+
+    def __iter__(self):
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self.closed = True
+        if self._ring is not None:
+            self._ring.close()
+        self.capture._unsubscribe(self)
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "behind": self.behind,
+            "highWaterMark": self.high_water_mark,
+        }
+
+
+class AudioCapture:
+    """
+    Owns the microphone. The input stream is opened on the first `subscribe` and stays
+    open until `close`, so sessions never pay for reopening the device. Every frame
+    PortAudio delivers is published once into a shared ring, each consumer (a
+    provider session, the vision prompt, ...) reads it through its own CaptureCursor.
+
+    The ring has a single producer, the PortAudio callback thread. Frames are stored by
+    reference and slots are only overwritten once they are `capacity` frames old, a
+    cursor that was lapped skips to the oldest frame still held and counts the drop,
+    unless it subscribed with another overflow policy, see CaptureCursor.
+
+    Args:
+    - channels: Number of channels, 16 bit samples.
+    - rate: Sample rate in Hz.
+    - chunk: Frames per buffer, how much audio one published frame holds.
+    - capacity_seconds: See CAPACITY_SECONDS.
+    - open_stream: `open_stream(capture)` opens the device and returns a stream with
+      `stop_stream()` and `close()` that calls `capture.publish(data)` for every buffer,
+      for tests. Defaults to a PyAudio callback stream.
+    """
+
+    def __init__(self, channels, rate, chunk, capacity_seconds=CAPACITY_SECONDS, open_stream=None):
+        self.channels = channels
+        self.rate = rate
+        self.chunk = chunk
+        self.capacity = max(1, int(capacity_seconds * rate / chunk))
+        self._open_stream = open_stream or _open_pyaudio_stream
+        self._slots = [None] * self.capacity
+        self._captured = [None] * self.capacity
+        # Monotonic sequence numbers, the slot index is `seq % capacity`. `_reserved` is
+        # bumped before a slot is written and `_tail` after, which lets a cursor detect
+        # a slot overwritten under it.
+        self._reserved = 0
+        self._tail = 0
+        self._condition = threading.Condition()
+        self._waiters = set()
+        self._cursors = set()
+        # Cursors with a ring of their own, which `publish` feeds, replaced rather than changed.
+        self._ring_cursors = ()
+        self._stream = None
+        self._lock = threading.Lock()
+        self.closed = False
+        self.opened = 0
+        self.published = 0
+
+    @property
+    def frame_seconds(self):
+        return self.chunk / self.rate
+
+    def start(self):
+        """
+        Opens the device if it is not open yet.
+        """
+        with self._lock:
+            if self._stream is not None:
+                return
+            started = time.perf_counter()
+            self.closed = False
+            self._stream = self._open_stream(self)
+            self.opened += 1
+            events.info("capture.opened", seconds=round(time.perf_counter() - started, 3), rate=self.rate, channels=self.channels)
+
+    def subscribe(self, policy=DROP_OLDEST, block_timeout=BLOCK_TIMEOUT):
+        """
+        Returns a cursor that reads every frame captured from now on. Opens the device
+        on first use.
+
+        Args:
+        - policy: What to do when the cursor falls `capacity` frames behind, DROP_OLDEST,
+          DROP_NEWEST or BLOCK.
+        - block_timeout: With BLOCK, see BLOCK_TIMEOUT.
+        """
+        self.start()
+        with self._condition:
+            cursor = CaptureCursor(self, self._tail, policy, block_timeout)
+            self._cursors.add(cursor)
+            if cursor._ring is not None:
+                self._ring_cursors += (cursor,)
+        return cursor
+
+    def _unsubscribe(self, cursor):
+        with self._condition:
+            self._cursors.discard(cursor)
+            self._ring_cursors = tuple(other for other in self._ring_cursors if other is not cursor)
+        # Wake the cursor's own blocked reader.
+        self._wake_all()
+
+    def _wake_all(self):
+        with self._condition:
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def publish(self, data):
+        """
+        Called from the capture thread with each buffer of audio.
+        """
+        seq = self._tail
+        index = seq % self.capacity
+        captured_ns = time.perf_counter_ns()
+        self._reserved = seq + 1
+        self._slots[index] = data
+        self._captured[index] = captured_ns
+        self._tail = seq + 1
+        self.published += 1
+        for cursor in self._ring_cursors:
+            cursor._ring.put((data, captured_ns, seq))
+        self._wake_all()
+
+    def close(self):
+        """
+        Closes the device and ends every cursor.
+        """
+        with self._lock:
+            stream, self._stream = self._stream, None
+            if stream is not None:
+                stream.stop_stream()
+                stream.close()
+        self.closed = True
+        self._wake_all()
+
+    def stats(self):
+        return {
+            "opened": self.opened,
+            "published": self.published,
+            "subscribers": len(self._cursors),
+            "capacity": self.capacity,
+            "dropped": sum(cursor.dropped for cursor in self._cursors),
+        }
+
+
+class _PyAudioStream:
+    # A PyAudio callback stream together with the PyAudio instance it belongs to.
+
+    def __init__(self, capture):
+        import pyaudio
+
+        self.capture = capture
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=PA_INT16,
+            channels=capture.channels,
+            rate=capture.rate,
+            input=True,
+            frames_per_buffer=capture.chunk,
+            stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+
+    def _callback(self, input_data, frame_count, time_info, status_flag):
+        self.capture.publish(input_data)
+        return (input_data, PA_CONTINUE)
+
+    def stop_stream(self):
+        self.stream.stop_stream()
+
+    def close(self):
+        self.stream.close()
+        self.audio.terminate()
+
+
+def _open_pyaudio_stream(capture):
+    return _PyAudioStream(capture)
+
+
+if __name__ == "__main__":
+    import queue
+
+    class _Silence:
+        # Stands in for the device, main publishes the frames itself.
+
+        def stop_stream(self):
+            pass
+
+        def close(self):
+            pass
+
+    def ring(subscribers, frames):
+        # Every subscriber drains the ring on its own thread. The producer publishes half
+        # a ring at a time and waits for the slowest reader, so nothing is dropped.
+        capture = AudioCapture(1, 16000, 8000, open_stream=lambda capture: _Silence())
+        cursors = [capture.subscribe() for _ in range(subscribers)]
+        threads = [threading.Thread(target=lambda cursor=cursor: [None for _ in cursor]) for cursor in cursors]
+        for thread in threads:
+            thread.start()
+        data = bytes(capture.chunk * 2)
+        batch = capture.capacity // 2
+        started = time.perf_counter()
+        for offset in range(0, frames, batch):
+            for _ in range(min(batch, frames - offset)):
+                capture.publish(data)
+            while min(cursor.position for cursor in cursors) < capture._tail:
+                time.sleep(0)
+        capture.close()
+        for thread in threads:
+            thread.join()
+        assert sum(cursor.frames for cursor in cursors) == frames * subscribers
+        return (time.perf_counter() - started) / frames
+
+    def copying_queues(subscribers, frames):
+        # The same fan-out with a queue and a copy of every frame per subscriber.
+        queues = [queue.Queue() for _ in range(subscribers)]
+        threads = [threading.Thread(target=lambda q=q: [None for _ in iter(q.get, None)]) for q in queues]
+        for thread in threads:
+            thread.start()
+        data = bytes(8000 * 2)
+        started = time.perf_counter()
+        for _ in range(frames):
+            for q in queues:
+                q.put(bytes(bytearray(data)))
+        for q in queues:
+            q.put(None)
+        for thread in threads:
+            thread.join()
+        return (time.perf_counter() - started) / frames
+
+    frames = 20000
+    for subscribers in (1, 2, 4, 8):
+        shared, copied = ring(subscribers, frames), copying_queues(subscribers, frames)
+        print(f"{subscribers} subscribers: {shared * 1e6:6.1f} us/frame through the shared ring, "
+              f"{copied * 1e6:6.1f} us/frame with a queue and a copy per subscriber")
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import time
+
+from archive import MANIFEST_NAME, SessionArchive, recording_wav
+from util import MappedWav
+
+# Results are written next to the `<name>.json` sidecar of every `<name>.wav`.
+RESULT_SUFFIX = ".batch.json"
+
+# Not recordings to re-run: the archive's own files (archive.py, its sessions are read
+# from its manifest instead), sessions still being written (recorder.py) and benchmark
+# output (provider_benchmark.py).
+SKIPPED_DIRECTORIES = {"archive", ".partial", "benchmark"}
+
+
+def result_filename(wav_filename):
+    return os.path.splitext(wav_filename)[0] + RESULT_SUFFIX
+
+
+def find_wav_files(directory):
+    """
+    Returns every WAV file under `directory`, sorted so runs are reproducible. The
+    SKIPPED_DIRECTORIES below it are left out, a session archive found on the way is
+    listed through SessionArchive.recordings. Open the files with archive.recording_wav.
+    """
+    wav_files = []
+    for root, directories, files in os.walk(directory):
+        if MANIFEST_NAME in files:
+            archive = SessionArchive(root)
+            wav_files.extend(archive.recordings())
+            archive.close()
+            directories[:] = []
+            continue
+        directories[:] = [
+            name for name in directories
+            if name not in SKIPPED_DIRECTORIES or os.path.exists(os.path.join(root, name, MANIFEST_NAME))
+        ]
+        for name in files:
+            if name.lower().endswith(".wav"):
+                wav_files.append(os.path.join(root, name))
+    return sorted(wav_files)
+
+
+def _write_result(filename, result):
+    # Write then rename, so an interrupted run never leaves a half-written result behind.
+    temporary_filename = filename + ".tmp"
+    with open(temporary_filename, "w") as f:
+        json.dump(result, f)
+    os.replace(temporary_filename, filename)
+
+
+async def transcribe_directory(directory, transcribe, concurrency=4, force=False, label=None):
+    """
+    Re-transcribes every WAV file under `directory` with at most `concurrency` sessions in flight.
+
+    Files that already have a result are skipped unless `force` is set, so a stopped run
+    resumes where it left off.
+
+    Args:
+    - directory: Directory to walk, e.g. logs/2024-04-20.
+    - transcribe: `async def transcribe(filename, wav)` returning the transcript, where
+      `wav` is an open MappedWav.
+    - concurrency: Maximum number of concurrent streaming sessions.
+    - force: Re-run files that already have a result.
+    - label: Free-form tag stored with each result, e.g. the model name.
+
+    Returns a summary dict with counts and throughput in audio-seconds per wall-second.
+    """
+    semaphore = asyncio.BoundedSemaphore(concurrency)
+    wav_files = find_wav_files(directory)
+    pending = [f for f in wav_files if force or not os.path.exists(result_filename(f))]
+    summary = {
+        "files": len(wav_files),
+        "skipped": len(wav_files) - len(pending),
+        "done": 0,
+        "failed": 0,
+        "audioSeconds": 0.0,
+    }
+    print(f"🟢 Batch: {len(pending)} of {len(wav_files)} files to transcribe with {concurrency} connections")
+
+    async def transcribe_one(filename):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                with recording_wav(filename) as audio_filename, MappedWav(audio_filename) as wav:
+                    duration = len(wav.data) / (wav.sample_rate * wav.channels * wav.sample_width)
+                    transcript = await transcribe(filename, wav)
+            except Exception as e:
+                summary["failed"] += 1
+                print(f"🔴 Batch: {filename} failed: {e}")
+                return
+            elapsed = time.monotonic() - started
+            _write_result(result_filename(filename), {
+                "transcript": transcript,
+                "label": label,
+                "audioSeconds": duration,
+                "elapsedSeconds": elapsed,
+            })
+            summary["done"] += 1
+            summary["audioSeconds"] += duration
+            print(f"ℹ️  Batch: [{summary['done']}/{len(pending)}] {filename} ({duration:.1f}s audio in {elapsed:.2f}s)")
+
+    started = time.monotonic()
+    await asyncio.gather(*(transcribe_one(f) for f in pending))
+    summary["wallSeconds"] = time.monotonic() - started
+    summary["audioSecondsPerWallSecond"] = (
+        summary["audioSeconds"] / summary["wallSeconds"] if summary["wallSeconds"] > 0 else 0.0
+    )
+    print(
+        f"🟢 Batch finished: {summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed, "
+        f"{summary['audioSecondsPerWallSecond']:.1f} audio-seconds per wall-second"
+    )
+    return summary
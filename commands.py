@@ -0,0 +1,191 @@
+import re
+
+# Words that may start or be part of a spoken edit command. A tail without any of
+# them is plain dictation and never needs the model.
+COMMAND_WORDS = re.compile(
+    r"\b(delete|remove|erase|scratch|clear|undo|redo|replace|change|convert|turn|make|capitali[sz]e|"
+    r"capital|upper ?case|lower ?case|caps|add|insert|put|append|move|select|fix|correct|rewrite|"
+    r"rephrase|translate|format|bold|italic|new line|new paragraph)\b",
+    re.IGNORECASE,
+)
+
+_NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+_DELETE = r"(?:please\s+)?(?:delete|remove|erase|scratch)"
+_END = r"\s*[.!?]*\s*$"
+
+_DELETE_EVERYTHING = re.compile(
+    r"(?:please\s+)?(?:delete|remove|erase|clear)\s+(?:everything|all|it all|all the text|the whole thing|the whole text)" + _END,
+    re.IGNORECASE,
+)
+_DELETE_LAST_WORDS = re.compile(
+    _DELETE + r"\s+(?:the\s+)?last\s+(?:(?P<count>\d+|" + "|".join(_NUMBERS) + r")\s+)?words?" + _END,
+    re.IGNORECASE,
+)
+_DELETE_LAST_SENTENCE = re.compile(_DELETE + r"\s+(?:the\s+)?last\s+sentence" + _END, re.IGNORECASE)
+_DELETE_PHRASE = re.compile(
+    _DELETE + r"\s+(?:the\s+word\s+)?(?:\"(?P<quoted>[^\"]+)\"|'(?P<single>[^']+)'|(?P<bare>[\w']+(?:\s+[\w']+){0,2}))" + _END,
+    re.IGNORECASE,
+)
+_CHANGE_CASE = re.compile(
+    r"(?:please\s+)?(?:make|turn|convert)\s+(?P<target>it|this|that|the last sentence|everything|all|all of it|the whole thing|the whole text|the text)"
+    r"\s+(?:to\s+|in\s+|into\s+)?(?:all\s+)?(?P<case>upper ?case|caps|capitals?|capital letters|lower ?case)" + _END,
+    re.IGNORECASE,
+)
+_CAPITALIZE_LETTER = re.compile(
+    r"(?:please\s+)?make\s+(?:the\s+)?(?:letter\s+)?(?P<letter>[a-z])\s+capital\s+(?:for|in)\s+(?:the\s+word\s+)?(?P<word>[\w']+)" + _END,
+    re.IGNORECASE,
+)
+_CAPITALIZE_WORD = re.compile(
+    r"(?:please\s+)?capitali[sz]e\s+(?:the\s+word\s+)?(?P<word>[\w']+)" + _END,
+    re.IGNORECASE,
+)
+
+_SENTENCES = re.compile(r"[^.!?]*[.!?]+|[^.!?]+$")
+
+# A command is only run locally where the speaker paused: at the start of the text or
+# after one of these. Mid-sentence, "I went to clear all" is dictation, not a command.
+_COMMAND_BOUNDARY = ".!?,;:"
+
+
+def _sentences(text):
+    return [s for s in _SENTENCES.findall(text) if s.strip()]
+
+
+def _unique_word(text, word):
+    # Returns the match for `word` as a whole word, or None if it is missing or ambiguous.
+    matches = list(re.finditer(r"(?<![\w'])" + re.escape(word) + r"(?![\w'])", text, re.IGNORECASE))
+    return matches[0] if len(matches) == 1 else None
+
+
+def _delete_last_words(body, count):
+    words = body.split()
+    return " ".join(words[:-count]) if count < len(words) else ""
+
+
+def _delete_phrase(body, phrase):
+    match = _unique_word(body, phrase)
+    if match is None:
+        return None
+    start, end = match.span()
+    if end < len(body) and body[end] == " ":
+        end += 1
+    elif start > 0 and body[start - 1] == " ":
+        start -= 1
+    return body[:start] + body[end:]
+
+
+def _change_case(body, target, case):
+    convert = str.lower if case.lower().startswith("lower") else str.upper
+    if target.lower() in ("it", "this", "that", "the last sentence"):
+        sentences = _sentences(body)
+        if not sentences:
+            return body
+        last = sentences[-1].strip()
+        body = body.rstrip()
+        return body[: len(body) - len(last)] + convert(last)
+    return convert(body)
+
+
+def _capitalize(body, word, letter=None):
+    match = _unique_word(body, word)
+    if match is None:
+        return None
+    original = match.group(0)
+    if letter is None:
+        replaced = original[:1].upper() + original[1:]
+    else:
+        index = original.lower().find(letter.lower())
+        if index == -1:
+            return None
+        replaced = original[:index] + original[index].upper() + original[index + 1:]
+    return body[: match.start()] + replaced + body[match.end():]
+
+
+def _execute(body, command):
+    """
+    Runs one command against `body`. Returns the new text, or None if `command`
+    is not something this interpreter understands.
+    """
+    if _DELETE_EVERYTHING.fullmatch(command):
+        return ""
+    match = _DELETE_LAST_WORDS.fullmatch(command)
+    if match:
+        count = match.group("count")
+        count = 1 if count is None else int(count) if count.isdigit() else _NUMBERS[count.lower()]
+        return _delete_last_words(body, count)
+    if _DELETE_LAST_SENTENCE.fullmatch(command):
+        sentences = _sentences(body)
+        return "".join(sentences[:-1]).rstrip()
+    match = _CHANGE_CASE.fullmatch(command)
+    if match:
+        return _change_case(body, match.group("target"), match.group("case"))
+    match = _CAPITALIZE_LETTER.fullmatch(command)
+    if match:
+        return _capitalize(body, match.group("word"), match.group("letter"))
+    match = _CAPITALIZE_WORD.fullmatch(command)
+    if match:
+        return _capitalize(body, match.group("word"))
+    match = _DELETE_PHRASE.fullmatch(command)
+    if match:
+        phrase = match.group("quoted") or match.group("single") or match.group("bare")
+        return _delete_phrase(body, phrase)
+    return None
+
+
+def has_command(text, start=0):
+    """
+    Returns True if `text[start:]` contains anything that could be an edit command.
+    """
+    return COMMAND_WORDS.search(text, start) is not None
+
+
+# Words that finish a command started before them, "delete last" + "word".
+_COMMAND_ARGUMENTS = re.compile(
+    r"\s*(?:word|words|sentence|sentences|letter|line|paragraph|everything|all|it|this|that|the|to|into|in|with|by|"
+    r"from|of|for|and|\d+|" + "|".join(_NUMBERS) + r")\b",
+    re.IGNORECASE,
+)
+
+
+def may_continue_command(tail):
+    """
+    Returns True if `tail`, dictated right after a command, could change what the command does.
+    """
+    return has_command(tail) or _COMMAND_ARGUMENTS.match(tail) is not None
+
+
+def interpret_command(text, start=0):
+    """
+    Deterministic fast path for the spoken edit commands in ai.EDIT_SYSTEM_PROMPT.
+
+    Only `text[start:]`, the part not yet processed, is searched for a command, which
+    has to end the text and start the text or a new sentence or clause. Returns the
+    edited text, `text` itself when there is no command, or None when the tail looks
+    like a command this interpreter cannot handle, or one that could as well be
+    dictation, and the model has to decide.
+
+    Args:
+    - text: Text on the editor followed by the newly dictated tail.
+    - start: Where the new tail begins.
+    """
+    if not has_command(text, start):
+        return text
+    # Try every command word from the last one back, the longest command that parses wins.
+    for match in reversed(list(COMMAND_WORDS.finditer(text, start))):
+        command_start = match.start()
+        # "please delete ..." is one command.
+        please = re.search(r"please\s+$", text[start:command_start], re.IGNORECASE)
+        candidates = [command_start - len(please.group(0))] if please else []
+        candidates.append(command_start)
+        for position in candidates:
+            body = text[:position].rstrip()
+            if body and body[-1] not in _COMMAND_BOUNDARY:
+                continue
+            if body.endswith(","):
+                body = body[:-1]
+            result = _execute(body, text[position:].strip())
+            if result is not None:
+                return result
+    return None
+
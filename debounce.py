@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+from event_log import events
+
+# How often a running wait re-checks its deadline, so end-of-speech signals cut it short.
+POLL_INTERVAL = 0.02
+
+
+class AdaptiveDebounce:
+    """
+    Decides how long to wait after a partial transcript before running the edit model.
+
+    A fixed delay is too long once the user has stopped talking and too short while
+    they are still going. The delay is derived from:
+    - the gap between recent partials, a new one is unlikely after about three times that gap,
+    - whether the last partial revised earlier words instead of only appending,
+    - the recent model latency, a wasted call costs more when the model is slow,
+    - end-of-utterance signals (final partial from the provider, VAD pause), which
+      drop the delay to `min_delay` at once.
+
+    Every call to `observe_partial` starts a new decision, `wait` sleeps until it is due.
+
+    Args:
+    - min_delay: Lower bound in seconds, also used after an end-of-utterance signal.
+    - max_delay: Upper bound in seconds.
+    - gap_factor: Multiple of the typical gap between partials to wait for.
+    - latency_weight: Seconds of delay added per second of model latency.
+    - smoothing: Weight of the newest sample in the moving averages.
+    - clock: Monotonic time source, replaced in simulations.
+    """
+
+    def __init__(self, min_delay=0.15, max_delay=1.2, gap_factor=3.0, latency_weight=0.25, smoothing=0.3, clock=time.monotonic):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.gap_factor = gap_factor
+        self.latency_weight = latency_weight
+        self.smoothing = smoothing
+        self.clock = clock
+        self.partial_gap = 0.4  # Moving average of the seconds between partials
+        self.llm_latency = 0.8  # Moving average of model call seconds
+        self._last_text = ""
+        self._last_partial = None
+        self._revised = False
+        self._ended = False
+        self.decisions = []
+        self.fired = 0
+        self.wasted = 0
+
+    def _average(self, current, sample):
+        return current + self.smoothing * (sample - current)
+
+    def observe_partial(self, text):
+        """
+        Call for every new partial transcript, before scheduling the edit.
+        """
+        now = self.clock()
+        if self._last_partial is not None:
+            gap = now - self._last_partial
+            # Long gaps are pauses between utterances, not the speaking rhythm.
+            if gap < self.max_delay * 2:
+                self.partial_gap = self._average(self.partial_gap, gap)
+        self._revised = not text.startswith(self._last_text)
+        self._last_text = text
+        self._last_partial = now
+        self._ended = False
+
+    def end_of_utterance(self):
+        """
+        The provider finalized the utterance or the VAD heard the speaker stop.
+        """
+        self._ended = True
+
+    def record_llm_latency(self, seconds):
+        self.llm_latency = self._average(self.llm_latency, seconds)
+
+    def record_wasted(self):
+        """
+        A model call was cancelled by a newer partial after it had started.
+        """
+        self.wasted += 1
+
+    def delay(self):
+        """
+        Returns the seconds to wait after the last partial, and the reason.
+        """
+        if self._ended:
+            return self.min_delay, "end of utterance"
+        delay = self.gap_factor * self.partial_gap
+        reason = f"partial gap {self.partial_gap:.2f}s"
+        if self._revised:
+            delay *= 1.5
+            reason += ", revised"
+        delay += self.latency_weight * self.llm_latency
+        reason += f", llm {self.llm_latency:.2f}s"
+        return min(self.max_delay, max(self.min_delay, delay)), reason
+
+    async def wait(self):
+        """
+        Sleeps until the debounce delay after the last partial has passed.
+        Cancelling the task (a newer partial arrived) stops the wait.
+        """
+        started = self._last_partial or self.clock()
+        while True:
+            # Re-evaluated every poll, an end-of-utterance signal shortens a running wait.
+            delay, reason = self.delay()
+            remaining = started + delay - self.clock()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, POLL_INTERVAL))
+        self.fired += 1
+        self.decisions.append(delay)
+        events.info("debounce.fired", delay=round(delay, 3), reason=reason)
+        return delay
+
+    def stats(self):
+        decisions = sorted(self.decisions)
+        return {
+            "fired": self.fired,
+            "wasted": self.wasted,
+            "p50Delay": decisions[len(decisions) // 2] if decisions else None,
+            "maxDelay": decisions[-1] if decisions else None,
+            "partialGap": self.partial_gap,
+            "llmLatency": self.llm_latency,
+        }
+
+
+def simulate(scheduler, utterances, llm_latency=0.6):
+    """
+    Replays utterances, each a list of partial arrival offsets in seconds followed by an
+    end-of-utterance signal, against a fake clock. A call fires when no partial arrives
+    within the scheduled delay; it is wasted if one arrives before the call returns.
+
+    Returns (latencies after the end of speech, wasted calls).
+    """
+    now = [0.0]
+    scheduler.clock = lambda: now[0]
+    latencies, wasted = [], 0
+    for offsets in utterances:
+        start = now[0]
+        for i, offset in enumerate(offsets):
+            now[0] = start + offset
+            scheduler.observe_partial(" ".join(["word"] * (i + 1)))
+            if i + 1 < len(offsets):
+                delay, _ = scheduler.delay()
+                fires = now[0] + delay
+                if fires < start + offsets[i + 1]:
+                    scheduler.record_llm_latency(llm_latency)
+                    wasted += fires + llm_latency > start + offsets[i + 1]
+        # The last partial, then the provider finalizes 0.3s later.
+        last = now[0]
+        delay, _ = scheduler.delay()
+        if delay > 0.3:
+            now[0] = last + 0.3
+            scheduler.end_of_utterance()
+            delay = max(0.3, scheduler.delay()[0])
+        scheduler.record_llm_latency(llm_latency)
+        latencies.append(delay)
+        now[0] = last + 3.0
+    return latencies, wasted
+
+
+class FixedDebounce(AdaptiveDebounce):
+    # The old behaviour, a fixed one second sleep.
+    def delay(self):
+        return 1.0, "fixed"
+
+
+if __name__ == "__main__":
+    import random
+    random.seed(1)
+    utterances = []
+    for _ in range(200):
+        offsets, t = [], 0.0
+        for _ in range(random.randint(3, 15)):
+            # Partials every 0.2-0.5 s, with the odd mid-sentence hesitation.
+            t += random.uniform(0.2, 0.5) if random.random() > 0.1 else random.uniform(0.6, 1.0)
+            offsets.append(t)
+        utterances.append(offsets)
+    for scheduler in (FixedDebounce(), AdaptiveDebounce()):
+        latencies, wasted = simulate(scheduler, utterances)
+        latencies.sort()
+        print(
+            f"{type(scheduler).__name__:>18}: p50 {latencies[len(latencies) // 2]:.2f}s "
+            f"p90 {latencies[int(len(latencies) * 0.9)]:.2f}s after the last partial, {wasted} wasted calls"
+        )
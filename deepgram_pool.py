@@ -0,0 +1,216 @@
+import asyncio
+import collections
+import contextlib
+import json
+import time
+
+import websockets
+
+from event_log import events
+
+# Deepgram closes a stream that gets neither audio nor a KeepAlive for 10 seconds.
+KEEPALIVE_INTERVAL = 5
+# Idle connections older than this are replaced in the background.
+MAX_IDLE_AGE = 300
+# Seconds between attempts when a warm connection could not be opened.
+RETRY_INTERVAL = 10
+
+
+class _Idle:
+    __slots__ = ("ws", "opened", "keeper")
+
+    def __init__(self, ws, opened):
+        self.ws = ws
+        self.opened = opened
+        self.keeper = None
+
+
+class DeepgramConnectionPool:
+    """
+    Keeps authenticated Deepgram streaming connections open ahead of time, so a
+    dictation session starts streaming without paying for DNS, TCP, TLS and the
+    websocket upgrade.
+
+    Every warmed URL (model, tier and encoding are part of it) gets `size` idle
+    connections. They are sent a KeepAlive every `keepalive_interval` seconds and are
+    replaced in the background when they close or get older than `max_age`. A
+    connection is used for one session only, taking one starts opening its
+    replacement. All methods must be called on the event loop the pool lives on.
+
+    Args:
+    - key: Deepgram API key.
+    - size: Idle connections kept per URL.
+    - keepalive_interval: See KEEPALIVE_INTERVAL.
+    - max_age: See MAX_IDLE_AGE.
+    - connect: `websockets.connect` compatible coroutine function, for tests.
+    - clock: Time source, `time.monotonic` by default.
+    """
+
+    def __init__(self, key, size=1, keepalive_interval=KEEPALIVE_INTERVAL, max_age=MAX_IDLE_AGE, connect=websockets.connect,
+                 clock=time.monotonic):
+        self.key = key
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self.max_age = max_age
+        self.clock = clock
+        self._connect = connect
+        self._idle = collections.defaultdict(list)
+        self._opening = collections.defaultdict(int)
+        self._warm = set()
+        self._closed = False
+        self.connect_times = collections.deque(maxlen=20)
+        self.hits = 0
+        self.misses = 0
+        self.replaced = 0
+        self.saved = 0.0
+
+    def warm(self, url):
+        """
+        Starts keeping connections to `url` open.
+        """
+        self._warm.add(url)
+        self._fill(url)
+
+    def _fill(self, url):
+        if self._closed or url not in self._warm:
+            return
+        for _ in range(self.size - len(self._idle[url]) - self._opening[url]):
+            self._opening[url] += 1
+            asyncio.ensure_future(self._open(url))
+
+    async def _connect_timed(self, url):
+        started = self.clock()
+        ws = await self._connect(url, extra_headers={"Authorization": f"Token {self.key}"})
+        self.connect_times.append(self.clock() - started)
+        return ws
+
+    async def _open(self, url):
+        try:
+            ws = await self._connect_timed(url)
+        except Exception as e:
+            events.warning("deepgram_pool.connect_failed", error=repr(e), retry_in=RETRY_INTERVAL)
+            await asyncio.sleep(RETRY_INTERVAL)
+            self._opening[url] -= 1
+            self._fill(url)
+            return
+        self._opening[url] -= 1
+        if self._closed:
+            await ws.close()
+            return
+        idle = _Idle(ws, self.clock())
+        idle.keeper = asyncio.ensure_future(self._keep(url, idle))
+        self._idle[url].append(idle)
+        events.debug("deepgram_pool.warm", request_id=ws.response_headers.get("dg-request-id"), seconds=self.connect_times[-1])
+
+    async def _keep(self, url, idle):
+        # Keeps one idle connection alive until it is taken, closes or gets too old.
+        try:
+            while True:
+                await asyncio.sleep(self.keepalive_interval)
+                if not idle.ws.open:
+                    break
+                if self.clock() - idle.opened > self.max_age:
+                    self.replaced += 1
+                    break
+                await idle.ws.send(json.dumps({"type": "KeepAlive"}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        if idle in self._idle[url]:
+            self._idle[url].remove(idle)
+        self._fill(url)
+        await idle.ws.close()
+
+    @property
+    def mean_connect_time(self):
+        return sum(self.connect_times) / len(self.connect_times) if self.connect_times else None
+
+    async def acquire(self, url):
+        """
+        Returns an open connection to `url`, a warm one if there is one. The caller
+        owns it and closes it when the session is done. The URL is kept warm from now on.
+        """
+        self._warm.add(url)
+        idle_connections = self._idle[url]
+        while idle_connections:
+            idle = idle_connections.pop(0)
+            idle.keeper.cancel()
+            if idle.ws.open:
+                self.hits += 1
+                saved = self.mean_connect_time or 0.0
+                self.saved += saved
+                events.info("deepgram_pool.hit", saved=round(saved, 3), age=round(self.clock() - idle.opened, 1))
+                self._fill(url)
+                return idle.ws
+        self.misses += 1
+        ws = await self._connect_timed(url)
+        events.info("deepgram_pool.miss", seconds=round(self.connect_times[-1], 3))
+        self._fill(url)
+        return ws
+
+    @contextlib.asynccontextmanager
+    async def connection(self, url):
+        """
+        `async with pool.connection(url) as ws:`, like `websockets.connect`.
+        """
+        ws = await self.acquire(url)
+        try:
+            yield ws
+        finally:
+            await ws.close()
+
+    async def close(self):
+        self._closed = True
+        for idle_connections in self._idle.values():
+            for idle in idle_connections:
+                idle.keeper.cancel()
+                await idle.ws.close()
+            idle_connections.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "replaced": self.replaced,
+            "idle": sum(len(idle_connections) for idle_connections in self._idle.values()),
+            "meanConnectSeconds": self.mean_connect_time,
+            "savedSeconds": self.saved,
+        }
+
+
+if __name__ == "__main__":
+    from standins import DeepgramStandIn
+
+    async def benchmark(sessions=5, handshake=0.15):
+        # The stand-in answers at once, so each connect is delayed by a typical
+        # DNS + TCP + TLS + upgrade time to show what warming saves.
+        async def slow_connect(url, **kwargs):
+            await asyncio.sleep(handshake)
+            return await websockets.connect(url, **kwargs)
+
+        async with DeepgramStandIn() as server:
+            url = f"{server.url}/v1/listen?encoding=linear16&sample_rate=16000"
+            for pool in (None, DeepgramConnectionPool("stand-in", keepalive_interval=0.2, connect=slow_connect)):
+                if pool is not None:
+                    pool.warm(url)
+                    await asyncio.sleep(handshake * 2)
+                started = time.perf_counter()
+                for _ in range(sessions):
+                    session_started = time.perf_counter()
+                    connection = pool.connection(url) if pool else websockets.connect(url)
+                    if pool is None:
+                        await asyncio.sleep(handshake)
+                    async with connection as ws:
+                        first_byte = time.perf_counter() - session_started
+                        await ws.send(b"\0" * 3200)
+                        await ws.send(json.dumps({"type": "CloseStream"}))
+                        async for _ in ws:
+                            pass
+                    # Time between sessions, the pool refills meanwhile.
+                    await asyncio.sleep(handshake * 2)
+                label = "warm pool" if pool else "cold connect"
+                print(f"{label:>12}: first audio byte {first_byte * 1000:.0f} ms after session start, {sessions} sessions in {time.perf_counter() - started:.2f}s")
+                if pool is not None:
+                    print(f"ℹ️  {pool.stats()}")
+                    await pool.close()
+
+    asyncio.run(benchmark())
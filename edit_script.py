@@ -0,0 +1,266 @@
+import re
+import sys
+
+# A script is a list of steps, each one of:
+#   ("type", text)       type the text at the cursor
+#   ("backspace", n)     delete n characters before the cursor
+#   ("left", n)            move the cursor n characters left
+#   ("right", n)           move the cursor n characters right
+#   ("word_left", n)       jump n words left (ctrl+left, alt+left on macOS)
+#   ("document_start", 1)  move to the start of the text
+#   ("document_end", 1)    move to the end of the text
+# Every script starts and ends with the cursor at the end of the text, which is
+# where the previous edit always leaves it.
+
+if sys.platform == "darwin":
+    KEYS = {"backspace": "backspace", "left": "left", "right": "right", "word_left": "alt+left", "document_start": "cmd+up", "document_end": "cmd+down"}
+else:
+    KEYS = {"backspace": "backspace", "left": "left", "right": "right", "word_left": "ctrl+left", "document_start": "ctrl+home", "document_end": "ctrl+end"}
+
+# Jumping to the start or end of the document is only safe when the dictated text is
+# the whole document, as in the DictationDaddy window. In any other field, e.g. a
+# multi-line editor or a chat box with history, it lands in unrelated text, so only
+# relative moves are used unless the output backend opts in.
+ABSOLUTE_MOVES = False
+
+# Word jumps behave the same in every editor we type into only across plain words and single spaces.
+_PLAIN_WORDS = re.compile(r"[A-Za-z0-9_]+( [A-Za-z0-9_]+)* ?")
+_TOKENS = re.compile(r"\s+|\w+|[^\w\s]")
+
+# Above this many word edits Myers gives up and the single-hunk edit is used instead.
+MAX_WORD_EDITS = 200
+
+
+def _common_prefix_length(a, b):
+    # Binary search over slice comparisons, which run in C instead of a per-character loop.
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix_length(a, b):
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _myers_hunks(old_tokens, new_tokens):
+    """
+    Myers O(ND) diff over tokens. Returns (old_start, old_end, new_start, new_end)
+    token ranges for every changed region, or None when the diff exceeds MAX_WORD_EDITS.
+    """
+    n, m = len(old_tokens), len(new_tokens)
+    max_d = min(n + m, MAX_WORD_EDITS)
+    v = {1: 0}
+    trace = []
+    for d in range(max_d + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and old_tokens[x] == new_tokens[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace, n, m):
+    # Walk the trace back from (n, m) collecting the equal token pairs, then report the gaps between them.
+    x, y = n, m
+    equal = []
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            equal.append((x, y))
+        x, y = prev_x, prev_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        equal.append((x, y))
+    equal.reverse()
+
+    hunks = []
+    old_at = new_at = 0
+    for old_index, new_index in equal:
+        if old_index != old_at or new_index != new_at:
+            hunks.append((old_at, old_index, new_at, new_index))
+        old_at, new_at = old_index + 1, new_index + 1
+    if old_at != n or new_at != m:
+        hunks.append((old_at, n, new_at, m))
+    return hunks
+
+
+def _word_jump_target(text, position):
+    # Where ctrl+left lands: skip spaces, then the word before them.
+    while position > 0 and text[position - 1] == " ":
+        position -= 1
+    while position > 0 and (text[position - 1].isalnum() or text[position - 1] == "_"):
+        position -= 1
+    return position
+
+
+def _move(text, start, target, absolute_moves):
+    """
+    Cheapest way to move the cursor from `start` to `target` in `text`.
+    Returns (cost, steps).
+    """
+    if start == target:
+        return 0, []
+    if target > start:
+        best = (target - start, [("right", target - start)])
+    else:
+        best = (start - target, [("left", start - target)])
+    if absolute_moves:
+        options = [(1 + target, [("document_start", 1)] + ([("right", target)] if target else []))]
+        tail = len(text) - target
+        options.append((1 + tail, [("document_end", 1)] + ([("left", tail)] if tail else [])))
+        best = min([best] + options, key=lambda option: option[0])
+    if target < start and _PLAIN_WORDS.fullmatch(text[target:start]):
+        jumps, position = 0, start
+        while True:
+            landing = _word_jump_target(text, position)
+            if landing < target or landing == position:
+                break
+            jumps, position = jumps + 1, landing
+        if jumps:
+            steps = [("word_left", jumps)]
+            if position > target:
+                steps.append(("left", position - target))
+            best = min(best, (jumps + position - target, steps), key=lambda option: option[0])
+    return best
+
+
+def _script_for_hunks(old, hunks, absolute_moves):
+    """
+    Builds the script that applies `hunks` (old_start, old_end, replacement) right to left,
+    starting with the cursor at the end of `old`. Returns (cost, steps).
+    """
+    text = old
+    cursor = len(old)
+    cost = 0
+    steps = []
+    for old_start, old_end, replacement in reversed(hunks):
+        move_cost, move_steps = _move(text, cursor, old_end, absolute_moves)
+        cost += move_cost
+        steps += move_steps
+        if old_end > old_start:
+            cost += 1
+            steps.append(("backspace", old_end - old_start))
+            # Holding backspace is one press per character.
+            cost += old_end - old_start - 1
+        if replacement:
+            cost += len(replacement)
+            steps.append(("type", replacement))
+        text = text[:old_start] + replacement + text[old_end:]
+        cursor = old_start + len(replacement)
+    move_cost, move_steps = _move(text, cursor, len(text), absolute_moves)
+    return cost + move_cost, steps + move_steps
+
+
+def edit_script(old, new, absolute_moves=None):
+    """
+    Computes the cheapest keystroke script that turns `old` into `new` when the cursor
+    sits at the end of `old`.
+
+    Three candidates are costed, one key press or typed character each, and the
+    cheapest one wins: backspacing to the first difference and retyping (the old
+    behaviour), a single hunk between the common prefix and suffix, and a word level
+    Myers diff of that middle part with cursor moves between the hunks.
+
+    Args:
+    - old: The text currently in the editor.
+    - new: The text the editor should end up with.
+    - absolute_moves: Allow document start/end jumps, defaults to ABSOLUTE_MOVES.
+    """
+    if old == new:
+        return []
+    if absolute_moves is None:
+        absolute_moves = ABSOLUTE_MOVES
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_suffix_length(old[prefix:], new[prefix:])
+    old_end, new_end = len(old) - suffix, len(new) - suffix
+
+    candidates = [
+        _script_for_hunks(old, [(prefix, len(old), new[prefix:])], absolute_moves),
+        _script_for_hunks(old, [(prefix, old_end, new[prefix:new_end])], absolute_moves),
+    ]
+
+    old_tokens = _TOKENS.findall(old[prefix:old_end])
+    new_tokens = _TOKENS.findall(new[prefix:new_end])
+    diff = _myers_hunks(old_tokens, new_tokens) if old_tokens and new_tokens else None
+    if diff is not None:
+        old_offsets = [prefix]
+        for token in old_tokens:
+            old_offsets.append(old_offsets[-1] + len(token))
+        hunks = [
+            (old_offsets[old_start], old_offsets[old_stop], "".join(new_tokens[new_start:new_stop]))
+            for old_start, old_stop, new_start, new_stop in diff
+        ]
+        candidates.append(_script_for_hunks(old, hunks, absolute_moves))
+
+    return min(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def script_cost(script):
+    """
+    Number of key presses and typed characters needed to play `script`.
+    """
+    cost = 0
+    for action, value in script:
+        cost += len(value) if action == "type" else value
+    return cost
+
+
+def apply_script(text, script, cursor=None):
+    """
+    Plays `script` against `text` the way an editor would and returns (text, cursor).
+    Used by the virtual editor and to check scripts without touching the keyboard.
+    """
+    cursor = len(text) if cursor is None else cursor
+    for action, value in script:
+        if action == "type":
+            text = text[:cursor] + value + text[cursor:]
+            cursor += len(value)
+        elif action == "backspace":
+            start = max(0, cursor - value)
+            text = text[:start] + text[cursor:]
+            cursor = start
+        elif action == "left":
+            cursor = max(0, cursor - value)
+        elif action == "right":
+            cursor = min(len(text), cursor + value)
+        elif action == "word_left":
+            for _ in range(value):
+                cursor = _word_jump_target(text, cursor)
+        elif action == "document_start":
+            cursor = 0
+        elif action == "document_end":
+            cursor = len(text)
+        else:
+            raise ValueError(f"Unknown edit script action {action!r}")
+    return text, cursor
@@ -0,0 +1,111 @@
+import re
+
+# Sentences before the new tail that a spoken command may still change.
+WINDOW_SENTENCES = 2
+# Texts shorter than this are always sent whole, the saving would be tiny.
+MIN_WINDOW_CHARS = 400
+# Characters of the text before the window sent along as read-only context.
+CONTEXT_CHARS = 160
+
+# Commands that may touch any part of the text, these always get the full text.
+GLOBAL_COMMANDS = re.compile(
+    r"\b(everything|all of it|all the text|the whole (?:thing|text|document|paragraph)|entire|throughout|"
+    r"every (?:sentence|word|line)|all (?:the )?(?:sentences|words|lines)|first (?:sentence|word|line|paragraph)|"
+    r"(?:at|from) the (?:start|beginning|top)|beginning|summari[sz]e|rewrite|rephrase|translate|undo|redo)\b",
+    re.IGNORECASE,
+)
+
+# Words after a command that name what it applies to, e.g. "delete hello" or 'replace "foo" with bar'.
+_QUOTED = re.compile(r"\"([^\"]+)\"|'([^']+)'")
+_WORD = re.compile(r"[\w']+")
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+_STOP_WORDS = {
+    "the", "a", "an", "and", "or", "to", "of", "in", "on", "for", "with", "word", "words", "letter", "it", "this", "that",
+    "last", "sentence", "please", "make", "capital", "uppercase", "lowercase", "delete", "remove", "replace", "change",
+    "into", "by", "at", "add", "insert", "after", "before", "mark", "question", "comma", "period", "full", "stop",
+}
+
+
+def _sentence_starts(text):
+    starts = [0]
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() < len(text):
+            starts.append(match.end())
+    return starts
+
+
+def _referenced_words(command):
+    quoted = [a or b for a, b in _QUOTED.findall(command)]
+    if quoted:
+        return quoted
+    return [word for word in _WORD.findall(command) if len(word) > 1 and word.lower() not in _STOP_WORDS]
+
+
+def _last_occurrence(text, word):
+    matches = list(re.finditer(r"(?<![\w'])" + re.escape(word) + r"(?![\w'])", text, re.IGNORECASE))
+    return matches[-1].start() if matches else -1
+
+
+def split_for_edit(text, start, sentences=WINDOW_SENTENCES):
+    """
+    Splits `text` into a `prefix` that no command in `text[start:]` can change and the
+    `window` the model has to edit, so that `text == prefix + window`.
+
+    The window is the last `sentences` sentences before `start` plus the new tail. It
+    grows back to the sentence holding a word the command names that is not in the
+    window yet, and covers the whole text for global commands like "delete everything".
+
+    Args:
+    - text: Text on the editor followed by the newly dictated tail.
+    - start: Where the new tail begins.
+    """
+    if start <= MIN_WINDOW_CHARS or GLOBAL_COMMANDS.search(text, start):
+        return "", text
+    before = text[:start]
+    starts = _sentence_starts(before)
+    if len(starts) <= sentences:
+        return "", text
+    window_start = starts[-sentences]
+
+    for word in _referenced_words(text[start:]):
+        if _last_occurrence(text[window_start:start], word) != -1:
+            continue
+        position = _last_occurrence(before[:window_start], word)
+        if position != -1:
+            window_start = max(s for s in starts if s <= position)
+
+    return text[:window_start], text[window_start:]
+
+
+def context_summary(prefix, limit=CONTEXT_CHARS):
+    """
+    Compact read-only context for the model: the end of `prefix`, cut at a word boundary.
+    Returns None for an empty prefix.
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return None
+    if len(prefix) <= limit:
+        return prefix
+    tail = prefix[-limit:]
+    space = tail.find(" ")
+    return "..." + (tail[space + 1:] if space != -1 else tail)
+
+
+if __name__ == "__main__":
+    sentence = "This is sentence number {} of a long dictation session. "
+    full_chars = window_chars = 0
+    text = ""
+    for i in range(200):
+        text += sentence.format(i)
+        command = text + "delete last word"
+        prefix, window = split_for_edit(command, len(text))
+        assert prefix + window == command
+        full_chars += len(command)
+        window_chars += len(window) + len(context_summary(prefix) or "")
+    print(f"Characters sent over 200 commands: {full_chars} full text, {window_chars} windowed ({full_chars / window_chars:.1f}x less)")
+
+    text = text.replace("number 10 ", "number 10 about apples ")
+    for command in ("delete last word", "delete apples", "delete everything"):
+        prefix, window = split_for_edit(text + command, len(text))
+        print(f"{command!r:>20} -> {len(window):>5} of {len(text + command)} chars sent, window starts {window[:30]!r}")
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+LEVEL_PREFIXES = {DEBUG: "  ", INFO: "ℹ️ ", WARNING: "🟠", ERROR: "🔴"}
+
+_STOP = object()
+
+
+def format_event(record):
+    """
+    One console line for an event record: prefix, event name and its fields.
+    """
+    fields = " ".join(f"{key}={value!r}" for key, value in record.items() if key not in ("t", "level", "event", "thread"))
+    return f"{LEVEL_PREFIXES.get(LEVELS.get(record['level']), '  ')} {record['event']} {fields}".rstrip()
+
+
+class EventLogger:
+    """
+    Structured event log written by a background thread.
+
+    Callers only build a small dict and put it on a bounded queue, so logging from the
+    audio callback or a transcript listener never waits on stdout or the disk. When the
+    queue is full the event is dropped and counted instead. Events go to the console
+    at `console_level` and up, and every event goes to a JSON-lines file that
+    `python event_log.py <file>` replays.
+
+    Args:
+    - filename: JSON-lines file, None logs to the console only. See `log_to`.
+    - console_level: Lowest level printed to the console.
+    - queue_size: Events buffered for the writer thread.
+    """
+
+    def __init__(self, filename=None, console_level=INFO, queue_size=10_000):
+        self.filename = filename
+        self.console_level = console_level
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._last_sampled = {}
+        self._suppressed = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def log_to(self, filename):
+        """
+        Sets the JSON-lines file, takes effect for the next event written.
+        """
+        self.filename = filename
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write, name="event-log", daemon=True)
+                self._thread.start()
+
+    def log(self, level, event, **fields):
+        if self._thread is None:
+            self._start()
+        record = {"t": time.time(), "level": LEVEL_NAMES[level], "event": event, "thread": threading.current_thread().name}
+        record.update(fields)
+        try:
+            self._queue.put_nowait((level, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, event, **fields):
+        self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(ERROR, event, **fields)
+
+    def sampled(self, event, interval=1.0, level=DEBUG, **fields):
+        """
+        Logs `event` at most once per `interval` seconds, for things that happen on every
+        audio chunk or partial. The next logged event carries how many were skipped.
+        """
+        now = time.monotonic()
+        if now - self._last_sampled.get(event, float("-inf")) < interval:
+            self._suppressed[event] = self._suppressed.get(event, 0) + 1
+            return
+        self._last_sampled[event] = now
+        suppressed = self._suppressed.pop(event, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self.log(level, event, **fields)
+
+    def _write(self):
+        file = None
+        filename = None
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            level, record = item
+            if self.filename != filename:
+                if file is not None:
+                    file.close()
+                    file = None
+                filename = self.filename
+                if filename is not None:
+                    directory = os.path.dirname(filename)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    file = open(filename, "a", encoding="utf-8")
+            if file is not None:
+                file.write(json.dumps(record, default=str) + "\n")
+                if self._queue.empty():
+                    file.flush()
+            if level >= self.console_level:
+                sys.stdout.write(format_event(record) + "\n")
+                if self._queue.empty():
+                    sys.stdout.flush()
+        if file is not None:
+            file.close()
+
+    def close(self, timeout=2.0):
+        """
+        Writes out the queued events and stops the writer thread.
+        """
+        if self._thread is None:
+            return
+        if self.dropped:
+            self.warning("events.dropped", count=self.dropped)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+def read_events(filename, event=None, level=DEBUG):
+    """
+    Yields the records of a JSON-lines event log.
+
+    Args:
+    - event: Only events whose name starts with this.
+    - level: Only events at this level and up.
+    """
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a log from a crashed session may be cut off.
+                continue
+            if event is not None and not record["event"].startswith(event):
+                continue
+            if LEVELS.get(record["level"], DEBUG) < level:
+                continue
+            yield record
+
+
+# Shared by the whole app, main.py points it at a per-session file.
+events = EventLogger()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays a JSON-lines event log.")
+    parser.add_argument("filename")
+    parser.add_argument("-e", "--event", help="Only events whose name starts with this")
+    parser.add_argument("-l", "--level", choices=list(LEVELS), default="debug")
+    parser.add_argument("-r", "--realtime", action="store_true", help="Wait between events as long as the session did")
+    args = parser.parse_args()
+    previous = None
+    for record in read_events(args.filename, args.event, LEVELS[args.level]):
+        if args.realtime and previous is not None:
+            time.sleep(max(0.0, record["t"] - previous))
+        previous = record["t"]
+        print(f"{time.strftime('%H:%M:%S', time.localtime(record['t']))}.{int(record['t'] % 1 * 1000):03d} [{record['thread']}] {format_event(record)}")
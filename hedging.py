@@ -0,0 +1,584 @@
+import asyncio
+import json
+import queue
+import random
+import threading
+import time
+
+import websockets
+
+from event_log import events
+from houndify_session import HoundifySession
+from tracing import tracer
+
+# Seconds the providers that are not done yet get after the first final of a query.
+FINAL_GRACE = 0.3
+# Seconds after the end of a query at which it settles even without any final.
+FINAL_TIMEOUT = 2.0
+# Seconds without a partial after which the leading provider is overtaken.
+STALL = 0.5
+
+HEDGED = "hedged"
+
+_STOP = object()
+
+
+def _words(text):
+    return text.split()
+
+
+class _Attempt:
+    # What one provider made of one query.
+    __slots__ = ("text", "partials", "rewrites", "final", "confidence", "first_at", "last_at", "final_at")
+
+    def __init__(self):
+        self.text = ""
+        self.partials = 0
+        self.rewrites = 0
+        self.final = None
+        self.confidence = None
+        self.first_at = None
+        self.last_at = None
+        self.final_at = None
+
+    @property
+    def stability(self):
+        return 1 - self.rewrites / self.partials if self.partials else 0.0
+
+
+class _Query:
+    __slots__ = ("id", "started", "ended", "attempts", "leader", "forwarded", "first_forwarded", "first_final_at")
+
+    def __init__(self, query_id, started, providers):
+        self.id = query_id
+        self.started = started
+        self.ended = None
+        self.attempts = {provider: _Attempt() for provider in providers}
+        self.leader = None
+        self.forwarded = ""
+        self.first_forwarded = None
+        self.first_final_at = None
+
+
+class HedgedTranscript:
+    """
+    Races several transcription providers on the same audio and forwards one
+    transcript to a HoundListener-style listener.
+
+    The listener gets the transcript of the whole session, like from a HoundifySession:
+    the settled queries' transcripts joined, then the current query's. When another
+    provider takes over, the part of the current query it sees differently simply
+    changes, the listener types the new words over the old ones.
+
+    Within a query the first provider to send a partial leads and its partials are
+    forwarded. If the leader has been quiet for `stall` seconds when another provider
+    sends one, the other takes over, so one vendor's slow moment does not hold up
+    the text. When the query ends the listener gets the final of the most confident
+    provider, or of the most stable one (fewest rewritten partials) when not all of
+    them report a confidence.
+
+    Providers report from any thread, all arbitration and every listener call happen
+    on one dispatcher thread.
+
+    Args:
+    - providers: Names of the hedged providers, in order of preference.
+    - listener: Gets cumulative partials and a final partial per query, like
+      MyListener gets from Houndify.
+    - final_grace: See FINAL_GRACE.
+    - final_timeout: See FINAL_TIMEOUT.
+    - stall: See STALL.
+    - budget_minutes: Minutes of audio the hedge may send on top of what a single
+      provider would get. Once they are used up only the provider that won most
+      often keeps streaming. None for no cap.
+    - clock: Time source, `time.monotonic` by default.
+    """
+
+    def __init__(self, providers, listener, final_grace=FINAL_GRACE, final_timeout=FINAL_TIMEOUT, stall=STALL,
+                 budget_minutes=None, clock=time.monotonic):
+        self.providers = list(providers)
+        self.active = list(providers)
+        self.listener = listener
+        self.final_grace = final_grace
+        self.final_timeout = final_timeout
+        self.stall = stall
+        self.budget_minutes = budget_minutes
+        self.clock = clock
+        self.extra_seconds = 0.0
+        self.counts = {provider: {"leads": 0, "takeovers": 0, "wins": 0, "late": 0, "audioSeconds": 0.0} for provider in providers}
+        self.queries = 0
+        # The settled queries' transcripts, joined.
+        self.committed = ""
+        self._next_id = 0
+        self._unended = set()
+        self._open = {}
+        self._queue = queue.Queue()
+        self._thread = None
+
+    # Called by the capture and provider threads.
+
+    def start_query(self):
+        """
+        Starts a query for the next utterance and returns its id, to tag what the
+        providers report for it.
+        """
+        self._next_id += 1
+        self._unended.add(self._next_id)
+        self._put("start", self._next_id, self.clock())
+        return self._next_id
+
+    def end_query(self, query_id):
+        self._unended.discard(query_id)
+        self._put("end", query_id, self.clock())
+
+    def partial(self, query_id, provider, transcript):
+        """
+        A provider's transcript of the query so far, the whole of it and not just the
+        words since its previous partial.
+        """
+        self._put("partial", query_id, self.clock(), provider, transcript)
+
+    def final(self, query_id, provider, transcript, confidence=None):
+        self._put("final", query_id, self.clock(), provider, transcript, confidence)
+
+    def audio_sent(self, seconds):
+        """
+        Accounts for `seconds` of audio sent to every active provider. Returns False
+        once the budget is used up and the hedge fell back to a single provider.
+        """
+        for provider in self.active:
+            self.counts[provider]["audioSeconds"] += seconds
+        self.extra_seconds += seconds * (len(self.active) - 1)
+        if self.budget_minutes is None or len(self.active) < 2 or self.extra_seconds < self.budget_minutes * 60:
+            return True
+        self.active = [self.best_provider()]
+        events.warning("hedge.budget_exhausted", minutes=self.budget_minutes, provider=self.active[0])
+        return False
+
+    def best_provider(self):
+        return max(self.active, key=lambda provider: (self.counts[provider]["wins"], self.counts[provider]["leads"], -self.providers.index(provider)))
+
+    def _put(self, *item):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch, name="hedge", daemon=True)
+            self._thread.start()
+        self._queue.put(item)
+
+    def close(self, timeout=None):
+        """
+        Settles the open queries, waiting for their finals as usual, and stops the
+        dispatcher thread.
+        """
+        if self._thread is None:
+            return
+        for query_id in sorted(self._unended):
+            self.end_query(query_id)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # Dispatcher thread.
+
+    def _dispatch(self):
+        stopping = False
+        while True:
+            deadline = self._next_deadline()
+            if stopping and deadline is None:
+                break
+            try:
+                item = self._queue.get(timeout=None if deadline is None else max(0.0, deadline - self.clock()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                try:
+                    getattr(self, "_on_" + item[0])(*item[1:])
+                except Exception as e:
+                    events.error("hedge.error", error=repr(e))
+            self.poll()
+
+    def _next_deadline(self):
+        deadlines = []
+        for query in self._open.values():
+            if query.ended is None:
+                continue
+            if query.first_final_at is not None:
+                deadlines.append(query.first_final_at + self.final_grace)
+            elif query.ended is not None:
+                deadlines.append(query.ended + self.final_timeout)
+        return min(deadlines) if deadlines else None
+
+    def poll(self, now=None):
+        """
+        Settles the queries whose finals are all in or whose time is up.
+        """
+        now = self.clock() if now is None else now
+        for query in list(self._open.values()):
+            if query.ended is None:
+                continue
+            done = all(query.attempts[provider].final is not None for provider in self.active if provider in query.attempts)
+            expired = (
+                query.first_final_at is not None and now >= query.first_final_at + self.final_grace
+                or query.first_final_at is None and now >= query.ended + self.final_timeout
+            )
+            if done or expired:
+                self._settle(query)
+
+    def _on_start(self, query_id, now):
+        self._open[query_id] = _Query(query_id, now, self.active)
+        self.queries += 1
+
+    def _on_end(self, query_id, now):
+        query = self._open.get(query_id)
+        if query is not None and query.ended is None:
+            query.ended = now
+
+    def _on_partial(self, query_id, now, provider, transcript):
+        query = self._open.get(query_id)
+        if query is None or provider not in query.attempts:
+            self.counts[provider]["late"] += 1
+            return
+        attempt = query.attempts[provider]
+        if not transcript or transcript == attempt.text:
+            return
+        previous = _words(attempt.text)
+        if _words(transcript)[:len(previous)] != previous:
+            attempt.rewrites += 1
+        attempt.partials += 1
+        attempt.text = transcript
+        attempt.last_at = now
+        if attempt.first_at is None:
+            attempt.first_at = now
+            tracer.record("hedge.first_partial", now - query.started, provider)
+        if query.leader is None:
+            query.leader = provider
+            self.counts[provider]["leads"] += 1
+        elif query.leader != provider and query.attempts[query.leader].final is None:
+            if now - query.attempts[query.leader].last_at >= self.stall:
+                events.debug("hedge.takeover", query=query_id, provider=provider, leader=query.leader)
+                query.leader = provider
+                self.counts[provider]["takeovers"] += 1
+        if query.leader == provider:
+            self._forward(query, transcript, now)
+
+    def _on_final(self, query_id, now, provider, transcript, confidence):
+        query = self._open.get(query_id)
+        if query is None or provider not in query.attempts:
+            self.counts[provider]["late"] += 1
+            return
+        attempt = query.attempts[provider]
+        attempt.final = transcript or attempt.text
+        attempt.confidence = confidence
+        attempt.final_at = now
+        if query.first_final_at is None:
+            query.first_final_at = now
+        if query.ended is not None:
+            tracer.record("hedge.final", now - query.ended, provider)
+
+    def _session_text(self, transcript):
+        return f"{self.committed} {transcript}" if self.committed and transcript else self.committed or transcript
+
+    def _forward(self, query, transcript, now):
+        if transcript == query.forwarded:
+            return
+        if query.first_forwarded is None:
+            query.first_forwarded = now
+            tracer.record("hedge.first_partial", now - query.started, HEDGED)
+        query.forwarded = transcript
+        self.listener.onPartialTranscript(self._session_text(transcript))
+
+    def pick(self, query):
+        """
+        Returns the provider whose transcript of `query` is kept.
+        """
+        finished = [provider for provider, attempt in query.attempts.items() if attempt.final is not None]
+        candidates = finished or [provider for provider, attempt in query.attempts.items() if attempt.text]
+        if not candidates:
+            return None
+        attempts = query.attempts
+        order = self.providers.index
+        if len(candidates) > 1 and all(attempts[provider].confidence is not None for provider in candidates):
+            return max(candidates, key=lambda provider: (attempts[provider].confidence, -order(provider)))
+        return max(candidates, key=lambda provider: (attempts[provider].stability, provider == query.leader, -order(provider)))
+
+    def _settle(self, query):
+        del self._open[query.id]
+        winner = self.pick(query)
+        if winner is None:
+            return
+        attempt = query.attempts[winner]
+        transcript = attempt.final if attempt.final is not None else attempt.text
+        self.counts[winner]["wins"] += 1
+        events.info(
+            "hedge.settled", query=query.id, winner=winner, transcript=transcript,
+            candidates={provider: attempt.final for provider, attempt in query.attempts.items()},
+        )
+        now = self.clock()
+        self._forward(query, transcript, now)
+        self.committed = self._session_text(transcript)
+        self.listener.onFinalPartialTranscript(self.committed)
+        if query.ended is not None:
+            tracer.record("hedge.final", now - query.ended, HEDGED)
+
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "active": list(self.active),
+            "extraMinutes": self.extra_seconds / 60,
+            "providers": {provider: dict(counts) for provider, counts in self.counts.items()},
+        }
+
+
+class DeepgramFeed:
+    """
+    Streams hedged audio to one Deepgram connection and reports its results per query.
+
+    The connection lives on `loop`, the other methods can be called from any thread.
+    A query's transcript is the `is_final` results since it started plus the latest
+    interim one. `end_query` asks Deepgram to finalize, and its reply is the query's
+    final, with the mean confidence of its results.
+
+    Args:
+    - hedge: The HedgedTranscript to report to.
+    - url: Streaming endpoint, with the encoding and `interim_results=true`.
+    - key: Deepgram API key.
+    - loop: A running event loop.
+    - byte_rate: Bytes per second of the audio, to tell results of earlier queries apart.
+    - keepalive_interval: Seconds of silence after which a KeepAlive is sent.
+    - pool: A DeepgramConnectionPool on `loop` to take the connection from.
+    """
+
+    name = "deepgram"
+
+    def __init__(self, hedge, url, key, loop, byte_rate, keepalive_interval=5, pool=None):
+        self.hedge = hedge
+        self.url = url
+        self.key = key
+        self.loop = loop
+        self.byte_rate = byte_rate
+        self.keepalive_interval = keepalive_interval
+        self.pool = pool
+        self._queue = None
+        self._ws = None
+        self._task = None
+        self._sent_seconds = 0.0
+        self._query = None
+        self._query_start = 0.0
+        self._finals = []
+        self._confidences = []
+        self._ending = False
+
+    def open(self, timeout=10):
+        asyncio.run_coroutine_threadsafe(self._connect(), self.loop).result(timeout)
+        return self
+
+    async def _connect(self):
+        self._queue = asyncio.Queue()
+        if self.pool is not None:
+            self._ws = await self.pool.acquire(self.url)
+        else:
+            self._ws = await websockets.connect(self.url, extra_headers={"Authorization": f"Token {self.key}"})
+        events.info("hedge.deepgram_connected", request_id=self._ws.response_headers.get("dg-request-id"))
+        self._task = asyncio.gather(self._sender(), self._receiver())
+
+    async def _sender(self):
+        while True:
+            try:
+                item = await asyncio.wait_for(self._queue.get(), self.keepalive_interval)
+            except asyncio.TimeoutError:
+                await self._ws.send(json.dumps({"type": "KeepAlive"}))
+                continue
+            if item is _STOP:
+                await self._ws.send(json.dumps({"type": "CloseStream"}))
+                return
+            await self._ws.send(item)
+
+    async def _receiver(self):
+        async for message in self._ws:
+            res = json.loads(message)
+            if "channel" not in res or self._query is None:
+                continue
+            if res.get("start", 0.0) + res.get("duration", 0.0) < self._query_start:
+                # Left over from a query that has settled.
+                self.hedge.counts[self.name]["late"] += 1
+                continue
+            alternative = (res["channel"].get("alternatives") or [{}])[0]
+            transcript = alternative.get("transcript", "")
+            if res.get("is_final"):
+                if transcript:
+                    self._finals.append(transcript)
+                    self._confidences.append(alternative.get("confidence"))
+                text = " ".join(self._finals)
+            else:
+                text = " ".join(self._finals + ([transcript] if transcript else []))
+            if text:
+                self.hedge.partial(self._query, self.name, text)
+            if self._ending and (res.get("from_finalize") or res.get("speech_final")):
+                confidences = [confidence for confidence in self._confidences if confidence is not None]
+                confidence = sum(confidences) / len(confidences) if confidences else None
+                self.hedge.final(self._query, self.name, " ".join(self._finals), confidence)
+                self._ending = False
+
+    def _start_query(self, query_id):
+        self._query = query_id
+        self._query_start = self._sent_seconds
+        self._finals = []
+        self._confidences = []
+        self._ending = False
+
+    def _send(self, chunk):
+        self._sent_seconds += len(chunk) / self.byte_rate
+        self._queue.put_nowait(chunk)
+
+    def _end_query(self, query_id):
+        if self._query == query_id:
+            self._ending = True
+            self._queue.put_nowait(json.dumps({"type": "Finalize"}))
+
+    def start_query(self, query_id):
+        self.loop.call_soon_threadsafe(self._start_query, query_id)
+
+    def send(self, chunk):
+        self.loop.call_soon_threadsafe(self._send, bytes(chunk))
+
+    def end_query(self, query_id):
+        self.loop.call_soon_threadsafe(self._end_query, query_id)
+
+    def close(self, timeout=5):
+        async def close():
+            self._queue.put_nowait(_STOP)
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+                pass
+            await self._ws.close()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout + 1)
+
+
+class _HoundifyFeedListener:
+    # Listener of the feed's HoundifySession, reporting to the feed's current query.
+
+    def __init__(self, feed):
+        self.feed = feed
+
+    def onPartialTranscript(self, transcript):
+        self.feed._partial(transcript)
+
+    def onFinalPartialTranscript(self, transcript):
+        self.feed._partial(transcript)
+
+    def onPartialTranscriptRaw(self, response):
+        pass
+
+    def onPartialTranscriptProperties(self, transcript, props):
+        pass
+
+    def onFinalPartialTranscriptProperties(self, transcript, props):
+        pass
+
+    def onFinalResponse(self, response):
+        pass
+
+    def onError(self, err):
+        events.error("hedge.houndify_error", error=str(err))
+
+
+class HoundifyFeed:
+    """
+    Streams hedged audio to Houndify and reports its results per query.
+
+    Houndify ends a request by itself when it hears the end of a query, so one hedged
+    query can span several requests, whose transcripts are joined. The audio goes
+    through one HoundifySession, which moves on to a pre-started request at those
+    turnovers and at the end of every query and finishes the old request on a
+    background thread, so the capture thread never waits for Houndify. A query's final
+    is reported once its last request has finished. Not thread safe, `send` and
+    `end_query` are called from the capture thread like in setup_houndify.
+
+    Args:
+    - hedge: The HedgedTranscript to report to.
+    - client_factory: Creates the client of each request, e.g. a
+      `houndify.StreamingHoundClient` or `HoundifyStandIn.client`.
+    """
+
+    name = "houndify"
+
+    def __init__(self, hedge, client_factory):
+        self.hedge = hedge
+        self.session = HoundifySession(client_factory, _HoundifyFeedListener(self))
+        self._query = None
+
+    def _partial(self, transcript):
+        query_id = self._query
+        if query_id is None:
+            self.hedge.counts[self.name]["late"] += 1
+            return
+        if transcript:
+            self.hedge.partial(query_id, self.name, transcript)
+
+    def _final(self, query_id, transcript):
+        self.hedge.final(query_id, self.name, transcript)
+
+    def start_query(self, query_id):
+        self._query = query_id
+
+    def send(self, chunk):
+        self.session.fill(chunk)
+
+    def end_query(self, query_id):
+        if query_id != self._query:
+            self.session.end_utterance()
+            return
+        self._query = None
+        self.session.end_utterance(lambda transcript: self._final(query_id, transcript))
+
+    def close(self):
+        self.session.close()
+        events.info("hedge.houndify_session", **self.session.stats())
+
+
+def simulate(hedged, queries=2000, seed=3):
+    """
+    Latency to the first forwarded partial when two providers race, each with a 5%
+    chance of a slow moment. Returns the p50, p90 and p99 in seconds, for each
+    provider alone and for the hedge.
+    """
+    rng = random.Random(seed)
+    latencies = {provider: [] for provider in hedged.providers}
+    latencies[HEDGED] = []
+
+    class Sink:
+        def onPartialTranscript(self, transcript):
+            pass
+
+        def onFinalPartialTranscript(self, transcript):
+            pass
+
+    now = 0.0
+    hedged.clock = lambda: now
+    hedged.listener = Sink()
+    for _ in range(queries):
+        query = _Query(0, now, hedged.providers)
+        hedged._open[0] = query
+        arrivals = sorted(
+            (rng.lognormvariate(-1.6, 0.3) + (rng.uniform(1.0, 3.0) if rng.random() < 0.05 else 0.0), provider)
+            for provider in hedged.providers
+        )
+        for delay, provider in arrivals:
+            latencies[provider].append(delay)
+            hedged._on_partial(0, now + delay, provider, "hello world")
+        latencies[HEDGED].append(query.first_forwarded - now)
+        del hedged._open[0]
+        now += 10.0
+
+    def quantiles(values):
+        values = sorted(values)
+        return tuple(values[int(q * len(values))] for q in (0.5, 0.9, 0.99))
+
+    return {provider: quantiles(values) for provider, values in latencies.items()}
+
+
+if __name__ == "__main__":
+    for provider, (p50, p90, p99) in simulate(HedgedTranscript(["deepgram", "houndify"], None)).items():
+        print(f"{provider:>9}: first partial p50 {p50:.2f}s  p90 {p90:.2f}s  p99 {p99:.2f}s")
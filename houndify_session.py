@@ -0,0 +1,327 @@
+import concurrent.futures
+import threading
+import time
+
+from event_log import events
+from tracing import tracer
+
+# A pre-started request idle for longer than this is replaced before it is used.
+SPARE_MAX_AGE = 60
+
+
+class _Request:
+    __slots__ = ("client", "started", "created", "segment", "filled", "retry")
+
+    def __init__(self, client, started, created, segment):
+        self.client = client
+        self.started = started
+        self.created = created
+        self.segment = segment
+        self.filled = False
+        # Replaces a request that failed to start, for the same utterance.
+        self.retry = False
+
+
+class _RequestListener:
+    # Listener of one request, reporting its transcripts to the session.
+
+    def __init__(self, session, segment):
+        self.session = session
+        self.segment = segment
+
+    def onPartialTranscript(self, transcript):
+        self.session._partial(self.segment, transcript)
+
+    def onFinalPartialTranscript(self, transcript):
+        self.session._final_partial(self.segment, transcript)
+
+    def onPartialTranscriptRaw(self, response):
+        self.session.listener.onPartialTranscriptRaw(response)
+
+    def onPartialTranscriptProperties(self, transcript, props):
+        self.session.listener.onPartialTranscriptProperties(transcript, props)
+
+    def onFinalPartialTranscriptProperties(self, transcript, props):
+        self.session.listener.onFinalPartialTranscriptProperties(transcript, props)
+
+    def onFinalResponse(self, response):
+        self.session.listener.onFinalResponse(response)
+
+    def onError(self, err):
+        self.session.listener.onError(err)
+
+
+class HoundifySession:
+    """
+    One dictation over a series of Houndify requests, with a single listener.
+
+    Houndify ends a request when it hears the end of a query. Instead of finishing it
+    and only then starting the next one, the session starts the next request in the
+    background as soon as the current one gets audio, switches the audio over to it
+    the moment the current one ends, and finishes the old one on a background thread.
+    Audio that arrives before a request has started is buffered and handed over in
+    order. Every request is a segment of one transcript, so the listener keeps its
+    editor state for the whole session and sees each request's words appended to the
+    ones before.
+
+    A request that fails to start is replaced by one with a fresh client, which gets
+    the buffered audio. If that one fails too, the utterance's audio is dropped and
+    the listener gets `onError`, the next chunk starts over. A request whose `fill`
+    raises is finished and the audio after it goes to the next request. Listener
+    callbacks run without the session's lock held, so a slow listener never holds up
+    the audio.
+
+    `end_utterance` starts the transcript over, for a listener that wants each
+    utterance on its own like the hedged HoundifyFeed.
+
+    Args:
+    - client_factory: Creates a client for one request at a time, e.g. a
+      `houndify.StreamingHoundClient`. Requests overlap, so each gets its own.
+    - listener: The HoundListener of the whole session, e.g. MyListener.
+    - spare_max_age: See SPARE_MAX_AGE.
+    - clock: Time source, `time.monotonic` by default.
+    """
+
+    def __init__(self, client_factory, listener, spare_max_age=SPARE_MAX_AGE, clock=time.monotonic):
+        self.client_factory = client_factory
+        self.listener = listener
+        self.spare_max_age = spare_max_age
+        self.clock = clock
+        self.requests = 0
+        self.turnovers = 0
+        self.buffered_chunks = 0
+        self.failed_requests = 0
+        self.dropped_chunks = 0
+        self.late_partials = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="houndify-session")
+        self._segments = []
+        # Segments of utterances ended by end_utterance whose requests are still finishing.
+        self._ended = set()
+        self._lock = threading.RLock()
+        # Serializes listener calls, which must not run under `_lock`.
+        self._listener_lock = threading.Lock()
+        self._forwarded = ""
+        self._version = 0
+        self._delivered = 0
+        self._current = None
+        self._spare = None
+        self._buffer = []
+        self._waiting_since = None
+        # Start the first request now, so the first words do not wait for it.
+        self._spare = self._new_request()
+
+    def _new_request(self):
+        with self._lock:
+            self._segments.append("")
+            segment = len(self._segments) - 1
+        self.requests += 1
+        try:
+            client = self.client_factory()
+        except Exception as e:
+            # Reported like a request that failed to start, when it is used.
+            started = concurrent.futures.Future()
+            started.set_exception(e)
+            return _Request(None, started, self.clock(), segment)
+        listener = _RequestListener(self, segment)
+        return _Request(client, self._executor.submit(client.start, listener), self.clock(), segment)
+
+    def _finish(self, request, chunks=()):
+        # Sends the chunks still buffered for the request, if any, and finishes it.
+        def finish():
+            try:
+                request.started.result()
+                for chunk in chunks:
+                    request.client.fill(chunk)
+                request.client.finish()
+            except Exception as e:
+                events.error("houndify.finish_failed", error=repr(e))
+
+        return self._executor.submit(finish)
+
+    # Transcripts, from the clients' threads.
+
+    def transcript(self):
+        with self._lock:
+            return " ".join(text for segment, text in enumerate(self._segments) if text and segment not in self._ended)
+
+    def _partial(self, segment, transcript):
+        with self._lock:
+            if self._segments[segment] is None:
+                self.late_partials += 1
+                return
+            self._segments[segment] = transcript
+            if segment in self._ended:
+                return
+            text = self.transcript()
+            if text == self._forwarded:
+                return
+            self._forwarded = text
+            self._version += 1
+            version = self._version
+        self._deliver(version, self.listener.onPartialTranscript, text)
+
+    def _final_partial(self, segment, transcript):
+        with self._lock:
+            if self._segments[segment] is None:
+                self.late_partials += 1
+                return
+            self._segments[segment] = transcript
+            if segment in self._ended:
+                return
+            text = self.transcript()
+            self._forwarded = text
+            self._version += 1
+            version = self._version
+        self._deliver(version, self.listener.onFinalPartialTranscript, text)
+
+    def _deliver(self, version, callback, text):
+        # Two requests' threads may race here, a transcript older than one already
+        # delivered is dropped instead of going back in time.
+        with self._listener_lock:
+            if version < self._delivered:
+                return
+            self._delivered = version
+            callback(text)
+
+    # Audio, from the capture thread.
+
+    def fill(self, data):
+        """
+        Sends one chunk of speech, moving on to the next request when Houndify ends
+        the current one.
+        """
+        if self._current is None:
+            spare, self._spare = self._spare, None
+            if spare is None or self.clock() - spare.created > self.spare_max_age:
+                if spare is not None:
+                    self._finish(spare)
+                spare = self._new_request()
+            self._current = spare
+            self._waiting_since = self.clock()
+        request = self._current
+        if not request.started.done():
+            self._buffer.append(data)
+            self.buffered_chunks += 1
+            return
+        error = request.started.exception()
+        if error is not None:
+            self._start_failed(request, error, data)
+            return
+        chunks, self._buffer = self._buffer + [data], []
+        if self._waiting_since is not None:
+            # How long the first chunk of the utterance waited for its request.
+            tracer.record("turnover", self.clock() - self._waiting_since, "houndify")
+            self._waiting_since = None
+        if not request.filled:
+            request.filled = True
+            # The current request is under way, get the next one ready.
+            self._spare = self._new_request()
+        for index, chunk in enumerate(chunks):
+            try:
+                done = request.client.fill(chunk)
+            except Exception as e:
+                # Give up on this request, the audio after the chunk goes to the next one.
+                events.error("houndify.fill_failed", segment=request.segment, error=repr(e))
+                self.failed_requests += 1
+                self.dropped_chunks += 1
+                self._current = None
+                self._finish(request)
+                self.listener.onError(e)
+                for rest in chunks[index + 1:]:
+                    self.fill(rest)
+                return
+            if done:
+                events.info("houndify.fill_done", segment=request.segment)
+                self.turnovers += 1
+                self._current = None
+                self._finish(request)
+                # Whatever came after the end of the query goes to the next request.
+                for rest in chunks[index + 1:]:
+                    self.fill(rest)
+                return
+
+    def _start_failed(self, request, error, data):
+        events.error("houndify.start_failed", segment=request.segment, retry=request.retry, error=repr(error))
+        self.failed_requests += 1
+        if not request.retry:
+            # Once more with a fresh client, the audio waits for it in the buffer.
+            self._current = self._new_request()
+            self._current.retry = True
+            self._buffer.append(data)
+            self.buffered_chunks += 1
+            return
+        # End the utterance cleanly, the next chunk starts over with a new request.
+        self.dropped_chunks += len(self._buffer) + 1
+        self._buffer = []
+        self._current = None
+        self._waiting_since = None
+        self.listener.onError(error)
+
+    def end_utterance(self, on_final=None):
+        """
+        Finishes the current request on a background thread, with the audio still
+        buffered for it, and starts the transcript over: the next chunk goes to the
+        spare request and the listener only sees the words from there on.
+
+        Args:
+        - on_final: Called with the ended utterance's transcript once its request has
+          finished, from a background thread. What the request sends after that is dropped.
+        """
+        with self._lock:
+            spare = self._spare.segment if self._spare is not None else None
+            ended = [
+                segment for segment, text in enumerate(self._segments)
+                if text is not None and segment != spare and segment not in self._ended
+            ]
+            self._ended.update(ended)
+            self._forwarded = ""
+        finished = None
+        if self._current is not None:
+            finished = self._finish(self._current, self._buffer)
+            self._current = None
+            self._buffer = []
+            self._waiting_since = None
+
+        def settle(future=None):
+            with self._lock:
+                text = " ".join(self._segments[segment] for segment in ended if self._segments[segment])
+                for segment in ended:
+                    self._segments[segment] = None
+                self._ended.difference_update(ended)
+            if on_final is not None:
+                on_final(text)
+
+        if finished is None:
+            settle()
+        else:
+            finished.add_done_callback(settle)
+
+    def close(self, timeout=10):
+        """
+        Finishes the current request and waits for all of them.
+        """
+        if self._current is not None:
+            if self._buffer:
+                try:
+                    self._current.started.result(timeout)
+                    for chunk in self._buffer:
+                        self._current.client.fill(chunk)
+                except Exception as e:
+                    events.error("houndify.fill_failed", error=repr(e))
+                self._buffer = []
+            self._finish(self._current)
+            self._current = None
+        if self._spare is not None:
+            self._finish(self._spare)
+            self._spare = None
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "turnovers": self.turnovers,
+            "bufferedChunks": self.buffered_chunks,
+            "failedRequests": self.failed_requests,
+            "droppedChunks": self.dropped_chunks,
+            "latePartials": self.late_partials,
+        }
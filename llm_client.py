@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+class LLMError(Exception):
+    pass
+
+
+class AsyncLLMClient:
+    """
+    Non-blocking client for the chat-completions API.
+
+    One pooled aiohttp session is kept per event loop, every request has its own
+    timeout, and at most `max_concurrency` requests are in flight. Cancelling the
+    awaiting task aborts the HTTP request and drops its connection instead of
+    letting it run to completion in the background.
+
+    Args:
+    - api_key: Bearer token sent with every request.
+    - base_url: API root, point it at a local stand-in for offline runs.
+    - timeout: Default per-request timeout in seconds.
+    - max_concurrency: Maximum number of requests in flight.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, timeout=15, max_concurrency=4):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+    async def _bind(self):
+        # aiohttp sessions and asyncio primitives belong to the loop that created them.
+        # aiohttp takes a while to import, so that waits for the first request.
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            await self._release()
+            self._loop = loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _post(self, path, payload, timeout):
+        import aiohttp
+
+        session = await self._bind()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        async with self._semaphore:
+            async with session.post(f"{self.base_url}{path}", json=payload, timeout=client_timeout) as response:
+                if response.status != 200:
+                    raise LLMError(f"{path} returned {response.status}: {await response.text()}")
+                return await response.json()
+
+    async def chat(self, messages, model, timeout=None, **params):
+        """
+        Sends a chat-completions request and returns the content of the first choice.
+
+        Args:
+        - messages: The chat messages.
+        - model: Model name.
+        - timeout: Overrides the default timeout for this request.
+        - params: Extra request fields such as max_tokens.
+        """
+        payload = dict(params, model=model, messages=messages)
+        result = await self._post("/chat/completions", payload, timeout)
+        return result["choices"][0]["message"]["content"]
+
+    async def stream_chat(self, messages, model, timeout=None, **params):
+        """
+        Streams a chat-completions request, yielding content deltas as they arrive.
+        Closing or cancelling the consumer aborts the request.
+
+        Args: as for `chat`.
+        """
+        import aiohttp
+
+        session = await self._bind()
+        payload = dict(params, model=model, messages=messages, stream=True)
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        async with self._semaphore:
+            async with session.post(f"{self.base_url}/chat/completions", json=payload, timeout=client_timeout) as response:
+                if response.status != 200:
+                    raise LLMError(f"/chat/completions returned {response.status}: {await response.text()}")
+                # Server-sent events, one "data: {json}" line per chunk and "data: [DONE]" at the end.
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:"):].strip()
+                    if data == b"[DONE]":
+                        return
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+
+    async def _release(self):
+        # Closes the session on the loop it belongs to. A loop that still runs in another
+        # thread closes it there, with a closed loop its connections are gone already and
+        # only the session is left to mark closed.
+        session = self._session
+        if session is None or session.closed:
+            self._session = None
+            return
+        loop = self._loop
+        if loop is asyncio.get_running_loop() or loop.is_closed():
+            await session.close()
+        elif loop.is_running():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+        else:
+            raise LLMError("The client is still bound to another event loop, close() it there first")
+        self._session = None
+
+    async def close(self):
+        await self._release()
@@ -1,52 +1,166 @@
-import pyaudio
 import argparse
 import asyncio
-import aiohttp
+import importlib
 import json
 import os
+import shutil
 import sys
 import wave
-import websockets
-import keyboard
-import houndify
 
 import threading
+import time
 import signal
 
-from datetime import datetime
-from dotenv import load_dotenv
-from ai import callGPT, callVisionGPT
-from consts import TranscriptType
+import_started = time.perf_counter()
 
-from util import save_frames_and_transcription, save_frames_to_file, take_screenshot
-if os.path.exists('local.env'):
-    load_dotenv('local.env')
-else:
-    load_dotenv()
+from datetime import datetime
+from llm_client import LLMError
+from commands import has_command, interpret_command, may_continue_command
+from streaming_edit import StreamingEdit
+from edit_window import context_summary, split_for_edit
+from debounce import AdaptiveDebounce
+from speculation import Speculation, SpeculationStats, StablePrefix
+from transcript import Transcript
+
+from util import MappedWav, save_recording_and_transcription, take_screenshot
+from recorder import SessionRecorder
+from edit_script import edit_script
+from tracing import tracer
+from event_log import events
+
+# PyAudio, the provider SDKs, websockets, aiohttp and tkinter are imported where they are
+# first used, so getting to the hotkeys only pays for what the chosen provider needs.
+# `python startup_benchmark.py` keeps that under a budget.
+# Importing main.py starts nothing: ai (the edit cache and its writer thread), batch,
+# houndify_session, output_backends and audio_capture are imported on first use, and the
+# environment and event log are set up by begin_run().
 
 startTime = datetime.now()
 
-all_mic_data = []
 all_transcripts = [""]
 
-FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 16000
 CHUNK = 8000
+# Sample rate of the audio sent to AssemblyAI, the capture is resampled to it.
+ASSEMBLY_RATE = 44_100
+
+# Every captured chunk is streamed to disk, only the last few seconds stay in memory.
+recorder = SessionRecorder(CHANNELS, 2, RATE)
+
+# The only owner of the microphone. It is opened by the first session and stays open. Every
+# session and the vision prompt read the same frames through their own cursor, and while any
+# of them does, the recorder writes the frames to the session log through a cursor of its own.
+# CHUNK frames are 0.5 s each and the ring holds the most recent 30 s for a reader that stalls.
+# Created by shared_capture() when the first session needs it.
+capture = None
+
+# Guards creating capture and output_backend, sessions and the vision prompt may start together.
+lazy_lock = threading.Lock()
+
+
+def shared_capture():
+    global capture
+    with lazy_lock:
+        if capture is None:
+            from audio_capture import AudioCapture
+            capture = AudioCapture(CHANNELS, RATE, CHUNK)
+        return capture
+
+
+def open_microphone():
+    # A cursor on the shared capture for one consumer, recorded from now on.
+    capture = shared_capture()
+    recorder.follow(capture)
+    try:
+        return capture.subscribe()
+    except BaseException:
+        recorder.unfollow()
+        raise
 
-audio_queue = asyncio.Queue()
+
+def close_microphone(cursor):
+    cursor.close()
+    recorder.unfollow()
 
 # Mimic sending a real-time stream by sending this many seconds of audio at a time.
 # Used for file "streaming" only.
 REALTIME_RESOLUTION = 0.250
 
+# Deepgram closes the stream after ~10 s without audio, so keep it alive while the VAD gate is closed.
+KEEPALIVE_INTERVAL = 5
+
 subtitle_line_counter = 0
 
+# Apply GPT edits token by token instead of waiting for the whole completion.
+STREAM_EDITS = True
+
+# Delay between the last partial transcript and the GPT edit, shared by all listeners
+# so it keeps learning the speaking rhythm and model latency across utterances.
+debounce = AdaptiveDebounce()
+speculation_stats = SpeculationStats()
+
+# Batched keyboard typing, pasting large insertions through the clipboard when possible.
+# Created by get_output_backend() on the first edit, it imports keyboard.
+output_backend = None
+
+
+def get_output_backend():
+    global output_backend
+    with lazy_lock:
+        if output_backend is None:
+            from output_backends import default_backend
+            output_backend = default_backend()
+        return output_backend
+
+# Per-stage latency histograms are written here on exit and with alt+l, .prom for Prometheus text.
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/latency.json")
+
+# time.perf_counter_ns() of the newest captured audio chunk, where an utterance's timeline starts.
+last_audio_captured = None
+
 args = None
 
-import tkinter as tk
+# The HedgedTranscript of a `--provider hedged` session.
+hedge = None
+
+# Warm Deepgram connections, they live on `loop` between sessions.
+deepgram_pool = None
+
+# alt+i listens for the vision prompt until the end of the utterance, or this many seconds.
+VISION_PROMPT_SECONDS = 15
+
+# Imported in the background once the hotkeys are ready, see preload_provider.
+PRELOAD_MODULES = {
+    "houndify": ["houndify", "pyaudio", "vad"],
+    "deepgram": ["websockets", "pyaudio", "vad", "deepgram_pool"],
+    "hedged": ["houndify", "websockets", "pyaudio", "vad", "hedging"],
+    "assembly": ["assemblyai", "pyaudio", "resample"],
+}
+
+# Preloaded for every provider, they are needed by the first edit.
+PRELOAD_COMMON = ["aiohttp", "ai", "output_backends", "audio_capture"]
+
+
+def begin_run():
+    """
+    Loads local.env (or .env) and starts this run's event log. Called by startup() and
+    the batch and benchmark runs rather than on import.
+    """
+    from dotenv import load_dotenv
+
+    if os.path.exists('local.env'):
+        load_dotenv('local.env')
+    else:
+        load_dotenv()
+    # Hot path logging goes through a background writer, the full session log can be replayed
+    # with `python event_log.py <file>`.
+    events.log_to(os.path.join("logs", "events", f"{startTime.strftime('%Y-%m-%d_%H-%M-%S')}.jsonl"))
+    check_thread()
 
 def create_floating_ui(initial_text="Hello, World!"):
+    import tkinter as tk
+
     # Create the main window
     root = tk.Tk()
     root.title("Floating UI")
@@ -122,32 +236,60 @@ def subtitle_formatter(response, format):
     return subtitle_string
 
 
-# Used for microphone streaming only.
-def mic_callback(input_data, frame_count, time_info, status_flag):
-    audio_queue.put_nowait(input_data)
-    return (input_data, pyaudio.paContinue)
-
+def deepgram_url_for(method, host, model, tier, channels=None, sample_rate=None):
+    deepgram_url = f'{host}/v1/listen?punctuate=true'
 
-async def run(key, method, format, **kwargs):
-    deepgram_url = f'{kwargs["host"]}/v1/listen?punctuate=true'
+    if model:
+        deepgram_url += f"&model={model}"
 
-    if kwargs["model"]:
-        deepgram_url += f"&model={kwargs['model']}"
-
-    if kwargs["tier"]:
-        deepgram_url += f"&tier={kwargs['tier']}"
+    if tier:
+        deepgram_url += f"&tier={tier}"
 
     if method == "mic":
         deepgram_url += "&encoding=linear16&sample_rate=16000"
 
     elif method == "wav":
+        deepgram_url += f'&channels={channels}&sample_rate={sample_rate}&encoding=linear16'
+
+    return deepgram_url
+
+
+def get_deepgram_pool(key):
+    global deepgram_pool
+    if deepgram_pool is None:
+        from deepgram_pool import DeepgramConnectionPool
+        deepgram_pool = DeepgramConnectionPool(key)
+    return deepgram_pool
+
+
+def prewarm_deepgram():
+    # Opens the microphone session's Deepgram connection before the first alt+o.
+    global args
+    args = parse_args()
+    if args.provider != "deepgram" or not args.input.lower().startswith("mic") or args.batch:
+        return
+    url = deepgram_url_for("mic", args.host, args.model, args.tier)
+    key = args.key or os.getenv("DEEPGRAM_API_KEY")
+    # The pool (and websockets) is created on the loop, after the hotkeys are ready.
+    loop.call_soon_threadsafe(lambda: get_deepgram_pool(key).warm(url))
+
+
+async def run(key, method, format, **kwargs):
+    import websockets
+    from vad import VoiceActivityGate
+
+    deepgram_url = deepgram_url_for(method, kwargs["host"], kwargs["model"], kwargs["tier"], kwargs.get("channels"), kwargs.get("sample_rate"))
+
+    if method == "wav":
         data = kwargs["data"]
-        deepgram_url += f'&channels={kwargs["channels"]}&sample_rate={kwargs["sample_rate"]}&encoding=linear16'
 
-    # Connect to the real-time streaming endpoint, attaching our credentials.
-    async with websockets.connect(
-        deepgram_url, extra_headers={"Authorization": "Token {}".format(key)}
-    ) as ws:
+    # Connect to the real-time streaming endpoint, attaching our credentials. A pool
+    # hands over a connection it opened ahead of time.
+    if kwargs.get("pool"):
+        connection = kwargs["pool"].connection(deepgram_url)
+    else:
+        connection = websockets.connect(deepgram_url, extra_headers={"Authorization": "Token {}".format(key)})
+    async with connection as ws:
         print(f'ℹ️  Request ID: {ws.response_headers.get("dg-request-id")}')
         if kwargs["model"]:
             print(f'ℹ️  Model: {kwargs["model"]}')
@@ -161,25 +303,40 @@ async def run(key, method, format, **kwargs):
             )
 
             if method == "mic":
+                global last_audio_captured
+                gate = VoiceActivityGate(RATE, CHANNELS)
+                cursor = open_microphone()
+                last_sent = asyncio.get_running_loop().time()
                 try:
                     while True:
-                        mic_data = await audio_queue.get()
-                        global all_mic_data
-                        all_mic_data.append(mic_data)
-                        print("Length of all_mic_data", len(all_mic_data))
-                        await ws.send(mic_data)
+                        mic_data = await cursor.get()
+                        if mic_data is None:
+                            await ws.send(json.dumps({"type": "CloseStream"}))
+                            break
+                        last_audio_captured = cursor.captured_ns
+                        events.sampled("audio.recorded", seconds=recorder.duration())
+                        for speech_data in gate.process(mic_data):
+                            await ws.send(speech_data)
+                            last_sent = asyncio.get_running_loop().time()
+                        if asyncio.get_running_loop().time() - last_sent >= KEEPALIVE_INTERVAL:
+                            await ws.send(json.dumps({"type": "KeepAlive"}))
+                            last_sent = asyncio.get_running_loop().time()
                 except websockets.exceptions.ConnectionClosedOK:
                     await ws.send(json.dumps({"type": "CloseStream"}))
                     print(
                         "🟢 (5/5) Successfully closed Deepgram connection, waiting for final transcripts if necessary"
                     )
+                    print(f"ℹ️  Audio capture stats: {cursor.stats()}")
 
                 except Exception as e:
                     print(f"Error while sending: {str(e)}")
                     raise
+                finally:
+                    close_microphone(cursor)
 
             elif method == "url":
                 # Listen for the connection to open and send streaming audio from the URL to Deepgram
+                import aiohttp
                 async with aiohttp.ClientSession() as session:
                     async with session.get(kwargs["url"]) as audio:
                         while True:
@@ -191,22 +348,29 @@ async def run(key, method, format, **kwargs):
                                 break
 
             elif method == "wav":
-                nonlocal data
                 # How many bytes are contained in one second of audio?
                 byte_rate = (
                     kwargs["sample_width"] * kwargs["sample_rate"] * kwargs["channels"]
                 )
                 # How many bytes are in `REALTIME_RESOLUTION` seconds of audio?
-                chunk_size = int(byte_rate * REALTIME_RESOLUTION)
+                block_align = kwargs["sample_width"] * kwargs["channels"]
+                chunk_size = int(byte_rate * REALTIME_RESOLUTION) // block_align * block_align
+                # 1 mimics real time, 2 is twice as fast, 0 sends as fast as the socket allows.
+                speed = kwargs.get("speed", 1)
+                start = asyncio.get_running_loop().time()
 
                 try:
-                    while len(data):
-                        chunk, data = data[:chunk_size], data[chunk_size:]
-                        # Mimic real-time by waiting `REALTIME_RESOLUTION` seconds
-                        # before the next packet.
-                        await asyncio.sleep(REALTIME_RESOLUTION)
+                    # `data` is a memoryview, so every slice is zero-copy.
+                    for offset in range(0, len(data), chunk_size):
+                        if speed:
+                            # Pace against the clock, waiting until this packet is due
+                            # at `speed` times real time.
+                            due = start + (offset + chunk_size) / byte_rate / speed
+                            delay = due - asyncio.get_running_loop().time()
+                            if delay > 0:
+                                await asyncio.sleep(delay)
                         # Send the data
-                        await ws.send(chunk)
+                        await ws.send(data[offset:offset + chunk_size])
 
                     await ws.send(json.dumps({"type": "CloseStream"}))
                     print(
@@ -226,6 +390,9 @@ async def run(key, method, format, **kwargs):
 
             async for msg in ws:
                 res = json.loads(msg)
+                if kwargs.get("on_message"):
+                    # Benchmarks time every message, partial ones included.
+                    kwargs["on_message"](res)
                 if first_message:
                     print(
                         "🟢 (3/5) Successfully receiving Deepgram messages, waiting for finalized transcription..."
@@ -247,6 +414,8 @@ async def run(key, method, format, **kwargs):
                             end = words[-1]["end"] if words else None
                             transcript += " [{} - {}]".format(start, end) if (start and end) else ""
                         if transcript != "":
+                            timeline = tracer.timeline("deepgram", last_audio_captured if method == "mic" else None)
+                            timeline.mark("partial")
                             if first_transcript:
                                 print("🟢 (4/5) Began receiving transcription")
                                 # if using webvtt, print out header
@@ -256,9 +425,15 @@ async def run(key, method, format, **kwargs):
                             if format == "vtt" or format == "srt":
                                 transcript = subtitle_formatter(res, format)
                             print(transcript)
-                            keyboard.write(textToOutput(transcript), delay=0.01)
-                            global all_transcripts
-                            all_transcripts.append(transcript)
+                            if kwargs.get("on_transcript"):
+                                # Batch runs collect the text instead of typing it.
+                                kwargs["on_transcript"](transcript)
+                            else:
+                                get_output_backend().type_text(textToOutput(transcript))
+                                global all_transcripts
+                                all_transcripts.append(transcript)
+                            timeline.mark("typed")
+                            timeline.finish()
 
                         # if using the microphone, close stream if user says "goodbye"
                         if method == "mic" and "goodbye" in transcript.lower():
@@ -296,12 +471,9 @@ async def run(key, method, format, **kwargs):
                                         f"{startTime.strftime('%Y%m%d%H%M')}.wav",
                                     )
                                 )
-                                wave_file = wave.open(wave_file_path, "wb")
-                                wave_file.setnchannels(CHANNELS)
-                                wave_file.setsampwidth(SAMPLE_SIZE)
-                                wave_file.setframerate(RATE)
-                                wave_file.writeframes(b"".join(all_mic_data))
-                                wave_file.close()
+                                recorder.flush()
+                                if recorder.filename is not None:
+                                    shutil.copyfile(recorder.filename, wave_file_path)
                                 print(f"🟢 Mic audio saved to {wave_file_path}")
 
                         print(
@@ -310,37 +482,11 @@ async def run(key, method, format, **kwargs):
                 except KeyError:
                     print(f"🔴 ERROR: Received unexpected API response! {msg}")
 
-        # Set up microphone if streaming from mic
-        async def microphone():
-            audio = pyaudio.PyAudio()
-            stream = audio.open(
-                format=FORMAT,
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK,
-                stream_callback=mic_callback,
-            )
-
-            stream.start_stream()
-
-            global SAMPLE_SIZE
-            SAMPLE_SIZE = audio.get_sample_size(FORMAT)
-
-            while stream.is_active():
-                await asyncio.sleep(0.1)
-
-            stream.stop_stream()
-            stream.close()
-
         functions = [
             asyncio.ensure_future(sender(ws)),
             asyncio.ensure_future(receiver(ws)),
         ]
 
-        if method == "mic":
-            functions.append(asyncio.ensure_future(microphone()))
-
         await asyncio.gather(*functions)
 
 
@@ -398,7 +544,7 @@ def parse_args():
     parser.add_argument(
         "-p",
         "--provider",
-        help="The provider to use for the audio. Can be 'Deepgram' or 'Assembly AI'. Defaults to 'deepgram'.",
+        help="The provider to use for the audio. Can be 'Deepgram' or 'Assembly AI', or 'hedged' to race the --providers against each other. Defaults to 'deepgram'.",
         nargs="?",
         const=1,
         default="houndify"
@@ -445,6 +591,54 @@ def parse_args():
         default="text",
         type=validate_format,
     )
+    parser.add_argument(
+        "-s",
+        "--speed",
+        help='How fast to stream a WAV input, as a multiple of real time. 0 streams as fast as possible. Defaults to 1.',
+        nargs="?",
+        const=0,
+        default=1,
+        type=float,
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        help='Re-transcribe every WAV file under this directory (e.g. logs/) with Deepgram, writing a .batch.json result next to each one. Already transcribed files are skipped. Combine with "--speed 0" to skip real-time pacing.',
+        default=None,
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        help='How many streaming connections a batch run keeps open at once. Defaults to 4.',
+        default=4,
+        type=int,
+    )
+    parser.add_argument(
+        "--benchmark",
+        help='Replay every recording under this directory (e.g. logs/) that has a reference transcript through the providers and report WER and latency. Offline runs use the responses recorded by a "--live" run, or the transcript in the recording\'s JSON file, in which case WER is only scored against a separate .reference.txt. Latencies are wall-clock, only compare runs at the same --speed.',
+        default=None,
+    )
+    parser.add_argument(
+        "--providers",
+        help='Comma separated providers to benchmark, or to hedge with "--provider hedged" in order of preference. Defaults to "deepgram,houndify".',
+        default="deepgram,houndify",
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        help='Minutes of audio a hedged session may send on top of what a single provider would get, after which only the provider that won most often is kept. Defaults to no cap.',
+        default=None,
+        type=float,
+    )
+    parser.add_argument(
+        "--live",
+        help='Benchmark against the real services and record their responses for offline runs.',
+        action="store_true",
+    )
+    parser.add_argument(
+        "--baseline",
+        help='A previous benchmark result (logs/benchmark/*.json) to check for regressions. Exits with 1 if WER or latency got worse.',
+        default=None,
+    )
     #Parse the host
     parser.add_argument(
         "--host",
@@ -472,7 +666,20 @@ def main():
     # Parse the command-line arguments.
     global args
     args = parse_args()
+    if args.benchmark:
+        from provider_benchmark import run_benchmark
+        runners = {"deepgram": benchmark_deepgram, "houndify": benchmark_houndify}
+        providers = [provider.strip().lower() for provider in args.providers.split(",") if provider.strip()]
+        unknown = [provider for provider in providers if provider not in runners]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"🔴 Can not benchmark {', '.join(unknown)}, only {', '.join(runners)}.")
+        if run_benchmark(args.benchmark, runners, providers, live=args.live, baseline=args.baseline):
+            sys.exit(1)
+        return
     provider = args.provider
+    if args.batch:
+        # Batch runs always go through Deepgram's streaming endpoint.
+        provider = "deepgram"
     print("The provider is", provider)
     if provider == "assembly":
         run_assembly()
@@ -482,43 +689,49 @@ def main():
         setup_houndify()
         return
 
-    input = "mic"
+    if provider == "hedged":
+        providers = [provider.strip().lower() for provider in args.providers.split(",") if provider.strip()]
+        setup_hedged(providers, budget_minutes=args.hedge_budget)
+        return
+
+    import websockets
+
+    input = args.input
     key = os.getenv("DEEPGRAM_API_KEY")
     format = args.format.lower()
     host = args.host
 
     try:
-        if input.lower().startswith("mic"):
-            asyncio.run(run(key, "mic", format, model=args.model, tier=args.tier, host=host, timestamps=args.timestamps))
+        if args.batch:
+            asyncio.run(run_batch(args.key or key, args.batch, format, host))
+
+        elif input.lower().startswith("mic"):
+            # Runs on `loop`, where the warm connections live.
+            pool = get_deepgram_pool(args.key or key)
+            asyncio.run_coroutine_threadsafe(
+                run(key, "mic", format, model=args.model, tier=args.tier, host=host, timestamps=args.timestamps, pool=pool), loop
+            ).result()
 
         elif input.lower().endswith("wav"):
             if os.path.exists(input):
-                # Open the audio file.
-                with wave.open(input, "rb") as fh:
-                    (
-                        channels,
-                        sample_width,
-                        sample_rate,
-                        num_samples,
-                        _,
-                        _,
-                    ) = fh.getparams()
-                    assert sample_width == 2, "WAV data must be 16-bit."
-                    data = fh.readframes(num_samples)
+                # Memory-map the audio file instead of reading it all in.
+                with MappedWav(input) as fh:
+                    assert fh.sample_width == 2, "WAV data must be 16-bit."
                     asyncio.run(
                         run(
-                            args.key,
+                            args.key or key,
                             "wav",
                             format,
                             model=args.model,
                             tier=args.tier,
-                            data=data,
-                            channels=channels,
-                            sample_width=sample_width,
-                            sample_rate=sample_rate,
+                            data=fh.data,
+                            channels=fh.channels,
+                            sample_width=fh.sample_width,
+                            sample_rate=fh.sample_rate,
                             filepath=args.input,
                             host=host,
                             timestamps=args.timestamps,
+                            speed=args.speed,
                         )
                     )
             else:
@@ -569,12 +782,109 @@ def main():
         return
 
 
+async def run_batch(key, directory, format, host):
+    from batch import transcribe_directory
+
+    async def transcribe(filename, wav):
+        parts = []
+        await run(
+            key,
+            "wav",
+            format,
+            model=args.model,
+            tier=args.tier,
+            data=wav.data,
+            channels=wav.channels,
+            sample_width=wav.sample_width,
+            sample_rate=wav.sample_rate,
+            filepath=filename,
+            host=host,
+            timestamps=args.timestamps,
+            speed=args.speed,
+            on_transcript=parts.append,
+        )
+        return " ".join(parts)
+
+    return await transcribe_directory(directory, transcribe, concurrency=args.concurrency, label=args.model)
+
+
+def benchmark_deepgram(wav_filename, events=None):
+    """
+    Streams a recording through `run`, to Deepgram when `events` is None and to a
+    stand-in replaying `events` otherwise. Returns its TranscriptTimeline.
+    """
+    from provider_benchmark import TranscriptTimeline
+    from standins import DeepgramStandIn
+
+    timeline = TranscriptTimeline()
+
+    async def stream(wav, host, key):
+        timeline.start()
+        await run(
+            key,
+            "wav",
+            "text",
+            model=args.model,
+            tier=args.tier,
+            data=wav.data,
+            channels=wav.channels,
+            sample_width=wav.sample_width,
+            sample_rate=wav.sample_rate,
+            filepath=wav_filename,
+            host=host,
+            timestamps=False,
+            speed=args.speed,
+            on_transcript=lambda transcript: None,
+            on_message=timeline.deepgram_message,
+        )
+
+    async def benchmark(wav):
+        if events is None:
+            await stream(wav, args.host, args.key or os.getenv("DEEPGRAM_API_KEY"))
+            return
+        # The stand-in measures offsets in 16 bit samples, across all channels.
+        async with DeepgramStandIn(sample_rate=wav.sample_rate * wav.channels, events=events) as server:
+            await stream(wav, f"ws://{server.host}:{server.port}", "stand-in")
+
+    with MappedWav(wav_filename) as wav:
+        assert wav.sample_width == 2, "WAV data must be 16-bit."
+        asyncio.run(benchmark(wav))
+    return timeline
+
+
+def benchmark_houndify(wav_filename, events=None):
+    """
+    Feeds a recording through `setup_houndify` like microphone audio, to Houndify when
+    `events` is None and to a stand-in replaying `events` otherwise. Recordings in
+    another format are converted to the microphone's first. Returns its
+    TranscriptTimeline, or None if the recording is not 16 bit.
+    """
+    from provider_benchmark import TimingListener, TranscriptTimeline, paced_chunks
+    from resample import convert
+    from standins import HoundifyStandIn
+
+    with MappedWav(wav_filename) as wav:
+        if wav.sample_width != 2:
+            print(f"ℹ️  Skipping {wav_filename} for houndify, it is not 16 bit")
+            return None
+        data = wav.data
+        if (wav.channels, wav.sample_rate) != (CHANNELS, RATE):
+            data = convert(wav.data, wav.sample_rate, wav.channels, RATE, CHANNELS)
+        timeline = TranscriptTimeline(cumulative=True)
+        client_factory = houndify_client_from_env if events is None else HoundifyStandIn(events, RATE).client
+        timeline.start()
+        chunks = paced_chunks(data, CHUNK * 2, RATE * 2, args.speed)
+        setup_houndify(client_factory, chunks, lambda: TimingListener(timeline))
+    return timeline
+
+
 def run_deepgram():
     print("Running Deepgram")
 
 def run_assembly():
 
     import assemblyai as aai
+    from resample import AudioConverter
     aai.settings.api_key = os.getenv("ASSEMBLY_API_KEY")
     def on_open(session_opened: aai.RealtimeSessionOpened):
     # "This function is called when the connection has been established."
@@ -587,7 +897,7 @@ def run_assembly():
 
         if isinstance(transcript, aai.RealtimeFinalTranscript):
             print(transcript.text, end="\r\n")
-            keyboard.write(textToOutput(transcript.text), delay=0.01)
+            get_output_backend().type_text(textToOutput(transcript.text))
         else:
             print(transcript.text, end="\r")
 
@@ -602,7 +912,7 @@ def run_assembly():
     transcriber = aai.RealtimeTranscriber(
     on_data=on_data,
     on_error=on_error,
-    sample_rate=44_100,
+    sample_rate=ASSEMBLY_RATE,
     on_open=on_open, # optional
     on_close=on_close, # optional
     )
@@ -610,12 +920,16 @@ def run_assembly():
     # Start the connection
     transcriber.connect()
 
-    # Open a microphone stream
+    # Read the shared microphone capture, converted to AssemblyAI's rate on the way.
     print("Opening microphone stream")
-    microphone_stream = aai.extras.MicrophoneStream()
+    cursor = open_microphone()
+    converter = AudioConverter(RATE, CHANNELS, ASSEMBLY_RATE)
 
     # Press CTRL+C to abort
-    transcriber.stream(microphone_stream)
+    try:
+        transcriber.stream(converter.stream(read_microphone(cursor, "assembly")))
+    finally:
+        close_microphone(cursor)
 
     transcriber.close()
     
@@ -624,114 +938,189 @@ def run_assembly():
 # if __name__ == "__main__":
 #     sys.exit(main() or 0)
 
-audio = pyaudio.PyAudio()
-
-# Start recording
-stream = audio.open(format=FORMAT, channels=CHANNELS,
-                    rate=RATE, input=True,
-                    frames_per_buffer=CHUNK)
-class Transcript:
-    def __init__(self):
-        self.raw_transcript = ""
-        self.transcript_on_editor = (0, "")
-        
-    # This will be called by the callback
-    def getTranscriptOnEditor(self):
-        return self.transcript_on_editor[1]
-
-    def setTranscriptOnEditor(self, transcript, location):
-        self.transcript_on_editor = (location, transcript)
-
-    def getRawTranscript(self):
-        return self.raw_transcript
+def houndify_client_from_env():
+    import houndify
 
-    def setRawTranscript(self, transcript):
-        self.raw_transcript = transcript
-
-    def transcriptAfterCommands(self, transcript_from_server):
-        transcript_from_server = self.transcript_on_editor[1] + transcript_from_server[self.transcript_on_editor[0]:]
-        return transcript_from_server
-
-    def isTranscriptProcessed(self, raw_transcript):
-        return self.raw_transcript == raw_transcript
-    
-    def setRawTranscript(self, raw_transcript):
-        self.raw_transcript = raw_transcript
-
-
-def setup_houndify():
     client_id = os.getenv("HOUNDIFY_CLIENT_ID")
     client_key = os.getenv("HOUNDIFY_CLIENT_KEY")
     user_id = "test"
-    houndify_client = houndify.StreamingHoundClient(client_id, client_key, userID=user_id, sampleRate=RATE, requestInfo={
+    return houndify.StreamingHoundClient(client_id, client_key, userID=user_id, sampleRate=RATE, requestInfo={
         "PartialTranscriptsDesired": True,
         "ReturnResponseAudioAsURL": True,
         "UseFormattedTranscriptionAsDefault": True
     }, saveQuery=True)
-    # houndify_client.start(MyListener())
-    audio = pyaudio.PyAudio()
-    stream = audio.open(
-        format=FORMAT,
-        channels=CHANNELS,
-        rate=RATE,
-        input=True,
-        frames_per_buffer=CHUNK,
-    )
-    stream.start_stream()
-    stoped = True
+
+
+def read_microphone(cursor, provider="houndify"):
+    # Yields the microphone audio of a capture cursor chunk by chunk.
+    global last_audio_captured
+    while True:
+        with tracer.span("mic_read", provider):
+            data = cursor.read()
+        if data is None:
+            return
+        last_audio_captured = cursor.captured_ns
+        yield data
+
+
+def setup_houndify(client_factory=None, chunks=None, listener_factory=None):
+    """
+    Streams audio to Houndify as one HoundifySession, which moves on to a pre-started
+    request whenever Houndify ends a query.
+
+    Args:
+    - client_factory: Creates the client of each request, defaults to a
+      StreamingHoundClient with the keys from the environment.
+    - chunks: Audio chunks to send instead of the microphone, e.g. a recording to benchmark.
+    - listener_factory: Creates the listener of the session, defaults to MyListener.
+    """
+    from houndify_session import HoundifySession
+    from vad import VoiceActivityGate
+
+    session = HoundifySession(client_factory or houndify_client_from_env, (listener_factory or MyListener)())
+    cursor = None
+    if chunks is None:
+        cursor = open_microphone()
+        chunks = read_microphone(cursor)
+    gate = VoiceActivityGate(RATE, CHANNELS)
     try:
-        # for _ in (1000):
-        while True:
-            if stoped:
-                houndify_client.start(MyListener())
-                stoped = False
-            data = stream.read(CHUNK)
-            global all_mic_data
-            all_mic_data.append(data)
-            # Check if there's some noise (data) before sending it to houndify_client
-            if any(byte != b'\x00' for byte in data):
-                # print("Filling the data")
-                if houndify_client.fill(data):
-                    print("Detecting Fill done")
-                    stoped = True
-                    houndify_client.finish()
-            else:
-                print("No data to send")
+        for data in chunks:
+            # Only send speech (plus its pre-roll and hangover) to Houndify
+            speech_chunks = gate.process(data)
+            if gate.speech_paused or gate.end_of_speech:
+                debounce.end_of_utterance()
+            if not speech_chunks:
+                events.sampled("houndify.gate_closed", noise_floor_db=gate.noise_floor_db)
+            for speech_data in speech_chunks:
+                session.fill(speech_data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Let the last query finish.
+        session.close()
+        if cursor is not None:
+            close_microphone(cursor)
+    print(f"ℹ️  Houndify session: {session.stats()}")
+    return session
+
+
+def setup_hedged(providers, chunks=None, listener_factory=None, deepgram_host=None, deepgram_key=None, houndify_client_factory=None, budget_minutes=None):
+    """
+    Streams the same speech to several providers at once and types whichever
+    transcript wins, see hedging.HedgedTranscript. Each utterance the VAD gate hears
+    is one query.
+
+    Args:
+    - providers: "deepgram" and/or "houndify", in order of preference.
+    - chunks: Audio chunks to send instead of the microphone.
+    - listener_factory: Creates the listener of the session, defaults to MyListener.
+    - deepgram_host: E.g. a DeepgramStandIn's URL, defaults to --host.
+    - deepgram_key: Defaults to --key or DEEPGRAM_API_KEY.
+    - houndify_client_factory: Creates the client of each Houndify request, defaults to a
+      StreamingHoundClient with the keys from the environment.
+    - budget_minutes: See HedgedTranscript.
+    """
+    from hedging import DeepgramFeed, HedgedTranscript, HoundifyFeed
+    from vad import VoiceActivityGate
+
+    global hedge
+    unknown = [provider for provider in providers if provider not in ("deepgram", "houndify")]
+    if unknown or len(providers) < 2:
+        raise argparse.ArgumentTypeError(f"🔴 Hedging needs two or more of deepgram and houndify, got {', '.join(providers)}.")
+    hedge = HedgedTranscript(providers, (listener_factory or MyListener)(), budget_minutes=budget_minutes)
+    feeds = {}
+    if "deepgram" in providers:
+        url = f"{deepgram_host or args.host}/v1/listen?punctuate=true&interim_results=true&encoding=linear16&sample_rate={RATE}&channels={CHANNELS}"
+        if args.model:
+            url += f"&model={args.model}"
+        if args.tier:
+            url += f"&tier={args.tier}"
+        key = deepgram_key or args.key or os.getenv("DEEPGRAM_API_KEY")
+        feeds["deepgram"] = DeepgramFeed(hedge, url, key, loop, 2 * RATE * CHANNELS, KEEPALIVE_INTERVAL, get_deepgram_pool(key)).open()
+    if "houndify" in providers:
+        feeds["houndify"] = HoundifyFeed(hedge, houndify_client_factory or houndify_client_from_env)
+    print(f"🟢 Hedging {' and '.join(providers)}")
+
+    cursor = None
+    if chunks is None:
+        cursor = open_microphone()
+        chunks = read_microphone(cursor, "hedged")
+    gate = VoiceActivityGate(RATE, CHANNELS)
+    query = None
+
+    def end_query():
+        hedge.end_query(query)
+        for provider in hedge.active:
+            feeds[provider].end_query(query)
+
+    try:
+        for data in chunks:
+            speech_chunks = gate.process(data)
+            if gate.speech_paused or gate.end_of_speech:
+                debounce.end_of_utterance()
+            for speech_data in speech_chunks:
+                if query is None:
+                    query = hedge.start_query()
+                    for provider in hedge.active:
+                        feeds[provider].start_query(query)
+                for provider in hedge.active:
+                    feeds[provider].send(speech_data)
+                if not hedge.audio_sent(len(speech_data) / (2 * RATE * CHANNELS)):
+                    print(f"ℹ️  Hedge budget used up, continuing with {hedge.active[0]} only")
+                    for provider in set(feeds) - set(hedge.active):
+                        feeds.pop(provider).close()
+            if gate.end_of_speech and query is not None:
+                end_query()
+                query = None
     except KeyboardInterrupt:
-        stream.stop_stream()
-        stream.close()
-        audio.terminate()
-    # houndify_client.finish()
-    return houndify_client
+        pass
+    finally:
+        if query is not None:
+            end_query()
+        # Let the open queries settle before the connections go.
+        hedge.close()
+        for feed in feeds.values():
+            feed.close()
+        if cursor is not None:
+            close_microphone(cursor)
+    print(f"ℹ️  Hedged providers: {hedge.stats()}")
+    return hedge
 
 loop = asyncio.new_event_loop()
 # loop.run_forever()
 
 def check_thread():
     current_thread = threading.current_thread()
-    print(f"Current thread: {current_thread.name}")
+    events.sampled("thread", name=current_thread.name)
 
-check_thread()
-
-class MyListener(houndify.HoundListener):
+# Implements houndify.HoundListener's callbacks without subclassing it, so the SDK is
+# only imported once a Houndify client is created.
+class MyListener:
   def __init__(self):
     self.transcript = Transcript()
     self.identify_command_future = None  # Future for debouncing
+    self.command_start = None  # Where the text not yet checked for commands begins
+    self.edit_settled = threading.Event()  # Cleared while a streamed edit may be half applied
+    self.edit_settled.set()
+    self.speculation = None  # The running model call, kept while the transcript only grows
+    self.speculation_lock = threading.RLock()
+    self.stable_prefix = StablePrefix()  # What the partials have stopped revising
 
   def onFinalPartialTranscript(self, transcript):
-    print("The Final Partial transcript", transcript)
+    events.info("houndify.final_partial", transcript=transcript)
+    debounce.end_of_utterance()
     return
 
   def onPartialTranscriptRaw(self, response):
-    print("The PartialTranscriptRaw response is", response)
+    events.debug("houndify.partial_raw", response=response)
     return
   
   def onFinalPartialTranscriptProperties(self, transcript, props):
-    print("The Final Partial transcript", transcript, props)
+    events.debug("houndify.final_partial_properties", transcript=transcript, props=props)
     return
   
   def onPartialTranscriptProperties(self, transcript, props):
-    print("The Partial transcript", transcript, props)
+    events.debug("houndify.partial_properties", transcript=transcript, props=props)
   
   def onPartialTranscript(self, transcript_from_houndify):
     if (transcript_from_houndify == ""):
@@ -742,7 +1131,27 @@ class MyListener(houndify.HoundListener):
     
     check_thread()
     
-    print(transcript_from_houndify)
+    events.info("houndify.partial", transcript=transcript_from_houndify)
+    timeline = tracer.timeline("houndify", last_audio_captured)
+    timeline.mark("partial")
+    debounce.observe_partial(transcript_from_houndify)
+    stable = self.stable_prefix.observe(transcript_from_houndify)
+    pending = self.identify_command_future is not None and not self.identify_command_future.done()
+    if pending and self.extend_speculation(transcript_from_houndify):
+        return
+    if pending:
+        # This partial supersedes the running edit. Stop it and let it put back
+        # the editor text if it was streaming, before we read that text below.
+        self.identify_command_future.cancel()
+        self.edit_settled.wait(0.5)
+    shown = self.transcript.getTranscriptOnEditor()
+    if self.transcript.rebase(transcript_from_houndify):
+        # Words already typed were revised, or another provider took over. The editor goes
+        # back to the last state this transcript continues and the rest is typed over.
+        events.info("edit.rebase", location=self.transcript.transcript_on_editor[0])
+        insert_at_cursor(generate_raw_input(shown, self.transcript.getTranscriptOnEditor()))
+        if self.command_start is not None:
+            self.command_start = min(self.command_start, len(self.transcript.getTranscriptOnEditor()))
     transcript_after_commands = self.transcript.transcriptAfterCommands(transcript_from_houndify)
     transcript_on_editor = self.transcript.getTranscriptOnEditor()
     # print("Transcript_from_houndify:", transcript_from_houndify)
@@ -750,46 +1159,193 @@ class MyListener(houndify.HoundListener):
     # print("Transcript_after_commands:", transcript_after_commands)
 
     self.handle_identify_command_result(transcript_from_houndify, transcript_on_editor, transcript_after_commands)
-    self.debounce_identify_command(transcript_from_houndify, transcript_on_editor, transcript_after_commands, self.handle_identify_command_result)
+    timeline.mark("typed")
+    if not pending and not has_command(transcript_after_commands, len(transcript_on_editor)):
+        # Plain dictation, the text typed above is already final and GPT has nothing to do.
+        timeline.finish()
+        return
+    if self.command_start is None:
+        self.command_start = len(transcript_on_editor)
+    if self.speculate_early(stable, transcript_from_houndify, transcript_on_editor, transcript_after_commands, timeline):
+        return
+    self.debounce_identify_command(transcript_from_houndify, transcript_on_editor, transcript_after_commands, self.handle_identify_command_result, timeline)
     return
+
+  def speculate_early(self, stable, transcript_from_houndify, transcript_on_editor, transcript_after_commands, timeline):
+    """
+    Starts the edit right away on the stable prefix of the partials when it holds the
+    whole command and the words after it are plain dictation, instead of waiting for
+    the debounce. Those words are the speculation's first extension, a later partial
+    that revises the prefix or continues the command cancels it.
+    Returns False if the debounced edit has to be scheduled instead.
+    """
+    if not stable or len(stable) >= len(transcript_from_houndify):
+        return False
+    # Dictation is typed as it arrives, so the words after the prefix end the editor text too.
+    tail = transcript_from_houndify[len(stable):]
+    if not transcript_after_commands.endswith(tail):
+        return False
+    stable_after_commands = transcript_after_commands[:len(transcript_after_commands) - len(tail)]
+    if len(stable_after_commands) <= self.command_start or not has_command(stable_after_commands, self.command_start):
+        return False
+    if may_continue_command(tail):
+        return False
+    speculation = Speculation(stable, early=True)
+    speculation.extend(transcript_from_houndify, debounce.delay()[0])
+    with self.speculation_lock:
+        self.speculation = speculation
+    events.info("edit.speculation_early", stable_chars=len(stable), tail=tail)
+    self.identify_command_future = asyncio.run_coroutine_threadsafe(
+        self.identify_command(stable, transcript_on_editor, stable_after_commands, self.handle_identify_command_result, timeline, speculation), loop
+    )
+    return True
   
   def onFinalResponse(self, response):
-    print("Final response: " + str(response))
+    events.info("houndify.final_response", response=response)
 
   def onError(self, err):
-    print("Error " + str(err))
+    events.error("houndify.error", error=str(err))
 
 
-  def debounce_identify_command(self, transcript_from_houndify, transcript_on_editor ,transcript_after_commands, callback):
+  def debounce_identify_command(self, transcript_from_houndify, transcript_on_editor ,transcript_after_commands, callback, timeline=None):
         # Cancel the previous task if it exists
         # print("The identify command task is", self.identify_command_future)
          
         if self.identify_command_future is not None and not self.identify_command_future.done():
-            print("Cancelling the Future")
+            events.debug("edit.cancel")
             self.identify_command_future.cancel()
 
         # Schedule a new task
         # print("The loop is", loop)
-        self.identify_command_future = asyncio.run_coroutine_threadsafe(self.identify_command(transcript_from_houndify, transcript_on_editor, transcript_after_commands, callback), loop)
+        self.identify_command_future = asyncio.run_coroutine_threadsafe(self.identify_command(transcript_from_houndify, transcript_on_editor, transcript_after_commands, callback, timeline), loop)
         return
   
-  async def identify_command(self, transcript_from_houndify, transcript_on_editor, transcript_after_commands, handle_indentify_commad_result):
+  async def identify_command(self, transcript_from_houndify, transcript_on_editor, transcript_after_commands, handle_indentify_commad_result, timeline=None, early_speculation=None):
+        import aiohttp
+        from ai import acallGPT, astreamGPT
         # Function that actually calls the GPT model or any other logic
         # print("The identify command method is", transcript_after_commands)
-        async def call_model(text):
-            print("Calling the callGPT")
-            result = callGPT(text)  # Your existing call to GPT or any other logic
-            return result
-
+        async def call_model(prefix, window):
+            events.info("edit.call", window_chars=len(window), total_chars=len(prefix) + len(window))
+            # Non-blocking, so the loop keeps running and cancel() aborts the HTTP request.
+            result = await acallGPT(window, context_summary(prefix))
+            return prefix + result
+
+        async def stream_model(prefix, window):
+            events.info("edit.stream", window_chars=len(window), total_chars=len(prefix) + len(window))
+            # Apply the edit as tokens arrive, anchored in the text already on the editor.
+            transcript_on_editor = self.transcript.getTranscriptOnEditor()
+            if not transcript_on_editor.startswith(prefix):
+                return await call_model(prefix, window)
+            with self.speculation_lock:
+                # Words dictated after the text sent are shown after the edit, not in it.
+                extension = self.speculation.extension if self.speculation is not None else ""
+            streaming_edit = StreamingEdit(transcript_on_editor[len(prefix):len(transcript_on_editor) - len(extension)])
+            result = ""
+            async for result in astreamGPT(window, context_summary(prefix)):
+                shown = streaming_edit.update(result)
+                if shown is not None:
+                    with self.speculation_lock:
+                        self.show_streamed_edit(prefix + shown + self.speculation.extension)
+            return prefix + result
+
+        if timeline is None:
+            timeline = tracer.timeline("houndify")
+        self.edit_settled.clear()
+        editor_before_edit = self.transcript.transcript_on_editor
+        if early_speculation is not None:
+            # The editor also shows the words after the stable prefix, they are the speculation's extension.
+            editor_before_edit = (len(transcript_from_houndify), transcript_after_commands)
+        own_speculation = early_speculation
+        model_started = None
         try:
-            await asyncio.sleep(1)  # Debounce delay
-            transcript_after_command_execution = await call_model(transcript_after_commands)
-            loop.call_soon_threadsafe(handle_indentify_commad_result, transcript_from_houndify, transcript_on_editor, transcript_after_command_execution)  # Execute the callback in a thread-safe manner
+            if early_speculation is None:
+                await debounce.wait()
+            timeline.mark("debounce")
+            # Common commands are executed locally, GPT only sees the ones we cannot parse.
+            transcript_after_command_execution = interpret_command(transcript_after_commands, self.command_start or 0)
+            timeline.mark("local_command")
+            if transcript_after_command_execution is None:
+                model = stream_model if STREAM_EDITS else call_model
+                # Only the sentences the command can reach go to GPT, the prefix is spliced back unchanged.
+                prefix, window = split_for_edit(transcript_after_commands, self.command_start or 0)
+                if own_speculation is None:
+                    own_speculation = Speculation(transcript_from_houndify)
+                    with self.speculation_lock:
+                        self.speculation = own_speculation
+                model_started = time.monotonic()
+                transcript_after_command_execution = await model(prefix, window)
+                debounce.record_llm_latency(time.monotonic() - model_started)
+                timeline.mark("callGPT")
+            with self.speculation_lock:
+                # Words dictated while the model was running go after its result.
+                speculation, self.speculation = self.speculation, None
+                if speculation is not None:
+                    speculation_stats.record(speculation)
+                    transcript_from_houndify = speculation.transcript_from_houndify
+                    transcript_after_command_execution += speculation.extension
+                self.command_start = None
+                # Applied before edit_settled is set, so the next partial reads the edited text.
+                handle_indentify_commad_result(transcript_from_houndify, transcript_on_editor, transcript_after_command_execution)
+            timeline.mark("edit_applied")
+            timeline.finish()
         except asyncio.CancelledError:
-            print ("The task was cancelled")
-            pass  # Task was cancelled, do nothing
+            events.info("edit.cancelled", model_started=model_started is not None)
+            timeline.cancel()
+            with self.speculation_lock:
+                # A newer partial may have started the next speculation already.
+                if self.speculation is own_speculation:
+                    self.speculation = None
+            if model_started is not None:
+                debounce.record_wasted()
+            if model_started is not None or early_speculation is not None:
+                speculation_stats.record_miss()
+            self.restore_editor(editor_before_edit)
+        except (LLMError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            events.error("edit.failed", error=repr(e))
+            timeline.cancel()
+            with self.speculation_lock:
+                speculation, self.speculation = self.speculation, None
+                if speculation is not None and speculation.extension:
+                    # Keep the words dictated during the call on the editor.
+                    editor_before_edit = (len(speculation.transcript_from_houndify), editor_before_edit[1] + speculation.extension)
+                    self.transcript.setRawTranscript(speculation.transcript_from_houndify)
+                self.restore_editor(editor_before_edit)
+        finally:
+            self.edit_settled.set()
 
         return 
+
+  def extend_speculation(self, transcript_from_houndify):
+        """
+        Keeps the running model call when the new partial only appends plain dictation,
+        and shows the appended words after the text on the editor.
+        Returns False if the call has to be cancelled instead.
+        """
+        with self.speculation_lock:
+            speculation = self.speculation
+            if speculation is None:
+                return False
+            previous = speculation.extension
+            extension = speculation.extend(transcript_from_houndify, debounce.delay()[0])
+            if extension is None:
+                return False
+            events.info("edit.speculation_kept", appended=extension[len(previous):])
+            transcript_on_editor = self.transcript.getTranscriptOnEditor()
+            self.show_streamed_edit(transcript_on_editor[:len(transcript_on_editor) - len(previous)] + extension)
+            self.transcript.setRawTranscript(transcript_from_houndify)
+            return True
+
+  def show_streamed_edit(self, text):
+        location, transcript_on_editor = self.transcript.transcript_on_editor
+        insert_at_cursor(generate_raw_input(transcript_on_editor, text))
+        self.transcript.setTranscriptOnEditor(text, location)
+
+  def restore_editor(self, transcript_on_editor):
+        # Undo a streamed edit that was superseded or failed half way.
+        if self.transcript.transcript_on_editor != transcript_on_editor:
+            self.show_streamed_edit(transcript_on_editor[1])
+            self.transcript.transcript_on_editor = transcript_on_editor
   
   def handle_identify_command_result(self, transcript_from_houndify, transcript_on_editor, transcript_after_command_execution):
         # print("In the handle_identify_command_result")
@@ -801,47 +1357,84 @@ class MyListener(houndify.HoundListener):
         insert_at_cursor(raw_input)
         self.transcript.setTranscriptOnEditor(transcript_after_command_execution, len(transcript_from_houndify))
         self.transcript.setRawTranscript(transcript_from_houndify)
+        self.transcript.checkpoint()
         global all_transcripts
         all_transcripts = [transcript_from_houndify]
 
 
 def setup_hotkeys():
+    import keyboard
     print("Adding the hotkey")
     keyboard.add_hotkey('alt+o', main)
     keyboard.add_hotkey('ctrl+c', on_ctrl_c)
+    keyboard.add_hotkey('alt+l', save_latency_report)
+    keyboard.add_hotkey('alt+i', on_alt_i)
+
+def preload_provider():
+    """
+    Imports what the chosen provider needs on a background thread, so neither the
+    hotkeys nor the first alt+o wait for it. Returns the thread.
+    """
+    def preload():
+        started = time.perf_counter()
+        for module in PRELOAD_MODULES.get(args.provider, []) + PRELOAD_COMMON:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                events.warning("startup.preload_failed", module=module, error=repr(e))
+        events.info("startup.preloaded", provider=args.provider, seconds=round(time.perf_counter() - started, 3))
+
+    thread = threading.Thread(target=preload, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+def startup():
+    """
+    Everything between starting the process and being ready for alt+o, timed by
+    startup_benchmark.py.
+    """
+    begin_run()
+    setup_hotkeys()
+    prewarm_deepgram()
+    seconds = time.perf_counter() - import_started
+    events.info("startup.ready", seconds=round(seconds, 3))
+    print(f"🟢 Ready for hotkeys {seconds * 1000:.0f} ms after main.py started loading")
+
+def save_latency_report():
+    print(f"🟢 Latency histograms saved to {tracer.write(TRACE_FILE)}")
 
 def keyboard_listener():
+    import keyboard
     try:
         keyboard.wait()
     except KeyboardInterrupt:
         on_ctrl_c()
 
 def on_ctrl_c(satisfaction=None):
-    save_frames_and_transcription(all_mic_data, CHANNELS, 2, RATE, " ".join(all_transcripts), args.provider if args else  "houndify", satisfaction)
+    if "ai" in sys.modules:
+        print(f"ℹ️  GPT edit cache: {sys.modules['ai'].edit_cache.stats()}")
+    print(f"ℹ️  Debounce: {debounce.stats()}")
+    print(f"ℹ️  Speculative GPT calls: {speculation_stats.stats()}")
+    if hedge is not None:
+        print(f"ℹ️  Hedged providers: {hedge.stats()}")
+    if deepgram_pool is not None:
+        print(f"ℹ️  Deepgram connection pool: {deepgram_pool.stats()}")
+    if capture is not None:
+        print(f"ℹ️  Audio capture: {capture.stats()}")
+        capture.close()
+    save_latency_report()
+    events.close()
+    save_recording_and_transcription(recorder, " ".join(all_transcripts), args.provider if args else  "houndify", satisfaction)
     sys.exit(1)
 # keyboard.add_hotkey('ctrl+c', on_ctrl_c)
 
 def generate_raw_input(oldResponse, newResponse):
-    if (oldResponse == newResponse):
-        return ""
-    old = oldResponse
-    new = newResponse
-    output = ""
-    if old == "":
-        return new 
-    # Find the common prefix length
-    common_prefix_length = 0
-    for i in range(min(len(old), len(new))):
-        if old[i] == new[i]:
-            common_prefix_length += 1
-        else:
-            break
-    # Delete the non-common part of the old string
-    output += "\b" * (len(old) - common_prefix_length)
-    # Add the non-common part of the new string
-    output += new[common_prefix_length:]
-    
-    return output
+    """
+    Returns the cheapest keystroke script that turns oldResponse into newResponse,
+    see edit_script.edit_script for the format.
+    """
+    with tracer.span("generate_raw_input"):
+        return edit_script(oldResponse, newResponse, get_output_backend().absolute_moves)
 
 def insert_at_cursor(text):
     """
@@ -849,15 +1442,10 @@ def insert_at_cursor(text):
     it deletes the character before the cursor.
     
     Args:
-    - text: The text to be inserted at the cursor location.
+    - text: The text to be inserted at the cursor location, or a keystroke script from generate_raw_input.
     """
-    for char in text:
-        if char == "\b":  # If the character is a backspace
-            keyboard.press_and_release('backspace')
-        elif char == "\n":  # If the character is a new line
-            keyboard.press_and_release('enter')
-        else:
-            keyboard.write(char, delay=0.01)
+    with tracer.span("insert_at_cursor"):
+        get_output_backend().apply(text)
 
 
 def clear_and_refill_text(text):
@@ -867,31 +1455,50 @@ def clear_and_refill_text(text):
     Args:
     - text: The text to refill at the cursor location.
     """
-    keyboard.press_and_release('ctrl+a')
-    keyboard.press_and_release('delete')
-    keyboard.write(text, delay=0.01)
+    get_output_backend().clear_and_refill(text)
 
 
+def listen_once(max_seconds=VISION_PROMPT_SECONDS):
+    """
+    Returns the speech of the next utterance on the shared capture, up to the end of
+    speech or `max_seconds` after the call.
+    """
+    from vad import VoiceActivityGate
+
+    gate = VoiceActivityGate(RATE, CHANNELS)
+    cursor = open_microphone()
+    speech = []
+    try:
+        for data in read_microphone(cursor, "vision"):
+            speech.extend(gate.process(data))
+            if gate.end_of_speech or cursor.frames * shared_capture().frame_seconds >= max_seconds:
+                break
+    finally:
+        close_microphone(cursor)
+    return b"".join(speech)
+
 def on_alt_i():
     screenshot_base64 = take_screenshot()
     # print("The screenshot is", screenshot_base64)
     import speech_recognition as sr
     r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening...")
-        audio = r.listen(source)
-        all_mic_data.append(audio.get_wav_data())
+    print("Listening...")
+    speech = listen_once()
     prompt = b"What's on my screen"
     client_id = os.getenv("HOUNDIFY_CLIENT_ID")
     client_key = os.getenv("HOUNDIFY_CLIENT_KEY")
     try:
-        prompt = r.recognize_houndify(audio, client_id=client_id, client_key=client_key)[0]
+        if not speech:
+            raise sr.UnknownValueError()
+        prompt = r.recognize_houndify(sr.AudioData(speech, RATE, 2), client_id=client_id, client_key=client_key)[0]
         all_transcripts = [prompt]
         print("Houndify thinks you said " + prompt)
     except sr.UnknownValueError:
         print("Houndify could not understand audio")
     except sr.RequestError as e:
         print("Could not request results from Houndify service; {0}".format(e))
+    from ai import callVisionGPT
+
     vision_response = callVisionGPT(screenshot_base64, prompt)
     all_response.append(vision_response)
     create_floating_ui("\n".join(all_response))
@@ -899,13 +1506,21 @@ def on_alt_i():
     print("AI's response to the screenshot:", vision_response)
     clear_and_refill_text(vision_response)
 
-keyboard.add_hotkey('alt+i', on_alt_i)
-
 
 
 if __name__ == "__main__":
+    command_line = parse_args()
+    if command_line.batch or command_line.benchmark:
+        # One-off runs over recorded files, no hotkeys or microphone needed.
+        try:
+            begin_run()
+            main()
+        finally:
+            events.close()
+        sys.exit(0)
     try:
-        setup_hotkeys()
+        startup()
+        preload_provider()
         threading.Thread(target=keyboard_listener, daemon=True).start()
         loop.run_forever()
     except KeyboardInterrupt:
@@ -0,0 +1,260 @@
+import sys
+import time
+
+from edit_script import KEYS, apply_script, script_cost
+
+# Insertions at least this long are pasted through the clipboard instead of typed. A paste
+# costs about ClipboardBackend's settle time, 50 ms, what 5 characters take to type at
+# TYPING_DELAY, so only a word or two of dictation is still typed.
+PASTE_THRESHOLD = 20
+
+PASTE_KEY = "cmd+v" if sys.platform == "darwin" else "ctrl+v"
+
+# Seconds between typed characters. Some apps drop keys at 0, pass delay=0 only for
+# editors known to keep up.
+TYPING_DELAY = 0.01
+
+
+def as_script(text):
+    """
+    Converts the legacy string format, where "\\b" is a backspace, into an edit script.
+    Scripts are returned unchanged.
+    """
+    if not isinstance(text, str):
+        return text
+    script = []
+    for char in text:
+        if char == "\b":
+            if script and script[-1][0] == "backspace":
+                script[-1] = ("backspace", script[-1][1] + 1)
+            else:
+                script.append(("backspace", 1))
+        elif script and script[-1][0] == "type":
+            script[-1] = ("type", script[-1][1] + char)
+        else:
+            script.append(("type", char))
+    return script
+
+
+class OutputBackend:
+    """
+    Plays edit scripts (see edit_script.py) into an editor.
+    Subclasses implement `type_text` and `press`.
+
+    `absolute_moves` says whether scripts for this editor may jump to the start or end
+    of the document, which is only safe when the dictated text is all it holds.
+    """
+
+    name = "base"
+    absolute_moves = False
+
+    def type_text(self, text):
+        raise NotImplementedError
+
+    def press(self, action, count):
+        raise NotImplementedError
+
+    def apply(self, text):
+        """
+        Applies a string (with "\\b" for backspace) or an edit script.
+        """
+        for action, value in as_script(text):
+            if action == "type":
+                if value:
+                    self.type_text(value)
+            elif value:
+                self.press(action, value)
+
+    def clear_and_refill(self, text):
+        self.press("select_all", 1)
+        self.press("delete", 1)
+        self.type_text(text)
+
+
+class KeyboardBackend(OutputBackend):
+    """
+    Types whole strings with a single `keyboard.write` call instead of one call per character.
+
+    Args:
+    - delay: Seconds between characters, see TYPING_DELAY.
+    - absolute_moves: The focused field holds only the dictated text, see OutputBackend.
+    """
+
+    name = "keyboard"
+
+    def __init__(self, delay=TYPING_DELAY, absolute_moves=False):
+        import keyboard
+        self._keyboard = keyboard
+        self.delay = delay
+        self.absolute_moves = absolute_moves
+
+    def type_text(self, text):
+        # keyboard.write maps "\n" to enter itself.
+        self._keyboard.write(text, delay=self.delay)
+
+    def press(self, action, count):
+        key = {"select_all": "cmd+a" if sys.platform == "darwin" else "ctrl+a", "delete": "delete"}.get(action) or KEYS[action]
+        for _ in range(count):
+            self._keyboard.press_and_release(key)
+
+
+class ClipboardBackend(KeyboardBackend):
+    """
+    Pastes text through the clipboard, so a large insertion costs one key press.
+    The previous clipboard content is put back afterwards. When the clipboard cannot be
+    written, e.g. on Linux without xclip or xsel, the text is typed instead.
+    Needs `pyperclip`, see `available`.
+
+    Args:
+    - settle: Seconds to wait for the target app to read the clipboard before restoring it.
+    """
+
+    name = "clipboard"
+
+    def __init__(self, delay=TYPING_DELAY, settle=0.05, absolute_moves=False):
+        super().__init__(delay, absolute_moves)
+        import pyperclip
+        self._pyperclip = pyperclip
+        self.settle = settle
+
+    @staticmethod
+    def available():
+        try:
+            import pyperclip  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def type_text(self, text):
+        try:
+            previous = self._pyperclip.paste()
+        except Exception:
+            previous = None
+        try:
+            self._pyperclip.copy(text)
+        except Exception as e:
+            print(f"🔴 ERROR: Could not paste, typing instead. {e}")
+            super().type_text(text)
+            return
+        self._keyboard.press_and_release(PASTE_KEY)
+        time.sleep(self.settle)
+        if previous is not None:
+            self._pyperclip.copy(previous)
+
+
+class VirtualEditorBackend(OutputBackend):
+    """
+    In-memory editor that plays scripts against a string, for headless runs and benchmarks.
+    """
+
+    name = "virtual"
+
+    def __init__(self, text="", absolute_moves=False):
+        self.text = text
+        self.absolute_moves = absolute_moves
+        self.cursor = len(text)
+        self.keystrokes = 0
+
+    def type_text(self, text):
+        self.text, self.cursor = apply_script(self.text, [("type", text)], self.cursor)
+        self.keystrokes += len(text)
+
+    def press(self, action, count):
+        self.text, self.cursor = apply_script(self.text, [(action, count)], self.cursor)
+        self.keystrokes += count
+
+    def clear_and_refill(self, text):
+        self.text, self.cursor = "", 0
+        self.keystrokes += 2
+        self.type_text(text)
+
+
+class AutoBackend(OutputBackend):
+    """
+    Sends short insertions and all key presses to `small`, and insertions of at least
+    `threshold` characters to `large`.
+    """
+
+    name = "auto"
+
+    def __init__(self, small, large=None, threshold=PASTE_THRESHOLD):
+        self.small = small
+        self.large = large
+        self.threshold = threshold
+
+    @property
+    def absolute_moves(self):
+        # Every key press goes to `small`.
+        return self.small.absolute_moves
+
+    def type_text(self, text):
+        if self.large is not None and len(text) >= self.threshold:
+            self.large.type_text(text)
+        else:
+            self.small.type_text(text)
+
+    def press(self, action, count):
+        self.small.press(action, count)
+
+
+def default_backend(delay=TYPING_DELAY):
+    """
+    Batched keyboard typing, with clipboard paste for large insertions when pyperclip is installed.
+
+    Args:
+    - delay: Seconds between typed characters, see TYPING_DELAY.
+    """
+    keyboard_backend = KeyboardBackend(delay)
+    clipboard_backend = ClipboardBackend(delay) if ClipboardBackend.available() else None
+    return AutoBackend(keyboard_backend, clipboard_backend)
+
+
+def benchmark(backends, sizes=(10, 100, 1000), repeats=3):
+    """
+    Measures chars/sec and end-to-end apply latency of every backend for a few payload sizes.
+    Each payload is typed and then removed again with backspace.
+
+    Returns a list of result dicts and prints a table.
+    """
+    results = []
+    for backend in backends:
+        for size in sizes:
+            payload = ("The quick brown fox jumps over the lazy dog. " * (size // 45 + 1))[:size]
+            script = [("type", payload)]
+            latencies = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                backend.apply(script)
+                latencies.append(time.perf_counter() - started)
+                backend.apply([("backspace", size)])
+            latency = min(latencies)
+            results.append({
+                "backend": backend.name,
+                "chars": size,
+                "keystrokes": script_cost(script),
+                "latencySeconds": latency,
+                "charsPerSecond": size / latency if latency else float("inf"),
+            })
+    for result in results:
+        print(
+            f"{result['backend']:>10} {result['chars']:>6} chars "
+            f"{result['latencySeconds'] * 1000:>10.2f} ms {result['charsPerSecond']:>14.0f} chars/sec"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    backends = [VirtualEditorBackend()]
+    if "--virtual-only" not in sys.argv:
+        print("Please put your cursor in an empty input field.")
+        time.sleep(3)  # Wait for 3 seconds to allow the person to put the cursor at the typing location
+        backends.append(KeyboardBackend())
+        # delay=0 is opt-in, measure what it would gain.
+        unpaced = KeyboardBackend(delay=0)
+        unpaced.name = "keyboard-0"
+        backends.append(unpaced)
+        if ClipboardBackend.available():
+            backends.append(ClipboardBackend())
+        # What main.py uses: typed up to PASTE_THRESHOLD characters, pasted from there on.
+        backends.append(default_backend())
+    benchmark(backends)
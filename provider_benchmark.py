@@ -0,0 +1,392 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from archive import recording_wav
+from batch import find_wav_files
+
+# A hand-checked transcript next to a recording, e.g. logs/2024-04-20/22-18_Hello.reference.txt.
+REFERENCE_SUFFIX = ".reference.txt"
+# Provider responses recorded by a live run, replayed by the stand-ins offline.
+RESPONSES_SUFFIX = ".responses.json"
+
+BENCHMARK_DIRECTORY = "logs/benchmark"
+
+# Relative slowdown or WER increase against the baseline that counts as a regression.
+REGRESSION_TOLERANCE = 0.10
+
+_WORD = re.compile(r"[\w']+")
+
+
+def normalize_words(text):
+    """
+    Lower-cased words without punctuation, so "Hello, World." and "hello world" match.
+    """
+    return [word.lower() for word in _WORD.findall(text or "")]
+
+
+def word_errors(reference, hypothesis):
+    """
+    Word-level edit distance between two transcripts.
+
+    Returns a dict with the substitutions, deletions and insertions that turn the
+    reference into the hypothesis, and the number of reference words.
+    """
+    reference, hypothesis = normalize_words(reference), normalize_words(hypothesis)
+    # previous[j] = (cost, substitutions, deletions, insertions) for reference[:i-1] vs hypothesis[:j]
+    previous = [(j, 0, 0, j) for j in range(len(hypothesis) + 1)]
+    for i, reference_word in enumerate(reference, 1):
+        current = [(i, 0, i, 0)]
+        for j, hypothesis_word in enumerate(hypothesis, 1):
+            if reference_word == hypothesis_word:
+                current.append(previous[j - 1])
+                continue
+            substitution, deletion, insertion = previous[j - 1], previous[j], current[j - 1]
+            best = min(substitution[0], deletion[0], insertion[0])
+            if best == substitution[0]:
+                current.append((best + 1, substitution[1] + 1, substitution[2], substitution[3]))
+            elif best == deletion[0]:
+                current.append((best + 1, deletion[1], deletion[2] + 1, deletion[3]))
+            else:
+                current.append((best + 1, insertion[1], insertion[2], insertion[3] + 1))
+        previous = current
+    _, substitutions, deletions, insertions = previous[-1]
+    return {"substitutions": substitutions, "deletions": deletions, "insertions": insertions, "words": len(reference)}
+
+
+def word_error_rate(reference, hypothesis):
+    errors = word_errors(reference, hypothesis)
+    total = errors["substitutions"] + errors["deletions"] + errors["insertions"]
+    return total / errors["words"] if errors["words"] else float(total > 0)
+
+
+def sidecar_transcript(wav_filename):
+    """
+    The transcript in a recording's JSON sidecar, what the provider heard at the time,
+    or None if there is no sidecar or it is empty.
+    """
+    filename = os.path.splitext(wav_filename)[0] + ".json"
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as f:
+        return json.load(f).get("transcript") or None
+
+
+def reference_for(wav_filename):
+    """
+    Returns (reference transcript, where it came from) for a recording, or (None, None).
+    A `.reference.txt` file wins over the transcript in the session's JSON sidecar,
+    which is only what the provider heard at the time.
+    """
+    base = os.path.splitext(wav_filename)[0]
+    if os.path.exists(base + REFERENCE_SUFFIX):
+        with open(base + REFERENCE_SUFFIX, encoding="utf-8") as f:
+            return f.read().strip(), "reference"
+    transcript = sidecar_transcript(wav_filename)
+    if transcript:
+        return transcript, "sidecar"
+    return None, None
+
+
+def responses_filename(wav_filename, provider):
+    return f"{os.path.splitext(wav_filename)[0]}.{provider}{RESPONSES_SUFFIX}"
+
+
+def load_responses(wav_filename, provider, duration):
+    """
+    Recorded provider responses for a recording, as stand-in events, and where they
+    came from: "responses" for a recording made by a live run, "sidecar" when there is
+    none and the sidecar transcript is replayed as one final result at the end of the
+    audio. Returns (None, None) when there is neither.
+    """
+    filename = responses_filename(wav_filename, provider)
+    if os.path.exists(filename):
+        with open(filename) as f:
+            return json.load(f)["events"], "responses"
+    transcript = sidecar_transcript(wav_filename)
+    if transcript:
+        return [{"offset": duration, "transcript": transcript, "is_final": True}], "sidecar"
+    return None, None
+
+
+def save_responses(wav_filename, provider, timeline):
+    with open(responses_filename(wav_filename, provider), "w") as f:
+        json.dump({"provider": provider, "events": timeline.request_events()}, f, indent=2)
+
+
+class TranscriptTimeline:
+    """
+    Transcripts of one benchmark run, stamped with seconds since the audio started.
+
+    Args:
+    - cumulative: Every partial repeats the whole transcript so far (a Houndify
+      session), instead of final results being consecutive segments (Deepgram,
+      AssemblyAI).
+    """
+
+    def __init__(self, cumulative=False):
+        self.cumulative = cumulative
+        self.started = time.monotonic()
+        self.events = []
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def add(self, transcript, is_final=False):
+        if transcript:
+            self.events.append({"offset": time.monotonic() - self.started, "transcript": transcript, "is_final": is_final})
+
+    def deepgram_message(self, message):
+        # Takes the decoded messages of Deepgram's streaming endpoint.
+        if "channel" in message:
+            alternatives = message["channel"].get("alternatives") or [{}]
+            self.add(alternatives[0].get("transcript", ""), bool(message.get("is_final")))
+
+    @property
+    def first_partial(self):
+        return self.events[0]["offset"] if self.events else None
+
+    @property
+    def final(self):
+        finals = [event for event in self.events if event["is_final"]] or self.events
+        return finals[-1]["offset"] if finals else None
+
+    @property
+    def transcript(self):
+        if self.cumulative:
+            return self.events[-1]["transcript"] if self.events else ""
+        return " ".join(event["transcript"] for event in self.events if event["is_final"])
+
+    def request_events(self):
+        """
+        The events with each Houndify request's own transcript, as the stand-in
+        replays them, instead of the session's whole transcript so far.
+        """
+        if not self.cumulative:
+            return self.events
+        committed, result = "", []
+        for event in self.events:
+            transcript = event["transcript"]
+            if committed and transcript.startswith(committed):
+                transcript = transcript[len(committed):].lstrip()
+            result.append(dict(event, transcript=transcript))
+            if event["is_final"]:
+                committed = event["transcript"]
+        return result
+
+
+class TimingListener:
+    """
+    Houndify listener that only records what it is told into a TranscriptTimeline.
+    """
+
+    def __init__(self, timeline):
+        self.timeline = timeline
+
+    def onPartialTranscript(self, transcript):
+        self.timeline.add(transcript)
+
+    def onFinalPartialTranscript(self, transcript):
+        if self.timeline.events and self.timeline.events[-1]["transcript"] == transcript:
+            self.timeline.events[-1]["is_final"] = True
+        else:
+            self.timeline.add(transcript, True)
+
+    def onPartialTranscriptRaw(self, response):
+        pass
+
+    def onPartialTranscriptProperties(self, transcript, props):
+        pass
+
+    def onFinalPartialTranscriptProperties(self, transcript, props):
+        pass
+
+    def onFinalResponse(self, response):
+        pass
+
+    def onError(self, err):
+        self.timeline.add(f"[error] {err}")
+
+
+def paced_chunks(data, chunk_size, byte_rate, speed=1):
+    """
+    Yields `data` in `chunk_size` slices at `speed` times real time, 0 for no pacing,
+    like a microphone would deliver it.
+    """
+    started = time.monotonic()
+    for offset in range(0, len(data), chunk_size):
+        if speed:
+            delay = started + (offset + chunk_size) / byte_rate / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield data[offset:offset + chunk_size]
+
+
+def _percentile(values, quantile):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+
+def summarize(results):
+    """
+    One row per provider: pooled WER over all reference words of the scored runs, and
+    latency quantiles over all of them.
+    """
+    rows = []
+    for provider in sorted({result["provider"] for result in results}):
+        runs = [result for result in results if result["provider"] == provider]
+        scored = [run for run in runs if run["errors"] is not None]
+        words = sum(run["errors"]["words"] for run in scored)
+        errors = sum(run["errors"]["substitutions"] + run["errors"]["deletions"] + run["errors"]["insertions"] for run in scored)
+        rows.append({
+            "provider": provider,
+            "recordings": len(runs),
+            "scored": len(scored),
+            "wer": errors / words if words else None,
+            "firstPartialP50": _percentile([run["firstPartial"] for run in runs], 0.5),
+            "firstPartialP90": _percentile([run["firstPartial"] for run in runs], 0.9),
+            "finalP50": _percentile([run["final"] for run in runs], 0.5),
+            "finalP90": _percentile([run["final"] for run in runs], 0.9),
+        })
+    return rows
+
+
+def format_table(rows):
+    def seconds(value):
+        return f"{value:.2f}s" if value is not None else "-"
+
+    lines = [
+        "| Provider | Recordings | WER scored on | WER | First partial p50 | First partial p90 | Final p50 | Final p90 |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        wer = f"{row['wer'] * 100:.1f}%" if row["wer"] is not None else "n/a"
+        lines.append(
+            f"| {row['provider']} | {row['recordings']} | {row['scored']} | {wer} | {seconds(row['firstPartialP50'])} | "
+            f"{seconds(row['firstPartialP90'])} | {seconds(row['finalP50'])} | {seconds(row['finalP90'])} |"
+        )
+    return "\n".join(lines)
+
+
+def regressions(rows, baseline_rows, tolerance=REGRESSION_TOLERANCE):
+    """
+    Lists the metrics that got worse than the baseline by more than `tolerance`.
+    """
+    baseline = {row["provider"]: row for row in baseline_rows}
+    found = []
+    for row in rows:
+        before = baseline.get(row["provider"])
+        if before is None:
+            continue
+        for metric in ("wer", "firstPartialP50", "finalP50", "finalP90"):
+            if row[metric] is None or before[metric] is None:
+                continue
+            if row[metric] > before[metric] * (1 + tolerance) + 1e-9:
+                found.append(f"{row['provider']} {metric}: {before[metric]:.3f} -> {row[metric]:.3f}")
+    return found
+
+
+def run_benchmark(directory, runners, providers, live=False, output_directory=BENCHMARK_DIRECTORY, baseline=None):
+    """
+    Replays every recording under `directory` that has a reference transcript through
+    each provider path and writes a comparison table.
+
+    WER is only scored against a reference that is independent of what the provider
+    returned. Offline, a recording without recorded responses replays its sidecar
+    transcript, and with no `.reference.txt` that same transcript would be the
+    reference, so WER would be 0 by construction. Such runs count for latency only.
+    Recordings or runs that are left out are counted by reason and reported.
+
+    Args:
+    - directory: Where to look for WAV recordings.
+    - runners: `{provider: runner}`, where `runner(wav_filename, events)` streams the
+      recording and returns a TranscriptTimeline. `events` are the recorded responses
+      for the offline stand-in, None for a live run against the real service.
+    - providers: Which of the runners to use.
+    - live: Use the real services and record their responses for offline runs.
+    - output_directory: Where the JSON results and the markdown table are written.
+    - baseline: A previous results file to compare against.
+
+    Returns the list of regressions, empty when there is no baseline or nothing got worse.
+    """
+    from util import MappedWav
+
+    results = []
+    skipped = {}
+
+    def skip(reason, wav_filename):
+        skipped.setdefault(reason, []).append(wav_filename)
+
+    wav_files = find_wav_files(directory)
+    for wav_filename in wav_files:
+        reference, source = reference_for(wav_filename)
+        if reference is None:
+            skip(f"no {REFERENCE_SUFFIX} file and no transcript in the JSON sidecar", wav_filename)
+            continue
+        # An archived session's audio may have to be decoded first, see archive.recording_wav.
+        with recording_wav(wav_filename) as audio_filename:
+            with MappedWav(audio_filename) as wav:
+                duration = len(wav.data) / (wav.channels * wav.sample_rate * wav.sample_width)
+            for provider in providers:
+                events, replayed = None, None
+                if not live:
+                    events, replayed = load_responses(wav_filename, provider, duration)
+                    if events is None:
+                        skip(f"{provider}: no recorded responses, run with --live first", wav_filename)
+                        continue
+                try:
+                    timeline = runners[provider](audio_filename, events)
+                except Exception as e:
+                    print(f"🔴 ERROR: {provider} failed on {wav_filename}, {e!r}")
+                    skip(f"{provider}: failed", wav_filename)
+                    continue
+                if timeline is None:
+                    skip(f"{provider}: recording format not supported", wav_filename)
+                    continue
+                if live:
+                    save_responses(wav_filename, provider, timeline)
+                # Replaying the sidecar and scoring against it would only compare it with itself.
+                scored = not (replayed == "sidecar" and source == "sidecar")
+                results.append({
+                    "provider": provider,
+                    "recording": wav_filename,
+                    "duration": duration,
+                    "referenceSource": source,
+                    "replayed": replayed or "live",
+                    "transcript": timeline.transcript,
+                    "errors": word_errors(reference, timeline.transcript) if scored else None,
+                    "wer": word_error_rate(reference, timeline.transcript) if scored else None,
+                    "firstPartial": timeline.first_partial,
+                    "final": timeline.final,
+                })
+                wer = f"{results[-1]['wer'] * 100:5.1f}% WER" if scored else "  n/a WER"
+                print(f"ℹ️  {provider:>9} {wer}  {os.path.basename(wav_filename)}")
+
+    rows = summarize(results)
+    table = format_table(rows)
+    print(table)
+    if any(result["errors"] is None for result in results):
+        print(f"ℹ️  WER is n/a for runs that replayed the sidecar transcript it would be scored against. "
+              f"Add a {REFERENCE_SUFFIX} file or record responses with --live to score them.")
+    print(f"ℹ️  {len(wav_files)} recordings found, {len({result['recording'] for result in results})} benchmarked")
+    for reason, filenames in skipped.items():
+        print(f"ℹ️  Skipped {len(filenames)}: {reason}")
+    os.makedirs(output_directory, exist_ok=True)
+    name = os.path.join(output_directory, datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+    with open(name + ".json", "w") as f:
+        json.dump({"live": live, "summary": rows, "results": results, "skipped": skipped}, f, indent=2)
+    with open(name + ".md", "w") as f:
+        f.write(table + "\n")
+    print(f"🟢 Benchmark results saved to {name}.json")
+
+    if baseline is None:
+        return []
+    with open(baseline) as f:
+        found = regressions(rows, json.load(f)["summary"])
+    for regression in found:
+        print(f"🔴 Regression: {regression}")
+    return found
@@ -0,0 +1,199 @@
+import collections
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+PARTIAL_DIRECTORY = "logs/.partial"
+WAV_HEADER_SIZE = 44
+
+
+def _wav_header(channels, sample_width, frame_rate, data_size):
+    byte_rate = channels * sample_width * frame_rate
+    block_align = channels * sample_width
+    return (
+        b"RIFF"
+        + struct.pack("<I", 36 + data_size)
+        + b"WAVEfmt "
+        + struct.pack("<IHHIIHH", 16, 1, channels, frame_rate, byte_rate, block_align, sample_width * 8)
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
+
+
+def recover_wav(filename):
+    """
+    Fixes the RIFF and data sizes of a WAV file left behind by a crashed session,
+    so everything that reached the disk is playable.
+
+    Args:
+    - filename: Path to a WAV file written by SessionRecorder.
+    """
+    data_size = os.path.getsize(filename) - WAV_HEADER_SIZE
+    if data_size < 0:
+        return
+    with open(filename, "r+b") as f:
+        f.seek(4)
+        f.write(struct.pack("<I", 36 + data_size))
+        f.seek(40)
+        f.write(struct.pack("<I", data_size))
+
+
+class SessionRecorder:
+    """
+    Streams captured audio frames to a WAV file as they arrive instead of keeping them in memory.
+
+    The header is rewritten with the real sizes every `flush_interval` seconds and on close,
+    so a crash leaves a partial file that is at most that much behind (see `recover_wav`).
+    Only the last `replay_seconds` of audio is kept in memory.
+
+    `follow` records a shared AudioCapture through a cursor of its own, so however many
+    consumers read the capture at once, every frame is written once and in order.
+
+    Args:
+    - channels: Number of audio channels.
+    - sample_width: Sample width in bytes.
+    - frame_rate: Frame rate in Hz.
+    - filename: Where to write. Defaults to a timestamped file under logs/.partial.
+    - replay_seconds: How much recent audio to keep in memory for `recent_audio`.
+    - flush_interval: Seconds between header patches.
+    """
+
+    def __init__(self, channels, sample_width, frame_rate, filename=None, replay_seconds=10, flush_interval=1.0):
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_rate = frame_rate
+        self.filename = filename
+        self.replay_bytes = int(replay_seconds * frame_rate * channels * sample_width)
+        self.flush_interval = flush_interval
+        self.data_size = 0
+        self._file = None
+        self._last_flush = 0.0
+        self._recent = collections.deque()
+        self._recent_size = 0
+        # Guards the file, the recording thread writes while sessions flush.
+        self._lock = threading.Lock()
+        self._follow_lock = threading.Lock()
+        self._followers = 0
+        self._cursor = None
+        self._thread = None
+        self._stop_at = None
+
+    def _open(self):
+        if self.filename is None:
+            os.makedirs(PARTIAL_DIRECTORY, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            self.filename = f"{PARTIAL_DIRECTORY}/{timestamp}_{os.getpid()}.wav"
+        self._file = open(self.filename, "wb")
+        self._file.write(_wav_header(self.channels, self.sample_width, self.frame_rate, 0))
+        self._last_flush = time.monotonic()
+
+    def write(self, frames):
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(frames)
+            self.data_size += len(frames)
+
+            self._recent.append(frames)
+            self._recent_size += len(frames)
+            while self._recent_size - len(self._recent[0]) >= self.replay_bytes and len(self._recent) > 1:
+                self._recent_size -= len(self._recent.popleft())
+
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def follow(self, capture):
+        """
+        Starts recording every frame of `capture` from now on, on a thread of its own.
+        Calls nest, one per consumer of the capture: the recording goes on until the
+        matching number of `unfollow` calls.
+        """
+        with self._follow_lock:
+            if self._followers == 0:
+                self._cursor = capture.subscribe()
+                self._stop_at = None
+                self._thread = threading.Thread(target=self._record, args=(self._cursor,), daemon=True)
+                self._thread.start()
+            self._followers += 1
+
+    def unfollow(self):
+        """
+        Ends one `follow`. After the last one, the frames captured until now are written
+        and the recording thread stops.
+        """
+        with self._follow_lock:
+            if self._followers == 0:
+                return
+            self._followers -= 1
+            if self._followers == 0:
+                self._stop()
+
+    def _stop(self):
+        # Called with _follow_lock held.
+        if self._thread is None:
+            return
+        self._stop_at = self._cursor.capture.published
+        self._thread.join()
+        self._thread = self._cursor = None
+
+    def _record(self, cursor):
+        while True:
+            stop_at = self._stop_at
+            if stop_at is not None and cursor.position >= stop_at:
+                break
+            data = cursor.read(timeout=0.1)
+            if data is not None:
+                self.write(data)
+            elif cursor.closed or cursor.capture.closed:
+                break
+        cursor.close()
+
+    def flush(self):
+        """
+        Patches the header with the sizes written so far and pushes everything to disk.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._file is None:
+            return
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", 36 + self.data_size))
+        self._file.seek(40)
+        self._file.write(struct.pack("<I", self.data_size))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Finalises the WAV file and returns its path, or None if nothing was recorded.
+        Stops following the capture first.
+        """
+        with self._follow_lock:
+            self._followers = 0
+            self._stop()
+        with self._lock:
+            if self._file is None:
+                return None
+            self._flush()
+            self._file.close()
+            self._file = None
+            return self.filename
+
+    def recent_audio(self):
+        """
+        Returns the most recent `replay_seconds` of raw audio.
+        """
+        with self._lock:
+            return b"".join(self._recent)[-self.replay_bytes:] if self.replay_bytes else b""
+
+    def duration(self):
+        return self.data_size / (self.frame_rate * self.channels * self.sample_width)
+
+    def __len__(self):
+        return self.data_size
@@ -0,0 +1,203 @@
+import collections
+import hashlib
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_FILE = ".cache/gpt_responses.sqlite3"
+
+# Disk eviction deletes down to this fraction of `disk_entries`, so it runs once per
+# many puts instead of on every one.
+EVICTION_HEADROOM = 0.9
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """
+    Collapses whitespace so partial transcripts that only differ in spacing share an entry.
+    Case and punctuation are kept, commands like "make it uppercase" depend on them.
+    """
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(text, version):
+    return hashlib.sha256(f"{version}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses: an in-memory LRU in front of an SQLite file.
+
+    Entries are keyed on the normalized input and a prompt version, so changing the
+    prompt or model never serves stale edits. Both tiers expire entries after `ttl`
+    seconds and evict the least recently used ones beyond their size limit.
+
+    `get` and `put` are called from the event loop, so they never write to disk
+    themselves. Inserts and "last used" updates are queued for a writer thread, which
+    commits them in batches and evicts only once the disk tier is over `disk_entries`.
+    Reads use a connection of their own, in WAL mode they do not wait for a commit.
+
+    Args:
+    - filename: SQLite file for the disk tier, None keeps the cache in memory only.
+    - version: Prompt/model version mixed into every key.
+    - memory_entries: Size of the in-memory LRU.
+    - disk_entries: Maximum number of rows kept on disk.
+    - ttl: Seconds an entry stays valid.
+    """
+
+    def __init__(self, filename=DEFAULT_CACHE_FILE, version="", memory_entries=1024, disk_entries=100_000, ttl=7 * 24 * 3600):
+        self.version = version
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = queue.Queue()
+        self._writer = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_commits = 0
+        self.evictions = 0
+        if filename is not None:
+            directory = os.path.dirname(filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            writer_db = sqlite3.connect(filename, check_same_thread=False)
+            writer_db.execute("PRAGMA journal_mode=WAL")
+            writer_db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+            )
+            writer_db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            writer_db.commit()
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            self._writer = threading.Thread(target=self._write_behind, args=(writer_db,), daemon=True)
+            self._writer.start()
+
+    def get(self, text):
+        """
+        Returns the cached response for `text`, or None.
+        """
+        key = cache_key(text, self.version)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    response, created = row
+                    if now - created < self.ttl:
+                        self._writes.put(("touch", key, now))
+                        self._remember(key, response, created)
+                        self.disk_hits += 1
+                        return response
+                    # Expired rows are dropped by the next eviction.
+
+            self.misses += 1
+            return None
+
+    def put(self, text, response):
+        key = cache_key(text, self.version)
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            if self._db is not None:
+                self._writes.put(("put", key, response, now))
+
+    def _write_behind(self, db):
+        # Commits everything queued since the last commit as one transaction.
+        rows = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        rows = self._evict(db, rows, force=True)
+        while True:
+            writes = [self._writes.get()]
+            while True:
+                try:
+                    writes.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for write in writes:
+                if write is None:
+                    stop = True
+                elif write[0] == "put":
+                    _, key, response, now = write
+                    if db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is None:
+                        rows += 1
+                    db.execute(
+                        "INSERT OR REPLACE INTO responses (key, response, created, used) VALUES (?, ?, ?, ?)",
+                        (key, response, now, now),
+                    )
+                else:
+                    _, key, now = write
+                    db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            rows = self._evict(db, rows)
+            db.commit()
+            self.disk_commits += 1
+            for _ in writes:
+                self._writes.task_done()
+            if stop:
+                db.close()
+                return
+
+    def _evict(self, db, rows, force=False):
+        # Once over `disk_entries`, drops expired rows and then the least recently used
+        # ones, down to EVICTION_HEADROOM of the limit. Returns the rows left.
+        if rows <= self.disk_entries and not force:
+            return rows
+        deleted = db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)).rowcount
+        rows -= deleted
+        if rows > self.disk_entries:
+            excess = rows - int(self.disk_entries * EVICTION_HEADROOM)
+            evicted = db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used LIMIT ?)", (excess,)
+            ).rowcount
+            deleted += evicted
+            rows -= evicted
+        self.evictions += deleted
+        db.commit()
+        return rows
+
+    def flush(self):
+        """
+        Waits until every queued write is on disk.
+        """
+        if self._writer is not None:
+            self._writes.join()
+
+    def _remember(self, key, response, created):
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memoryHits": self.memory_hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "hitRate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "diskCommits": self.disk_commits,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+            self._db.close()
+            self._db = None
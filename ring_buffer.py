@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+# What to do when the producer finds the buffer full.
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class RingBuffer:
+    """
+    Bounded single-producer/single-consumer ring buffer that hands audio frames
+    from the PortAudio callback thread to a coroutine running on an event loop.
+
+    Frames are stored by reference, so nothing is copied on the way through.
+    The producer never touches the event loop directly, it only schedules a
+    wake-up with `call_soon_threadsafe` when the consumer is actually waiting.
+
+    Args:
+    - capacity: Maximum number of frames held at once.
+    - overflow: One of DROP_OLDEST, DROP_NEWEST or BLOCK.
+    - block_timeout: With BLOCK, how long the producer waits for space before
+      falling back to dropping the new frame, so capture can never stall forever.
+    """
+
+    def __init__(self, capacity, overflow=DROP_OLDEST, block_timeout=0.5):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._slots = [None] * capacity
+        # Monotonic sequence numbers, the slot index is `seq % capacity`.
+        # `_reserved` is bumped before a slot is written and `_tail` after,
+        # which lets the consumer detect a slot overwritten under it.
+        self._head = 0
+        self._reserved = 0
+        self._tail = 0
+        self._waiter = None
+        self._not_full = threading.Event()
+        self.closed = False
+        self.dropped = 0
+        self.high_water_mark = 0
+
+    def __len__(self):
+        return max(0, min(self._tail - self._head, self.capacity))
+
+    def put(self, item):
+        """
+        Called from the producer thread. Returns True if the frame was stored.
+        """
+        if self.closed:
+            return False
+        if self._tail - self._head >= self.capacity:
+            if self.overflow == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self.overflow == BLOCK:
+                self._not_full.clear()
+                if self._tail - self._head >= self.capacity:
+                    self._not_full.wait(self.block_timeout)
+                if self._tail - self._head >= self.capacity or self.closed:
+                    self.dropped += 1
+                    return False
+            else:
+                # DROP_OLDEST, the consumer skips past the overwritten slot.
+                self.dropped += 1
+
+        seq = self._tail
+        self._reserved = seq + 1
+        self._slots[seq % self.capacity] = item
+        self._tail = seq + 1
+        self.high_water_mark = max(self.high_water_mark, len(self))
+
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            loop, future = waiter
+            loop.call_soon_threadsafe(_wake, future)
+        return True
+
+    def get_nowait(self):
+        """
+        Called from the consumer. Raises asyncio.QueueEmpty when there is nothing to read.
+        """
+        while True:
+            head = self._head
+            if head >= self._tail:
+                raise asyncio.QueueEmpty
+            index = head % self.capacity
+            item = self._slots[index]
+            if self._reserved - head > self.capacity:
+                # The producer lapped us while we were reading, resync to the oldest live frame.
+                self._head = max(head + 1, self._tail - self.capacity)
+                continue
+            self._slots[index] = None
+            self._head = head + 1
+            self._not_full.set()
+            return item
+
+    async def get(self):
+        """
+        Waits until a frame is available and returns it.
+        """
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiter = (loop, future)
+            # Re-check after publishing the waiter so a put() racing with us is not lost.
+            if self._head < self._tail:
+                self._waiter = None
+                continue
+            try:
+                await future
+            finally:
+                self._waiter = None
+
+    def close(self):
+        """
+        Stops taking frames and releases a producer blocked on a full buffer.
+        """
+        self.closed = True
+        self._not_full.set()
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "overflow": self.overflow,
+            "size": len(self),
+            "dropped": self.dropped,
+            "highWaterMark": self.high_water_mark,
+        }
@@ -0,0 +1,188 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+# Full-text index over the transcripts in the archive manifest (see archive.py). It is an
+# external-content FTS5 table, so the text is stored once, and triggers keep it in step
+# with every insert, update and delete of a session.
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE sessions_fts USING fts5(transcript, content='sessions', content_rowid='rowid', tokenize='unicode61')",
+    """
+    CREATE TRIGGER sessions_fts_insert AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_fts(rowid, transcript) VALUES (new.rowid, new.transcript);
+    END
+    """,
+    """
+    CREATE TRIGGER sessions_fts_delete AFTER DELETE ON sessions BEGIN
+        INSERT INTO sessions_fts(sessions_fts, rowid, transcript) VALUES ('delete', old.rowid, old.transcript);
+    END
+    """,
+    """
+    CREATE TRIGGER sessions_fts_update AFTER UPDATE OF transcript ON sessions BEGIN
+        INSERT INTO sessions_fts(sessions_fts, rowid, transcript) VALUES ('delete', old.rowid, old.transcript);
+        INSERT INTO sessions_fts(rowid, transcript) VALUES (new.rowid, new.transcript);
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS sessions_provider ON sessions (provider, created)",
+    "CREATE INDEX IF NOT EXISTS sessions_duration ON sessions (duration)",
+]
+
+RESULT_COLUMNS = "s.id, s.created, s.provider, s.satisfaction, s.duration, s.audio"
+
+
+def ensure_index(db):
+    """
+    Creates the full-text index on an archive manifest connection if it is missing and
+    fills it from the sessions already there. Returns True if it was created.
+    """
+    exists = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions_fts'").fetchone()
+    if exists:
+        return False
+    with db:
+        for statement in FTS_SCHEMA:
+            db.execute(statement)
+        db.execute("INSERT INTO sessions_fts(sessions_fts) VALUES ('rebuild')")
+    return True
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query that matches sessions containing every word,
+    a trailing * keeps prefix matching ("deleti*").
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search(db, text=None, provider=None, satisfaction=None, since=None, until=None, min_duration=None, max_duration=None, limit=20):
+    """
+    Finds archived sessions. Full-text matches are ordered by relevance, other queries
+    by time, newest first. Returns a list of dicts, with a highlighted `snippet` for
+    full-text matches.
+
+    Args:
+    - db: An archive manifest connection, see SessionArchive.
+    - text: Words that must all appear in the transcript.
+    - provider, satisfaction: Exact matches.
+    - since, until: ISO dates or times, `until` is exclusive.
+    - min_duration, max_duration: Seconds.
+    - limit: Maximum number of results.
+    """
+    where, params = [], []
+    if text:
+        query = fts_query(text)
+        if not query:
+            return []
+        sql = (
+            f"SELECT {RESULT_COLUMNS}, snippet(sessions_fts, 0, '[', ']', '...', 12) AS snippet "
+            "FROM sessions_fts JOIN sessions s ON s.rowid = sessions_fts.rowid"
+        )
+        where.append("sessions_fts MATCH ?")
+        params.append(query)
+        order = "sessions_fts.rank"
+    else:
+        sql = f"SELECT {RESULT_COLUMNS}, substr(s.transcript, 1, 120) AS snippet FROM sessions s"
+        order = "s.created DESC"
+    for column, operator, value in (
+        ("provider", "=", provider),
+        ("satisfaction", "=", satisfaction),
+        ("created", ">=", since),
+        ("created", "<", until),
+        ("duration", ">=", min_duration),
+        ("duration", "<=", max_duration),
+    ):
+        if value is not None:
+            where.append(f"s.{column} {operator} ?")
+            params.append(value)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(limit)
+    cursor = db.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def benchmark(sessions=100_000, queries=("delete everything", "word123", "word123*", "report tomorrow"), repeats=20):
+    """
+    Times searches over a throwaway manifest with `sessions` synthetic transcripts.
+    """
+    from archive import MANIFEST_NAME, SessionArchive
+
+    # Zipf-like vocabulary: a few very common words and a long tail, like real dictation.
+    common = (
+        "hello how are you delete everything make it uppercase the quick brown fox jumps over lazy dog "
+        "send the report tomorrow meeting notes world capital letter sentence last word please add question"
+    ).split()
+    words = common * 20 + [f"word{i}" for i in range(5000)]
+    with tempfile.TemporaryDirectory() as directory:
+        SessionArchive(directory).close()
+        db = sqlite3.connect(os.path.join(directory, MANIFEST_NAME))
+        started = time.perf_counter()
+        rng = random.Random(1)
+        with db:
+            db.executemany(
+                "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, 1, 16000, 2, 'flac', '', 0, 0, ?, NULL)",
+                (
+                    (
+                        f"{i:064x}",
+                        f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+                        rng.choice(("houndify", "deepgram", "assembly")),
+                        rng.choice(("y", "n", None)),
+                        rng.uniform(1, 120),
+                        " ".join(rng.choice(words) for _ in range(rng.randint(5, 60))),
+                    )
+                    for i in range(sessions)
+                ),
+            )
+        print(f"Indexed {sessions} sessions in {time.perf_counter() - started:.1f}s")
+        for text in queries:
+            for filters in ({}, {"provider": "deepgram", "since": "2024-06-01", "until": "2024-07-01"}):
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    results = search(db, text, **filters)
+                elapsed = (time.perf_counter() - started) / repeats
+                print(f"{text!r:>20} {filters or ''!s:>70}: {len(results):>3} results in {elapsed * 1000:.2f} ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Searches archived dictation sessions.")
+    parser.add_argument("text", nargs="*", help="Words that must appear in the transcript, word* matches a prefix")
+    parser.add_argument("-d", "--directory", default="logs/archive", help="Archive directory")
+    parser.add_argument("-p", "--provider")
+    parser.add_argument("-s", "--satisfaction")
+    parser.add_argument("--since", help="ISO date or time, e.g. 2024-04-20")
+    parser.add_argument("--until", help="ISO date or time, exclusive")
+    parser.add_argument("--min-duration", type=float, help="Seconds")
+    parser.add_argument("--max-duration", type=float, help="Seconds")
+    parser.add_argument("-n", "--limit", type=int, default=20)
+    parser.add_argument("--backfill", metavar="LOGS", help="Archive the legacy sessions in this logs directory first")
+    parser.add_argument("--benchmark", type=int, metavar="SESSIONS", help="Time searches over this many synthetic sessions")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        from archive import SessionArchive, migrate_logs
+
+        archive = SessionArchive(args.directory)
+        if args.backfill:
+            print(f"🟢 Backfilled {migrate_logs(args.backfill, archive)} sessions from {os.path.abspath(args.backfill)}")
+        started = time.perf_counter()
+        results = archive.search(
+            " ".join(args.text), provider=args.provider, satisfaction=args.satisfaction, since=args.since, until=args.until,
+            min_duration=args.min_duration, max_duration=args.max_duration, limit=args.limit,
+        )
+        elapsed = time.perf_counter() - started
+        for result in results:
+            print(f"{result['created']}  {result['id'][:12]}  {result['provider']}  {result['satisfaction']}  {result['duration']:6.1f}s  {result['snippet']}")
+        print(f"ℹ️  {len(results)} sessions in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,141 @@
+import time
+
+from commands import may_continue_command
+
+# A prefix of the partial transcripts counts as stable, and an edit may start on it
+# before the debounce, once this many partials in a row started with it...
+STABLE_UPDATES = 3
+# ...or once every partial for this many seconds started with it.
+STABLE_SECONDS = 0.3
+
+
+def _common_prefix(texts):
+    first, last = min(texts), max(texts)
+    length = 0
+    while length < len(first) and first[length] == last[length]:
+        length += 1
+    return first[:length]
+
+
+class StablePrefix:
+    """
+    Tracks the part of a growing partial transcript that the provider has stopped
+    revising: the longest prefix, in whole words, that the last `updates` partials
+    all started with, or that every partial in the last `seconds` started with.
+
+    Args:
+    - updates: See STABLE_UPDATES.
+    - seconds: See STABLE_SECONDS.
+    - clock: Monotonic time source, replaced in tests.
+    """
+
+    def __init__(self, updates=STABLE_UPDATES, seconds=STABLE_SECONDS, clock=time.monotonic):
+        self.updates = updates
+        self.seconds = seconds
+        self.clock = clock
+        self._history = []
+
+    def observe(self, text):
+        """
+        Call with every new partial, returns its stable prefix, "" if there is none yet.
+        """
+        now = self.clock()
+        self._history.append((now, text))
+        texts = [text for _, text in self._history]
+        stable = _common_prefix(texts[-self.updates:]) if len(texts) >= self.updates else ""
+        # The newest partial that is at least `seconds` old, and every one after it.
+        aged = [index for index, (seen, _) in enumerate(self._history) if now - seen >= self.seconds]
+        if aged:
+            by_time = _common_prefix(texts[aged[-1]:])
+            if len(by_time) > len(stable):
+                stable = by_time
+        # Only what can still decide the stable prefix is kept.
+        keep = min(len(self._history) - self.updates + 1, aged[-1] if aged else len(self._history))
+        del self._history[:max(0, keep)]
+        if stable != text and not text[len(stable)].isspace():
+            # A word the newest partial continues may still change, cut back to its start.
+            stable = stable[:stable.rfind(" ") + 1]
+        return stable
+
+    def reset(self):
+        self._history = []
+
+
+class Speculation:
+    """
+    An edit model call that keeps running while the transcript only grows.
+
+    A new partial used to cancel the running call and start over. When it only appends
+    words that cannot change the command, the call's result is still right for the text
+    it was given, and the new words are appended to it instead.
+
+    A call can also start early, on the StablePrefix of the partials instead of after
+    the debounce, with the words after that prefix as its first extension. It is kept
+    as long as the partials extend the prefix with plain dictation and is cancelled as
+    soon as one diverges from it.
+
+    Args:
+    - transcript_from_houndify: The raw transcript the call was made for.
+    - early: The call starts on a stable prefix, without waiting for the debounce.
+    """
+
+    def __init__(self, transcript_from_houndify, early=False):
+        self.base = transcript_from_houndify
+        self.transcript_from_houndify = transcript_from_houndify
+        self.early = early
+        self.extension = ""
+        self.started = time.monotonic()
+        self.saved = 0.0
+
+    def extend(self, transcript_from_houndify, restart_delay):
+        """
+        Returns the text appended since the call started, or None when the new partial
+        revises the text or may continue the command and the call has to be restarted.
+
+        Args:
+        - transcript_from_houndify: The new raw transcript.
+        - restart_delay: The debounce delay a restarted call would wait first.
+        """
+        if not transcript_from_houndify.startswith(self.base):
+            return None
+        extension = transcript_from_houndify[len(self.base):]
+        if may_continue_command(extension):
+            return None
+        # Without speculation this partial would have restarted the call, after waiting
+        # for the debounce again, and redone the work done so far.
+        self.saved = time.monotonic() - self.started + restart_delay
+        self.extension = extension
+        self.transcript_from_houndify = transcript_from_houndify
+        return extension
+
+
+class SpeculationStats:
+    """
+    Counts model calls kept alive by a growing transcript or started early on a
+    stable prefix (hits), and calls cancelled by a newer partial (misses).
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.early_hits = 0
+        self.misses = 0
+        self.saved = 0.0
+
+    def record(self, speculation):
+        if speculation.extension or speculation.early:
+            self.hits += 1
+            self.early_hits += speculation.early
+            self.saved += speculation.saved
+
+    def record_miss(self):
+        self.misses += 1
+
+    def stats(self):
+        speculated = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "earlyHits": self.early_hits,
+            "misses": self.misses,
+            "hitRate": self.hits / speculated if speculated else 0.0,
+            "latencySavedSeconds": self.saved,
+        }
@@ -0,0 +1,312 @@
+# Local stand-ins for the hosted speech APIs, so the streaming code paths can be
+# exercised offline, e.g. `python main.py -p deepgram --host ws://127.0.0.1:8765`.
+import asyncio
+import json
+import re
+import threading
+import time
+
+import websockets
+
+
+def default_responder(audio):
+    return f"received {len(audio)} bytes"
+
+
+def _result(transcript, is_final, duration, start=0.0, confidence=1.0, from_finalize=False):
+    return json.dumps({
+        "is_final": is_final,
+        "speech_final": is_final,
+        "from_finalize": from_finalize,
+        "start": start,
+        "duration": duration,
+        "channel": {"alternatives": [{"transcript": transcript, "confidence": confidence, "words": []}]},
+    })
+
+
+class DeepgramStandIn:
+    """
+    Minimal websocket server that speaks the Deepgram live-streaming protocol.
+
+    It buffers binary audio frames, answers KeepAlive silently and, on Finalize or
+    CloseStream, sends one `is_final` result for the audio since the last one. The
+    `created` metadata message follows on CloseStream and the connection closes.
+    With `events` it replays recorded results instead: each one is sent as soon as
+    `offset` seconds of audio have arrived, the rest on CloseStream.
+
+    Args:
+    - responder: `responder(audio_bytes)` returning the transcript to send back.
+    - host: Interface to bind.
+    - port: Port to bind, 0 picks a free one.
+    - latency: Seconds to wait before answering, to mimic network and model time.
+    - sample_rate: Used to report the stream duration.
+    - events: Recorded results, dicts with `offset`, `transcript`, `is_final` and
+      optionally `confidence`.
+    """
+
+    def __init__(self, responder=default_responder, host="127.0.0.1", port=0, latency=0.0, sample_rate=16000, events=None):
+        self.responder = responder
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.sample_rate = sample_rate
+        self.events = events
+        self.sessions = 0
+        self._server = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handle(self, ws, path=None):
+        self.sessions += 1
+        audio = bytearray()
+        answered = 0
+        pending = list(self.events or [])
+        async for message in ws:
+            if isinstance(message, bytes):
+                audio += message
+                while pending and pending[0]["offset"] <= len(audio) / (2 * self.sample_rate):
+                    await self._send_event(ws, pending.pop(0))
+                continue
+            message_type = json.loads(message).get("type")
+            if message_type == "CloseStream":
+                break
+            if message_type == "Finalize":
+                if self.events is None:
+                    await self._respond(ws, audio, answered, from_finalize=True)
+                else:
+                    # Recorded results were sent as their audio arrived, only confirm.
+                    await ws.send(_result("", True, 0.0, len(audio) / (2 * self.sample_rate), from_finalize=True))
+                answered = len(audio)
+        if not ws.open:
+            # Closed without CloseStream, e.g. an idle pooled connection.
+            return
+        duration = len(audio) / (2 * self.sample_rate)
+        if self.events is not None:
+            for event in pending:
+                await self._send_event(ws, event)
+        else:
+            await self._respond(ws, audio, answered)
+        await ws.send(json.dumps({"created": True, "duration": duration}))
+
+    async def _respond(self, ws, audio, answered, from_finalize=False):
+        # Answers for the audio after the first `answered` bytes.
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        start = answered / (2 * self.sample_rate)
+        duration = len(audio) / (2 * self.sample_rate) - start
+        await ws.send(_result(self.responder(bytes(audio[answered:])), True, duration, start, from_finalize=from_finalize))
+
+    async def _send_event(self, ws, event):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        await ws.send(_result(event["transcript"], event["is_final"], 0.0, event["offset"], event.get("confidence", 1.0)))
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+class HoundifyStandIn:
+    """
+    Offline replacement for `houndify.StreamingHoundClient` that replays recorded
+    transcripts to the listener.
+
+    `fill` counts the audio it is given and calls `onPartialTranscript` for every
+    event whose `offset` has been reached, plus `onFinalPartialTranscript` for final
+    ones. It returns True after a final event, like the real client does when the
+    server has detected the end of the query. `finish` replays what is left and
+    calls `onFinalResponse`. Audio and events carry over from one query to the next.
+
+    The stand-in is one client, `client()` makes more that replay the same
+    recording, so requests can overlap like with a HoundifySession. Only the request
+    that got audio last replays what is left when it finishes, as one query, and
+    only if it was not ended by a final event.
+
+    Args:
+    - events: Recorded transcripts, dicts with `offset`, `transcript` and `is_final`.
+    - sample_rate: Sample rate of the 16 bit mono audio passed to `fill`.
+    - latency: Seconds each callback is delayed, to mimic network and model time.
+    """
+
+    def __init__(self, events, sample_rate=16000, latency=0.0):
+        self.events = events
+        self.sample_rate = sample_rate
+        self.latency = latency
+        self.requests = 0
+        self._pending = list(events)
+        self._audio_bytes = 0
+        self._latest = None
+        self._lock = threading.Lock()
+        self._client = None
+
+    def client(self):
+        return _HoundifyStandInClient(self)
+
+    def start(self, listener):
+        if self._client is None:
+            self._client = self.client()
+        self._client.start(listener)
+
+    def fill(self, data):
+        return self._client.fill(data)
+
+    def finish(self):
+        self._client.finish()
+
+
+class _HoundifyStandInClient:
+    # One client of a HoundifyStandIn, carrying one request at a time.
+
+    def __init__(self, stand_in):
+        self.stand_in = stand_in
+        self.listener = None
+        self.last = ""
+        self.ended = False
+
+    def start(self, listener):
+        with self.stand_in._lock:
+            self.stand_in.requests += 1
+        self.listener = listener
+        self.last = ""
+        self.ended = False
+
+    def _send(self, event):
+        if self.stand_in.latency:
+            time.sleep(self.stand_in.latency)
+        self.last = event["transcript"]
+        self.listener.onPartialTranscript(event["transcript"])
+        if event["is_final"]:
+            self.listener.onFinalPartialTranscript(event["transcript"])
+
+    def fill(self, data):
+        stand_in = self.stand_in
+        with stand_in._lock:
+            stand_in._audio_bytes += len(data)
+            stand_in._latest = self
+            due = []
+            while stand_in._pending and stand_in._pending[0]["offset"] <= stand_in._audio_bytes / (2 * stand_in.sample_rate):
+                due.append(stand_in._pending.pop(0))
+        for event in due:
+            self._send(event)
+        self.ended = self.ended or any(event["is_final"] for event in due)
+        return self.ended
+
+    def finish(self):
+        with self.stand_in._lock:
+            rest = []
+            if self.stand_in._latest in (self, None) and not self.ended:
+                rest, self.stand_in._pending = self.stand_in._pending, []
+        # Queries that never got their turn continue this one's transcript.
+        committed = ""
+        for event in rest:
+            transcript = f"{committed} {event['transcript']}".strip()
+            self._send(dict(event, transcript=transcript))
+            if event["is_final"]:
+                committed = transcript
+        self.listener.onFinalResponse({"Status": "OK", "AllResults": [{"RawTranscription": self.last}]})
+
+
+def echo_responder(messages):
+    # With no spoken command the edit prompt returns the text unchanged.
+    return messages[-1]["content"] if isinstance(messages[-1]["content"], str) else ""
+
+
+class ChatCompletionsStandIn:
+    """
+    Minimal HTTP server that mimics the chat-completions API, for use with
+    OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    Args:
+    - responder: `responder(messages)` returning the assistant message content.
+    - host: Interface to bind.
+    - port: Port to bind, 0 picks a free one.
+    - latency: Seconds to wait before answering, to mimic model time.
+    - token_latency: Seconds between streamed tokens when the request asks for `stream`.
+    """
+
+    def __init__(self, responder=echo_responder, host="127.0.0.1", port=0, latency=0.0, token_latency=0.0):
+        self.responder = responder
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self.cancelled = 0
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        self.requests += 1
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.transport is None or request.transport.is_closing():
+            # The client tore the request down while we were "thinking".
+            self.cancelled += 1
+            return web.Response(status=499)
+        content = self.responder(body["messages"])
+        if body.get("stream"):
+            return await self._stream(request, body, content)
+        return web.json_response({
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    async def _stream(self, request, body, content):
+        from aiohttp import web
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        # One word (with its leading space) per chunk, roughly how tokens arrive.
+        try:
+            for token in re.findall(r"\s*\S+|\s+", content):
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                chunk = {"object": "chat.completion.chunk", "model": body.get("model"), "choices": [{"index": 0, "delta": {"content": token}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client cancelled the stream.
+            self.cancelled += 1
+        return response
+
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
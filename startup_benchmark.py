@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from provider_benchmark import BENCHMARK_DIRECTORY
+
+# Median seconds from starting `python main.py` to the hotkeys being registered.
+STARTUP_BUDGET = 1.0
+
+# Only imported once a provider needs them, never before the hotkeys are ready.
+DEFERRED_MODULES = (
+    "pyaudio", "houndify", "assemblyai", "speech_recognition", "websockets", "aiohttp", "openai", "tkinter", "numpy",
+)
+
+# Imported on first use, so `import main` alone loads none of them. ai opens the edit cache
+# and starts its writer thread, output_backends imports keyboard.
+LAZY_MODULES = (
+    "ai", "response_cache", "batch", "houndify_session", "output_backends", "audio_capture", "keyboard", "dotenv",
+)
+
+# Written to stderr when the hotkeys are ready, -X importtime lines after it are the preload.
+READY_MARKER = "import time: ready"
+
+REPOSITORY = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter: what `python main.py` does up to the hotkeys, then a report.
+PROBE = """
+import json, os, sys, threading, time
+import main
+on_import = {{
+    "modules": sorted(module for module in {lazy!r} if module in sys.modules),
+    "threads": sorted(thread.name for thread in threading.enumerate() if thread is not threading.main_thread()),
+    "files": sorted(os.listdir(".")),
+}}
+main.startup()
+ready = time.time()
+deferred = sorted(module for module in {deferred!r} if module in sys.modules)
+sys.stderr.write("{marker}\\n")
+sys.stderr.flush()
+main.preload_provider().join()
+main.events.close()
+print(json.dumps({{"ready": ready, "deferredLoaded": deferred, "onImport": on_import, "preloadSeconds": time.time() - ready}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parses `python -X importtime` output up to the READY_MARKER into dicts with the
+    module name, its nesting depth (0 for what the probe imports itself) and its self
+    and cumulative seconds.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if line == READY_MARKER:
+            break
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2][1:]
+        imports.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip(" "))) // 2,
+            "self": int(parts[0]) / 1e6,
+            "cumulative": int(parts[1]) / 1e6,
+        })
+    return imports
+
+
+def probe(python, provider_args, importtime=False):
+    """
+    Starts one interpreter and returns the probe's report, with `seconds` until the
+    hotkeys were ready and, with `importtime`, the parsed import times.
+    """
+    command = [python] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE.format(deferred=DEFERRED_MODULES, lazy=LAZY_MODULES, marker=READY_MARKER)] + provider_args
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPOSITORY, os.environ.get("PYTHONPATH")])))
+    # Run elsewhere, so the probe's event logs do not end up next to the real ones.
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.time()
+        process = subprocess.run(command, cwd=directory, env=environment, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"the probe exited with {process.returncode}:\n{process.stderr[-2000:]}")
+    report = json.loads(process.stdout.strip().splitlines()[-1])
+    report["seconds"] = report.pop("ready") - started
+    if importtime:
+        report["imports"] = parse_importtime(process.stderr)
+    return report
+
+
+def run_benchmark(providers, runs=5, python=sys.executable, budget=STARTUP_BUDGET, top=10, output_directory=BENCHMARK_DIRECTORY):
+    """
+    Measures cold start to "ready for hotkey" for each provider and lists the slowest
+    imports. Returns the problems found: over budget, a deferred module imported
+    before the hotkeys were ready, or `import main` loading a lazy module, starting a
+    thread or writing a file.
+    """
+    problems, summary = [], []
+    for provider in providers:
+        provider_args = ["-p", provider]
+        seconds = sorted(probe(python, provider_args)["seconds"] for _ in range(runs))
+        profile = probe(python, provider_args, importtime=True)
+        median = seconds[len(seconds) // 2]
+        summary.append({
+            "provider": provider,
+            "runs": runs,
+            "min": seconds[0],
+            "median": median,
+            "max": seconds[-1],
+            "preloadSeconds": profile["preloadSeconds"],
+            "deferredLoaded": profile["deferredLoaded"],
+            "onImport": profile["onImport"],
+            "imports": profile["imports"],
+        })
+        print(f"🟢 {provider}: ready for hotkeys in {median * 1000:.0f} ms (min {seconds[0] * 1000:.0f}, max {seconds[-1] * 1000:.0f}), "
+              f"provider modules preloaded {profile['preloadSeconds'] * 1000:.0f} ms later")
+        # What main.py and startup() import directly, by cumulative time, and where the time goes.
+        direct = sorted(
+            (entry for entry in profile["imports"] if entry["depth"] <= 1 and entry["module"] != "main"), key=lambda entry: -entry["cumulative"]
+        )
+        heaviest = sorted(profile["imports"], key=lambda entry: -entry["self"])
+        print("   Slowest imports:  " + ", ".join(f"{entry['module']} {entry['cumulative'] * 1000:.0f} ms" for entry in direct[:top]))
+        print("   Most time in:     " + ", ".join(f"{entry['module']} {entry['self'] * 1000:.0f} ms" for entry in heaviest[:top]))
+        if median > budget:
+            problems.append(f"{provider} is ready after {median:.3f}s, the budget is {budget:.3f}s")
+        if profile["deferredLoaded"]:
+            problems.append(f"{provider} imports {', '.join(profile['deferredLoaded'])} before the hotkeys are ready")
+        on_import = profile["onImport"]
+        if on_import["modules"]:
+            problems.append(f"importing main loads {', '.join(on_import['modules'])}")
+        if on_import["threads"]:
+            problems.append(f"importing main starts the threads {', '.join(on_import['threads'])}")
+        if on_import["files"]:
+            problems.append(f"importing main writes {', '.join(on_import['files'])}")
+
+    os.makedirs(output_directory, exist_ok=True)
+    name = os.path.join(output_directory, f"startup_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    with open(name, "w") as f:
+        json.dump({"budget": budget, "python": python, "summary": summary}, f, indent=2)
+    print(f"🟢 Startup benchmark saved to {name}")
+    for problem in problems:
+        print(f"🔴 {problem}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Times cold start of main.py to "ready for hotkey", with -X importtime.')
+    parser.add_argument("--providers", default="houndify,deepgram,hedged,assembly", help="Comma separated --provider values to start with")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Cold starts per provider, the median is checked against the budget")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="Seconds")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to start main.py with")
+    parser.add_argument("--top", type=int, default=8, help="How many of the slowest imports to list")
+    args = parser.parse_args()
+
+    providers = [provider.strip().lower() for provider in args.providers.split(",") if provider.strip()]
+    if run_benchmark(providers, args.runs, args.python, args.budget, args.top):
+        sys.exit(1)
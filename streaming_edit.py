@@ -0,0 +1,45 @@
+import re
+
+# How many trailing words of the streamed output are used to find where it has got to in the old text.
+ANCHOR_WORDS = 3
+_ANCHOR = re.compile(r"\S+(?:\s+\S+){0,%d}$" % (ANCHOR_WORDS - 1))
+
+
+class StreamingEdit:
+    """
+    Turns a stream of partial model outputs into intermediate editor texts.
+
+    The model rewrites the whole text, so a partial output is only a prefix of the
+    final one. Showing it alone would wipe everything after it, so the partial output
+    is anchored in the original text by its last few words and the rest of the
+    original is kept after it: `output so far + original[anchor end:]`. Only whole
+    words are used, a half streamed word is held back until the next delta.
+
+    Args:
+    - original: The text on the editor when the request was sent.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self._anchor = 0
+        self.updates = 0
+
+    def update(self, partial):
+        """
+        Returns the text the editor should show for this partial output, or None when
+        it cannot be placed in the original yet.
+        """
+        cut = max(partial.rfind(" "), partial.rfind("\n"))
+        if cut <= 0:
+            return None
+        stable = partial[:cut].rstrip()
+        match = _ANCHOR.search(stable)
+        if match is None:
+            return None
+        tail = match.group(0)
+        position = self.original.find(tail, self._anchor)
+        if position == -1:
+            return None
+        self._anchor = position
+        self.updates += 1
+        return stable + self.original[position + len(tail):]
@@ -0,0 +1,135 @@
+import json
+import os
+import wave
+
+from archive import SessionArchive, migrate_logs
+
+
+def write_wav(filename, samples=b"\x01\x00" * 8000, rate=16000):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with wave.open(filename, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples)
+
+
+def write_legacy(logs, name, transcript, satisfaction, samples=b"\x01\x00" * 8000):
+    write_wav(str(logs / f"{name}.wav"), samples)
+    (logs / f"{name}.json").write_text(json.dumps({"transcript": transcript, "satisfaction": satisfaction, "provider": "deepgram"}))
+
+
+def test_duplicate_audio_keeps_every_session(tmp_path):
+    logs = tmp_path / "logs"
+    write_legacy(logs / "2024-04-20", "10-15_True-HelloThere", "hello there", True)
+    write_legacy(logs / "2024-04-21", "09-00_False-HelloThere", "hello there again", False)
+    write_legacy(logs / "2024-04-21", "09-05_True-Other", "other", True, samples=b"\x02\x00" * 4000)
+    archive = SessionArchive(str(tmp_path / "archive"), codec="wav")
+
+    assert migrate_logs(str(logs), archive) == 3
+    sessions = sorted(archive.recent(), key=lambda session: session["created"])
+    assert [(session["transcript"], session["satisfaction"]) for session in sessions] == [
+        ("hello there", "True"), ("hello there again", "False"), ("other", "True"),
+    ]
+    # The two recordings of the same audio share one file.
+    assert sessions[0]["audio"] == sessions[1]["audio"]
+    stats = archive.stats()
+    assert stats["sessions"] == 3 and stats["audio_files"] == 2
+    assert stats["original_bytes"] == os.path.getsize(logs / "2024-04-20" / "10-15_True-HelloThere.wav") + os.path.getsize(
+        logs / "2024-04-21" / "09-05_True-Other.wav"
+    )
+    assert [session["created"] for session in archive.search("again")] == ["2024-04-21T09:00:00"]
+
+    # Migrating again updates the same rows instead of adding more.
+    assert migrate_logs(str(logs), archive) == 3
+    assert archive.stats()["sessions"] == 3
+    archive.close()
+
+
+def test_migration_skips_the_archive_however_it_is_spelled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_legacy(tmp_path / "logs" / "2024-04-20", "10-15_True-Hello", "hello", True)
+    archive = SessionArchive(os.path.join(".", "logs", "..", "logs", "archive"), codec="wav")
+
+    assert migrate_logs("logs", archive) == 1
+    # The archived WAV under logs/archive/audio is not migrated into the archive again.
+    assert migrate_logs(str(tmp_path / "logs"), archive) == 1
+    assert archive.stats()["sessions"] == 1
+    archive.close()
+
+
+def test_batch_and_benchmark_see_archived_sessions(tmp_path):
+    import asyncio
+
+    from batch import find_wav_files, result_filename, transcribe_directory
+    from provider_benchmark import TranscriptTimeline, run_benchmark
+
+    logs = tmp_path / "logs"
+    write_wav(str(tmp_path / "session.wav"))
+    archive = SessionArchive(str(logs / "archive"), codec="wav")
+    session_id = archive.add(str(tmp_path / "session.wav"), "hello there", "deepgram", "True")
+    archive.close()
+    write_legacy(logs / "2024-04-20", "10-15_True-Legacy", "legacy", True, samples=b"\x02\x00" * 4000)
+
+    recording = str(logs / "archive" / "recordings" / f"{session_id}.wav")
+    assert find_wav_files(str(logs)) == sorted([str(logs / "2024-04-20" / "10-15_True-Legacy.wav"), recording])
+    assert find_wav_files(str(logs / "archive")) == [recording]
+
+    async def transcribe(filename, wav):
+        return f"{len(wav.data)} bytes"
+
+    summary = asyncio.run(transcribe_directory(str(logs), transcribe))
+    assert summary["done"] == 2 and summary["audioSeconds"] == 0.5 + 0.25
+    with open(result_filename(recording)) as f:
+        assert json.load(f)["transcript"] == "16000 bytes"
+
+    def replay(wav_filename, events):
+        assert os.path.exists(wav_filename)
+        timeline = TranscriptTimeline()
+        timeline.add("hello their", True)
+        return timeline
+
+    (logs / "archive" / "recordings" / f"{session_id}.reference.txt").write_text("hello there")
+    output = tmp_path / "benchmark"
+    run_benchmark(str(logs / "archive"), {"deepgram": replay}, ["deepgram"], output_directory=str(output))
+    [result_file] = [name for name in os.listdir(output) if name.endswith(".json")]
+    [result] = json.loads((output / result_file).read_text())["results"]
+    assert (result["recording"], result["referenceSource"], result["wer"]) == (recording, "reference", 0.5)
+
+
+def test_compressed_audio_is_decoded_while_in_use(tmp_path, monkeypatch):
+    import shutil
+    import sys
+    import types
+
+    from archive import recording_wav
+
+    class AudioSegment:
+        # pydub, with "flac" being a copy of the WAV.
+        def __init__(self, filename):
+            self.filename = filename
+
+        @classmethod
+        def from_wav(cls, filename):
+            return cls(filename)
+
+        @classmethod
+        def from_file(cls, filename, format):
+            return cls(filename)
+
+        def export(self, target, format):
+            shutil.copyfile(self.filename, target)
+
+    monkeypatch.setitem(sys.modules, "pydub", types.SimpleNamespace(AudioSegment=AudioSegment))
+    write_wav(str(tmp_path / "session.wav"))
+    archive = SessionArchive(str(tmp_path / "archive"))
+    session_id = archive.add(str(tmp_path / "session.wav"), "hello", "houndify", None)
+    [recording] = archive.recordings()
+    archive.close()
+
+    assert recording.endswith(f"{session_id}.wav") and not os.path.exists(recording)
+    with recording_wav(recording) as filename:
+        assert filename == recording
+        with wave.open(filename) as f:
+            assert f.getnframes() == 8000
+    assert not os.path.exists(recording)
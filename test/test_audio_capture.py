@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from audio_capture import BLOCK, DROP_NEWEST, DROP_OLDEST, AudioCapture
+
+
+class FakeStream:
+    # The device: the test publishes the frames itself.
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def capture_of(frames):
+    # A ring `frames` frames long.
+    return AudioCapture(1, 16000, 1600, capacity_seconds=frames * 0.1, open_stream=lambda capture: FakeStream())
+
+
+def read_all(cursor):
+    frames = []
+    while True:
+        frame = cursor.read(timeout=0)
+        if frame is None:
+            return frames
+        frames.append(frame)
+
+
+def test_every_cursor_reads_every_frame():
+    capture = capture_of(8)
+    cursors = [capture.subscribe(), capture.subscribe(DROP_NEWEST), capture.subscribe(BLOCK)]
+    for index in range(5):
+        capture.publish(index)
+    assert [read_all(cursor) for cursor in cursors] == [[0, 1, 2, 3, 4]] * 3
+    assert [cursor.stats()["highWaterMark"] for cursor in cursors] == [5, 5, 5]
+    assert [cursor.position for cursor in cursors] == [5, 5, 5]
+
+
+def test_overflow_policies():
+    capture = capture_of(4)
+    oldest, newest = capture.subscribe(DROP_OLDEST), capture.subscribe(DROP_NEWEST)
+    for index in range(6):
+        capture.publish(index)
+    assert read_all(oldest) == [2, 3, 4, 5]
+    assert read_all(newest) == [0, 1, 2, 3]
+    assert oldest.stats() == {"policy": DROP_OLDEST, "frames": 4, "dropped": 2, "behind": 0, "highWaterMark": 4}
+    assert newest.stats() == {"policy": DROP_NEWEST, "frames": 4, "dropped": 2, "behind": 0, "highWaterMark": 4}
+    assert capture.stats()["dropped"] == 4
+
+
+def test_block_holds_up_the_device_until_the_reader_catches_up():
+    capture = capture_of(2)
+    cursor = capture.subscribe(BLOCK, block_timeout=5)
+    received = []
+
+    def reader():
+        time.sleep(0.1)
+        received.extend(cursor.read() for _ in range(5))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for index in range(5):
+        capture.publish(index)
+    thread.join()
+    assert received == [0, 1, 2, 3, 4]
+    assert cursor.dropped == 0 and cursor.high_water_mark == 2
+
+
+def test_block_gives_up_after_its_timeout():
+    capture = capture_of(2)
+    cursor = capture.subscribe(BLOCK, block_timeout=0.01)
+    for index in range(4):
+        capture.publish(index)
+    assert read_all(cursor) == [0, 1] and cursor.dropped == 2
+
+
+def test_async_get_and_close():
+    capture = capture_of(4)
+    cursor = capture.subscribe(DROP_NEWEST)
+
+    async def scenario():
+        threading.Timer(0.05, capture.publish, ("frame",)).start()
+        first = await asyncio.wait_for(cursor.get(), 1)
+        threading.Timer(0.05, cursor.close).start()
+        return first, await asyncio.wait_for(cursor.get(), 1)
+
+    assert asyncio.run(scenario()) == ("frame", None)
+    assert capture.stats()["subscribers"] == 0
+
+
+def test_rejects_an_unknown_policy():
+    with pytest.raises(ValueError):
+        capture_of(4).subscribe("drop_everything")
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import wave
+
+import websockets
+
+from batch import RESULT_SUFFIX, find_wav_files, result_filename, transcribe_directory
+from standins import DeepgramStandIn
+
+
+def write_wav(filename, seconds=0.5, rate=16000):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with wave.open(filename, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(int(seconds * rate) * 2))
+
+
+def test_find_wav_files_skips_archive_partial_and_benchmark(tmp_path):
+    logs = tmp_path / "logs"
+    for name in ("2024-04-20/Hello.wav", "2024-04-21/Bye.WAV"):
+        write_wav(str(logs / name))
+    for name in ("archive/ab/abcdef.wav", ".partial/session.wav", "benchmark/replay.wav"):
+        write_wav(str(logs / name))
+    (logs / "2024-04-20" / "Hello.json").write_text("{}")
+
+    assert find_wav_files(str(logs)) == [
+        str(logs / "2024-04-20" / "Hello.wav"),
+        str(logs / "2024-04-21" / "Bye.WAV"),
+    ]
+
+
+def test_result_filename_sits_next_to_the_sidecar():
+    assert result_filename(os.path.join("logs", "2024-04-20", "Hello.wav")) == os.path.join("logs", "2024-04-20", "Hello" + RESULT_SUFFIX)
+
+
+def test_transcribe_directory_against_stand_in_and_resume(tmp_path):
+    for index in range(5):
+        write_wav(str(tmp_path / f"{index}.wav"), seconds=0.25 * (index + 1))
+
+    async def scenario():
+        async with DeepgramStandIn(responder=lambda audio: f"{len(audio)} bytes") as stand_in:
+            in_flight, most = 0, 0
+
+            async def transcribe(filename, wav):
+                # The same exchange run() has with Deepgram: audio frames, then CloseStream.
+                nonlocal in_flight, most
+                in_flight += 1
+                most = max(most, in_flight)
+                try:
+                    async with websockets.connect(stand_in.url) as ws:
+                        for offset in range(0, len(wav.data), 3200):
+                            await ws.send(bytes(wav.data[offset:offset + 3200]))
+                        await ws.send(json.dumps({"type": "CloseStream"}))
+                        parts = []
+                        async for message in ws:
+                            result = json.loads(message)
+                            if "channel" in result:
+                                parts.append(result["channel"]["alternatives"][0]["transcript"])
+                        return " ".join(parts)
+                finally:
+                    in_flight -= 1
+
+            first = await transcribe_directory(str(tmp_path), transcribe, concurrency=2, label="stand-in")
+            second = await transcribe_directory(str(tmp_path), transcribe, concurrency=2)
+            return first, second, most, stand_in.sessions
+
+    first, second, most, sessions = asyncio.run(scenario())
+
+    assert first["done"] == 5 and first["failed"] == 0 and first["skipped"] == 0
+    assert first["audioSeconds"] == sum(0.25 * (index + 1) for index in range(5))
+    assert first["audioSecondsPerWallSecond"] > 0
+    assert most <= 2
+    # The second run resumes: everything already has a result.
+    assert second["done"] == 0 and second["skipped"] == 5
+    assert sessions == 5
+    with open(result_filename(str(tmp_path / "2.wav"))) as f:
+        result = json.load(f)
+    assert result["transcript"] == f"{int(0.75 * 16000) * 2} bytes"
+    assert result["label"] == "stand-in"
@@ -0,0 +1,73 @@
+import pytest
+
+from commands import has_command, interpret_command, may_continue_command
+
+# Examples from ai.EDIT_SYSTEM_PROMPT plus a few variations. None means the model decides.
+EXAMPLES = [
+    ("Hello how are you? delete hello", "how are you?"),
+    ("Hello how are you? delete last word", "Hello how are"),
+    ("Hello how are you? make the H capital for how", "Hello How are you?"),
+    ("Quick brown fox jumps over the lazy dog? Make it uppercase", "QUICK BROWN FOX JUMPS OVER THE LAZY DOG?"),
+    ("Hello how are you? Quick brown fox jumps over the lazy dog? Make it uppercase and add a question mark", None),
+    ("Hello how are you? Quick brown fox jumps over the lazy dog? delete everything", ""),
+    ("Hello how are you? Quick brown fox jumps over the lazy dog? delete last sentence", "Hello how are you?"),
+    ("Hellow how are you?", "Hellow how are you?"),
+    ("Hello, how are you? Delete last word.", "Hello, how are"),
+    ("Hello how are you today? Please delete the last two words.", "Hello how are"),
+    ("Hello how are you, delete last word", "Hello how are"),
+    ("One. Two. Three. Delete the last sentence.", "One. Two."),
+    ("Hello how are you? Make everything uppercase.", "HELLO HOW ARE YOU?"),
+    ("HELLO HOW ARE YOU? Make it lowercase.", "hello how are you?"),
+    ("I went to the shop. Capitalize shop.", "I went to the Shop."),
+    ("The fox and the dog. Delete \"the dog\".", "The fox and."),
+    ("The fox and the dog. Delete the.", None),
+    ("Hello world. Delete banana.", None),
+    ("Please make the summary shorter", None),
+    ("delete everything", ""),
+]
+
+# Dictation that contains command words. Running any of these locally would edit or
+# wipe what the user just said, so they must be left to the model.
+NOT_COMMANDS = [
+    "I went to clear all",
+    "I went to clear all.",
+    "She asked me to delete everything",
+    "Then we tried to erase it all",
+    "I want to capitalize Paris",
+    "Can you make it uppercase",
+    "The plan is to remove the last word",
+    "Could you please delete the last sentence",
+]
+
+
+@pytest.mark.parametrize("text, expected", EXAMPLES)
+def test_prompt_examples(text, expected):
+    assert interpret_command(text) == expected
+
+
+@pytest.mark.parametrize("text", NOT_COMMANDS)
+def test_commands_inside_a_sentence_go_to_the_model(text):
+    assert interpret_command(text) is None
+
+
+def test_command_arriving_in_a_later_partial_is_still_mid_sentence():
+    # "I went to" was typed already, the next partial only adds "clear all".
+    text = "Hello there. I went to clear all"
+    assert interpret_command(text, len("Hello there. I went to ")) is None
+
+
+def test_only_the_new_tail_is_searched():
+    text = "Delete everything. Hello how are you?"
+    assert interpret_command(text, len("Delete everything. ")) == text
+
+
+def test_plain_dictation_skips_the_model():
+    text = "The weather is nice today and the sea is calm"
+    assert not has_command(text)
+    assert interpret_command(text) == text
+
+
+def test_may_continue_command():
+    assert may_continue_command(" word")
+    assert may_continue_command(" and then delete that")
+    assert not may_continue_command(" nice weather today")
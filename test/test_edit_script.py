@@ -0,0 +1,37 @@
+from edit_script import apply_script, edit_script, script_cost
+from output_backends import AutoBackend, VirtualEditorBackend
+
+LONG = "The quick brown fox jumps over the lazy dog. " * 40
+
+
+def test_scripts_turn_old_into_new():
+    for old, new in [
+        ("", "hello"),
+        ("hello world", "hello"),
+        ("hello how are", "Hello, how are you?"),
+        (LONG, "A" + LONG[1:]),
+        (LONG, LONG.replace("lazy", "sleepy", 3)),
+    ]:
+        assert apply_script(old, edit_script(old, new)) == (new, len(new))
+
+
+def test_default_edits_stay_inside_the_dictated_span():
+    # Unrelated text before the dictation, e.g. a chat box with history.
+    history = "Earlier message\nthat is not ours\n"
+    old, new = LONG, "A" + LONG[1:]
+    script = edit_script(old, new)
+    assert not {"document_start", "document_end"} & {action for action, _ in script}
+    assert apply_script(history + old, script) == (history + new, len(history + new))
+
+
+def test_absolute_moves_are_opt_in_per_backend():
+    old, new = LONG, "A" + LONG[1:]
+    relative = VirtualEditorBackend(old)
+    absolute = VirtualEditorBackend(old, absolute_moves=True)
+    assert not AutoBackend(relative).absolute_moves and AutoBackend(absolute).absolute_moves
+
+    script = edit_script(old, new, absolute.absolute_moves)
+    assert script[0] == ("document_start", 1)
+    absolute.apply(script)
+    assert absolute.text == new
+    assert script_cost(script) < script_cost(edit_script(old, new, relative.absolute_moves))
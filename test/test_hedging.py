@@ -0,0 +1,162 @@
+import threading
+import time
+
+from hedging import HedgedTranscript, HoundifyFeed
+from transcript import Transcript
+
+
+class Editor:
+    # Types plain dictation the way MyListener does, onto a text instead of the keyboard.
+
+    def __init__(self):
+        self.transcript = Transcript()
+        self.text = ""
+        self.finals = []
+
+    def onPartialTranscript(self, transcript):
+        self.transcript.rebase(transcript)
+        self.text = self.transcript.transcriptAfterCommands(transcript)
+        self.transcript.setTranscriptOnEditor(self.text, len(transcript))
+        self.transcript.setRawTranscript(transcript)
+        self.transcript.checkpoint()
+
+    def onFinalPartialTranscript(self, transcript):
+        self.finals.append(transcript)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+class HedgeRecorder:
+    # Stands in for a HedgedTranscript, recording what a feed reports.
+
+    def __init__(self):
+        self.counts = {"houndify": {"late": 0}}
+        self.partials = []
+        self.finals = []
+
+    def partial(self, query_id, provider, transcript):
+        self.partials.append((query_id, transcript))
+
+    def final(self, query_id, provider, transcript, confidence=None):
+        self.finals.append((query_id, transcript))
+
+
+class SlowFinishClient:
+    # Hears "hello" in the first chunk, and only hears "world" while finishing, which
+    # takes until `release` is set.
+
+    def __init__(self, release):
+        self.release = release
+        self.listener = None
+
+    def start(self, listener):
+        self.listener = listener
+
+    def fill(self, data):
+        self.listener.onPartialTranscript("hello")
+        return False
+
+    def finish(self):
+        self.release.wait(5)
+        self.listener.onPartialTranscript("hello world")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_switching_provider_mid_utterance_retypes_the_query():
+    clock, editor = Clock(), Editor()
+    hedge = HedgedTranscript(["deepgram", "houndify"], editor, stall=0.5, clock=clock)
+
+    query = hedge.start_query()
+    hedge.partial(query, "deepgram", "so")
+    hedge.partial(query, "deepgram", "so then")
+    hedge.end_query(query)
+    hedge.final(query, "deepgram", "so then", 0.9)
+    hedge.final(query, "houndify", "so them", 0.5)
+    # The dispatcher reads the clock too, move it only once the query settled.
+    wait_for(lambda: editor.finals)
+
+    query = hedge.start_query()
+    hedge.partial(query, "deepgram", "hello")
+    hedge.partial(query, "deepgram", "hello how are")
+    clock.now += 1.0
+    # Deepgram stalls, Houndify takes over with its own punctuation.
+    hedge.partial(query, "houndify", "Hello, how are you?")
+    hedge.end_query(query)
+    hedge.final(query, "houndify", "Hello, how are you?", 0.8)
+    hedge.final(query, "deepgram", "hello how are you", 0.6)
+    hedge.close(5)
+
+    assert editor.text == "so then Hello, how are you?"
+    assert editor.finals == ["so then", "so then Hello, how are you?"]
+    assert hedge.counts["houndify"]["takeovers"] == 1
+
+
+def test_the_final_of_the_other_provider_replaces_the_partials():
+    clock, editor = Clock(), Editor()
+    hedge = HedgedTranscript(["deepgram", "houndify"], editor, clock=clock)
+
+    query = hedge.start_query()
+    hedge.partial(query, "deepgram", "write the")
+    hedge.partial(query, "deepgram", "write the right word")
+    hedge.partial(query, "houndify", "write the rite")
+    hedge.end_query(query)
+    hedge.final(query, "deepgram", "write the right word", 0.5)
+    hedge.final(query, "houndify", "right there right word", 0.9)
+    hedge.close(5)
+
+    assert editor.text == "right there right word"
+
+
+def test_rebase_keeps_the_edits_before_the_revision():
+    transcript = Transcript()
+    # "delete that" was executed, the editor no longer shows the raw words.
+    for raw, editor in (("one two", "one two"), ("one two three delete that", "one two"), ("one two three delete that fix it", "one two fix it")):
+        transcript.setTranscriptOnEditor(editor, len(raw))
+        transcript.setRawTranscript(raw)
+        transcript.checkpoint()
+
+    assert transcript.rebase("one two three delete that fix it now") is False
+    assert transcript.rebase("one two three delete that six it") is True
+    assert transcript.transcriptAfterCommands("one two three delete that six it") == "one two six it"
+    # Nothing it still continues, everything is typed over.
+    assert transcript.rebase("won too") is True
+    assert transcript.transcriptAfterCommands("won too") == "won too"
+
+
+def test_houndify_feed_finishes_requests_off_the_capture_thread():
+    release = threading.Event()
+    hedge = HedgeRecorder()
+    feed = HoundifyFeed(hedge, lambda: SlowFinishClient(release))
+    feed.start_query(1)
+    feed.send(bytes(3200))
+    wait_for(lambda: hedge.partials)
+
+    started = time.monotonic()
+    feed.end_query(1)
+    feed.start_query(2)
+    feed.send(bytes(3200))
+    # The next query's audio went to the spare request without waiting for the finish.
+    assert time.monotonic() - started < 1
+    wait_for(lambda: (2, "hello") in hedge.partials)
+    assert hedge.finals == []
+
+    # The final includes what Houndify sent while the request finished.
+    release.set()
+    wait_for(lambda: hedge.finals)
+    assert hedge.finals == [(1, "hello world")]
+    feed.end_query(2)
+    feed.close()
+    assert hedge.finals == [(1, "hello world"), (2, "hello world")]
+    assert feed.session.stats()["requests"] == 3
@@ -0,0 +1,120 @@
+import threading
+import time
+
+from houndify_session import HoundifySession
+from standins import HoundifyStandIn
+
+CHUNK = bytes(3200)  # 0.1 s of 16 kHz audio
+
+EVENTS = [
+    {"offset": 0.3, "transcript": "hello", "is_final": False},
+    {"offset": 0.5, "transcript": "hello world", "is_final": True},
+    {"offset": 0.8, "transcript": "again", "is_final": False},
+    {"offset": 1.0, "transcript": "again please", "is_final": True},
+]
+
+
+class RecordingListener:
+    def __init__(self, session=None):
+        self.session = session
+        self.partials = []
+        self.finals = []
+        self.errors = []
+        self.lock_free = []
+
+    def _check_lock(self):
+        # Another thread, e.g. the capture thread calling fill, must get the session lock.
+        if self.session is not None:
+            result = []
+            probe = threading.Thread(target=lambda: result.append(self.session._lock.acquire(timeout=1) and self.session._lock.release() is None))
+            probe.start()
+            probe.join()
+            self.lock_free.append(result == [True])
+
+    def onPartialTranscript(self, transcript):
+        self._check_lock()
+        self.partials.append(transcript)
+
+    def onFinalPartialTranscript(self, transcript):
+        self.finals.append(transcript)
+
+    def onFinalResponse(self, response):
+        pass
+
+    def onError(self, err):
+        self.errors.append(err)
+
+
+def feed(session, seconds):
+    for _ in range(int(seconds * 10)):
+        session.fill(CHUNK)
+        time.sleep(0.005)
+
+
+def test_transcript_carries_over_turnover_and_listener_runs_unlocked():
+    stand_in = HoundifyStandIn(EVENTS)
+    listener = RecordingListener()
+    session = HoundifySession(stand_in.client, listener)
+    listener.session = session
+    feed(session, 1.2)
+    session.close()
+    assert listener.finals == ["hello world", "hello world again please"]
+    assert listener.partials[-1] == "hello world again please"
+    assert listener.lock_free and all(listener.lock_free)
+    assert session.turnovers == 2
+
+
+def test_failed_start_falls_back_to_a_fresh_client():
+    stand_in = HoundifyStandIn(EVENTS)
+    created = []
+
+    def factory():
+        client = stand_in.client()
+        if not created:
+            def broken_start(listener):
+                raise ConnectionError("connection refused")
+            client.start = broken_start
+        created.append(client)
+        return client
+
+    listener = RecordingListener()
+    session = HoundifySession(factory, listener)
+    feed(session, 1.2)
+    session.close()
+    assert session.stats()["failedRequests"] == 1
+    assert session.stats()["droppedChunks"] == 0
+    assert listener.finals == ["hello world", "hello world again please"]
+
+
+def test_repeated_start_failures_end_the_utterance_without_raising():
+    def factory():
+        raise ConnectionError("no network")
+
+    listener = RecordingListener()
+    session = HoundifySession(factory, listener)
+    feed(session, 0.5)
+    session.close()
+    assert listener.errors and all(isinstance(error, ConnectionError) for error in listener.errors)
+    assert session.stats()["droppedChunks"] > 0
+
+
+def test_fill_failure_moves_on_to_the_next_request():
+    stand_in = HoundifyStandIn(EVENTS)
+    broken = []
+
+    def factory():
+        client = stand_in.client()
+        if not broken:
+            def broken_fill(data):
+                raise OSError("connection reset")
+            client.fill = broken_fill
+            broken.append(client)
+        return client
+
+    listener = RecordingListener()
+    session = HoundifySession(factory, listener)
+    feed(session, 1.2)
+    session.close()
+    assert session.stats()["failedRequests"] == 1
+    assert [type(error) for error in listener.errors] == [OSError]
+    assert listener.finals[-1].endswith("again please")
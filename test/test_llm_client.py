@@ -0,0 +1,71 @@
+import asyncio
+import gc
+import threading
+import warnings
+
+from llm_client import AsyncLLMClient
+from standins import ChatCompletionsStandIn
+
+MESSAGES = [{"role": "user", "content": "hello there, how are you"}]
+
+
+def test_chat_and_stream_chat():
+    async def scenario():
+        async with ChatCompletionsStandIn() as stand_in:
+            client = AsyncLLMClient("key", base_url=stand_in.url)
+            answer = await client.chat(MESSAGES, "model")
+            deltas = [delta async for delta in client.stream_chat(MESSAGES, "model")]
+            await client.close()
+            return answer, deltas
+
+    answer, deltas = asyncio.run(scenario())
+    assert answer == "hello there, how are you"
+    assert deltas == ["hello", " there,", " how", " are", " you"]
+
+
+def test_cancelling_aborts_the_request():
+    async def scenario():
+        async with ChatCompletionsStandIn(latency=0.3) as stand_in:
+            client = AsyncLLMClient("key", base_url=stand_in.url)
+            task = asyncio.ensure_future(client.chat(MESSAGES, "model"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await asyncio.sleep(0.4)
+            await client.close()
+            return task.cancelled(), stand_in.cancelled
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def test_moving_to_another_loop_closes_the_old_session():
+    client = AsyncLLMClient("key")
+    sessions = []
+
+    async def request():
+        async with ChatCompletionsStandIn() as stand_in:
+            client.base_url = stand_in.url
+            assert await client.chat(MESSAGES, "model") == MESSAGES[0]["content"]
+            sessions.append(client._session)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        # One loop after the other, the first one is closed when the second binds.
+        asyncio.run(request())
+        asyncio.run(request())
+        assert sessions[0].closed and not sessions[1].closed
+
+        # A loop still running in another thread closes its session there.
+        other = asyncio.new_event_loop()
+        thread = threading.Thread(target=other.run_forever)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(request(), other).result(5)
+        asyncio.run(request())
+        assert sessions[2].closed and not sessions[3].closed
+        other.call_soon_threadsafe(other.stop)
+        thread.join()
+        other.close()
+
+        asyncio.run(client.close())
+        del sessions[:]
+        gc.collect()
+    assert not [warning for warning in caught if "Unclosed" in str(warning.message)]
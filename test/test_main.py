@@ -0,0 +1,117 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import main
+from debounce import AdaptiveDebounce
+from output_backends import VirtualEditorBackend
+from speculation import SpeculationStats
+
+
+class FakeModel:
+    # Stands in for ai.astreamGPT: holds every call until `release` is set, then streams
+    # `respond(window)` word by word.
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+        self.release = threading.Event()
+
+    async def astreamGPT(self, user_input, context=None, timeout=None):
+        self.calls.append(user_input)
+        while not self.release.is_set():
+            await asyncio.sleep(0.01)
+        result = ""
+        for word in self.respond(user_input).split(" "):
+            result += (" " if result else "") + word
+            yield result
+
+    async def acallGPT(self, user_input, context=None, timeout=None):
+        async for result in self.astreamGPT(user_input, context, timeout):
+            pass
+        return result
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+@pytest.fixture(scope="module")
+def running_loop():
+    thread = threading.Thread(target=main.loop.run_forever, daemon=True)
+    thread.start()
+    yield main.loop
+    main.loop.call_soon_threadsafe(main.loop.stop)
+    thread.join(5)
+
+
+@pytest.fixture
+def model(running_loop, monkeypatch):
+    model = FakeModel(lambda window: window.replace(" fix it", ""))
+    ai = types.ModuleType("ai")
+    ai.astreamGPT = model.astreamGPT
+    ai.acallGPT = model.acallGPT
+    monkeypatch.setitem(sys.modules, "ai", ai)
+    monkeypatch.setattr(main, "output_backend", VirtualEditorBackend())
+    monkeypatch.setattr(main, "debounce", AdaptiveDebounce(min_delay=0.01, max_delay=0.05))
+    monkeypatch.setattr(main, "speculation_stats", SpeculationStats())
+    monkeypatch.setattr(main, "STREAM_EDITS", True)
+    yield model
+    model.release.set()
+
+
+def test_growing_partial_keeps_the_speculation(model):
+    listener = main.MyListener()
+    listener.onPartialTranscript("hello there fix it")
+    wait_for(lambda: model.calls)
+
+    # Plain dictation after the command is shown right away, the call keeps running.
+    listener.onPartialTranscript("hello there fix it so more")
+    assert main.output_backend.text == "hello there fix it so more"
+    model.release.set()
+    wait_for(lambda: main.output_backend.text == "hello there so more")
+    wait_for(listener.edit_settled.is_set)
+    assert model.calls == ["hello there fix it"]
+    assert main.speculation_stats.stats()["hits"] == 1
+    assert main.speculation_stats.stats()["misses"] == 0
+
+
+def test_revised_prefix_cancels_the_speculation(model):
+    listener = main.MyListener()
+    listener.onPartialTranscript("one two fix it")
+    wait_for(lambda: model.calls)
+
+    # The provider revised a word the call was given, its result would be wrong.
+    listener.onPartialTranscript("one too fix it")
+    wait_for(lambda: len(model.calls) == 2)
+    assert main.output_backend.text == "one too fix it"
+    model.release.set()
+    wait_for(lambda: main.output_backend.text == "one too")
+    assert model.calls == ["one two fix it", "one too fix it"]
+    assert main.speculation_stats.stats()["misses"] == 1
+
+
+def test_final_settles_the_edit(model):
+    listener = main.MyListener()
+    listener.onPartialTranscript("hello there fix it")
+    listener.onFinalPartialTranscript("hello there fix it")
+    wait_for(lambda: model.calls)
+    model.release.set()
+    wait_for(lambda: main.output_backend.text == "hello there")
+    wait_for(listener.edit_settled.is_set)
+    assert listener.speculation is None
+    assert listener.transcript.transcript_on_editor == (len("hello there fix it"), "hello there")
+
+    # The same transcript again, e.g. the final after the partials, types nothing.
+    keystrokes = main.output_backend.keystrokes
+    listener.onPartialTranscript("hello there fix it")
+    assert main.output_backend.text == "hello there"
+    assert main.output_backend.keystrokes == keystrokes
+    assert model.calls == ["hello there fix it"]
@@ -0,0 +1,78 @@
+import sys
+import types
+
+from output_backends import PASTE_KEY, TYPING_DELAY, AutoBackend, KeyboardBackend, VirtualEditorBackend, default_backend
+
+
+class FakeKeyboard(types.ModuleType):
+    # Records what would be typed, the real module needs a display and root.
+
+    def __init__(self):
+        super().__init__("keyboard")
+        self.writes = []
+        self.presses = []
+
+    def write(self, text, delay=0):
+        self.writes.append((text, delay))
+
+    def press_and_release(self, key):
+        self.presses.append(key)
+
+
+def test_keyboard_types_with_a_delay_unless_opted_out(monkeypatch):
+    keyboard = FakeKeyboard()
+    monkeypatch.setitem(sys.modules, "keyboard", keyboard)
+    assert TYPING_DELAY == 0.01
+
+    KeyboardBackend().apply("hello\b\b")
+    KeyboardBackend(delay=0).apply("fast")
+    assert keyboard.writes == [("hello", 0.01), ("fast", 0)]
+    assert keyboard.presses == ["backspace", "backspace"]
+
+    backend = default_backend()
+    assert isinstance(backend, AutoBackend) and backend.small.delay == TYPING_DELAY
+
+
+def test_virtual_editor_plays_scripts():
+    editor = VirtualEditorBackend("hello world")
+    editor.apply([("backspace", 5), ("type", "there")])
+    assert editor.text == "hello there" and editor.keystrokes == 10
+    editor.clear_and_refill("new")
+    assert editor.text == "new"
+
+
+class FakeClipboard(types.ModuleType):
+    def __init__(self, fails=False):
+        super().__init__("pyperclip")
+        self.content = "previous"
+        self.fails = fails
+
+    def copy(self, text):
+        if self.fails:
+            raise RuntimeError("no clipboard tool")
+        self.content = text
+
+    def paste(self):
+        return self.content
+
+
+def test_default_backend_pastes_all_but_short_insertions(monkeypatch):
+    keyboard, clipboard = FakeKeyboard(), FakeClipboard()
+    monkeypatch.setitem(sys.modules, "keyboard", keyboard)
+    monkeypatch.setitem(sys.modules, "pyperclip", clipboard)
+    backend = default_backend()
+    backend.large.settle = 0
+
+    backend.apply("one two")
+    backend.apply(" and then a whole sentence more")
+    assert keyboard.writes == [("one two", TYPING_DELAY)]
+    assert keyboard.presses == [PASTE_KEY]
+    assert clipboard.content == "previous"
+
+
+def test_clipboard_failure_falls_back_to_typing(monkeypatch):
+    keyboard = FakeKeyboard()
+    monkeypatch.setitem(sys.modules, "keyboard", keyboard)
+    monkeypatch.setitem(sys.modules, "pyperclip", FakeClipboard(fails=True))
+    default_backend().apply("a sentence long enough to be pasted")
+    assert keyboard.writes == [("a sentence long enough to be pasted", TYPING_DELAY)]
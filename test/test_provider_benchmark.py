@@ -0,0 +1,70 @@
+import json
+import os
+import wave
+
+from provider_benchmark import TranscriptTimeline, load_responses, run_benchmark, word_error_rate
+
+
+def write_recording(directory, name, transcript=None, reference=None, seconds=0.5):
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    with wave.open(base + ".wav", "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(bytes(int(seconds * 16000) * 2))
+    with open(base + ".json", "w") as f:
+        json.dump({"transcript": transcript}, f)
+    if reference is not None:
+        with open(base + ".reference.txt", "w") as f:
+            f.write(reference)
+    return base + ".wav"
+
+
+def replay(wav_filename, events):
+    # Stands in for a provider path: returns exactly what the stand-in would replay.
+    timeline = TranscriptTimeline()
+    for event in events:
+        timeline.add(event["transcript"], event["is_final"])
+    return timeline
+
+
+def test_word_error_rate_ignores_case_and_punctuation():
+    assert word_error_rate("Hello, how are you?", "hello how are you") == 0.0
+    assert word_error_rate("hello how are you", "hello who are") == 0.5
+
+
+def test_sidecar_replay_is_not_scored_against_itself(tmp_path):
+    logs = str(tmp_path / "logs")
+    write_recording(logs, "only_sidecar", transcript="hello how are you")
+    write_recording(logs, "with_reference", transcript="hello who are you", reference="Hello, how are you?")
+    write_recording(logs, "empty", transcript="")
+
+    assert load_responses(os.path.join(logs, "empty.wav"), "deepgram", 0.5) == (None, None)
+
+    output = str(tmp_path / "out")
+    assert run_benchmark(logs, {"deepgram": replay}, ["deepgram"], output_directory=output) == []
+    [result_file] = [name for name in os.listdir(output) if name.endswith(".json")]
+    with open(os.path.join(output, result_file)) as f:
+        saved = json.load(f)
+
+    results = {os.path.basename(result["recording"]): result for result in saved["results"]}
+    assert results["only_sidecar.wav"]["wer"] is None
+    assert results["with_reference.wav"]["wer"] == 0.25
+    [row] = saved["summary"]
+    assert (row["recordings"], row["scored"], row["wer"]) == (2, 1, 0.25)
+    [(reason, skipped)] = saved["skipped"].items()
+    assert "no transcript" in reason
+    assert [os.path.basename(name) for name in skipped] == ["empty.wav"]
+
+
+def test_missing_responses_are_reported(tmp_path):
+    logs = str(tmp_path / "logs")
+    write_recording(logs, "clip", reference="hello")
+    output = str(tmp_path / "out")
+    run_benchmark(logs, {"deepgram": replay}, ["deepgram"], output_directory=output)
+    [result_file] = [name for name in os.listdir(output) if name.endswith(".json")]
+    with open(os.path.join(output, result_file)) as f:
+        saved = json.load(f)
+    assert saved["results"] == []
+    assert list(saved["skipped"]) == ["deepgram: no recorded responses, run with --live first"]
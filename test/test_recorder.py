@@ -0,0 +1,66 @@
+import threading
+import wave
+
+from audio_capture import AudioCapture
+from recorder import SessionRecorder
+
+
+class FakeStream:
+    # The device: the test publishes the frames itself.
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def frame(index, size=320):
+    return bytes([index % 256]) * size
+
+
+def test_recorder_writes_each_frame_once_with_two_consumers(tmp_path):
+    capture = AudioCapture(1, 16000, 160, open_stream=lambda capture: FakeStream())
+    recorder = SessionRecorder(1, 2, 16000, filename=str(tmp_path / "session.wav"))
+
+    # Two consumers at once, e.g. a dictation session and the vision prompt.
+    received = {}
+    consumers = []
+    for name in ("session", "vision"):
+        recorder.follow(capture)
+        cursor = capture.subscribe()
+        received[name] = []
+        thread = threading.Thread(target=lambda cursor=cursor, name=name: received[name].extend(cursor))
+        thread.start()
+        consumers.append((cursor, thread))
+
+    for index in range(200):
+        capture.publish(frame(index))
+
+    # The vision prompt ends early, the session keeps going and is still recorded.
+    recorder.unfollow()
+    for index in range(200, 300):
+        capture.publish(frame(index))
+    capture.close()
+    for cursor, thread in consumers:
+        thread.join()
+    recorder.unfollow()
+
+    filename = recorder.close()
+    with wave.open(filename) as f:
+        recorded = f.readframes(f.getnframes())
+    assert received["session"] == [frame(index) for index in range(300)]
+    assert recorded == b"".join(frame(index) for index in range(300))
+
+
+def test_unfollow_writes_what_was_captured_before_it(tmp_path):
+    capture = AudioCapture(1, 16000, 160, open_stream=lambda capture: FakeStream())
+    recorder = SessionRecorder(1, 2, 16000, filename=str(tmp_path / "session.wav"))
+    recorder.follow(capture)
+    for index in range(50):
+        capture.publish(frame(index))
+    recorder.unfollow()
+    # Not recorded, nobody is reading the capture any more.
+    capture.publish(frame(50))
+    assert recorder.duration() == 50 * 160 / 16000
+    assert recorder.close() == str(tmp_path / "session.wav")
@@ -0,0 +1,82 @@
+import sqlite3
+import time
+
+from response_cache import ResponseCache
+
+
+def rows(filename):
+    with sqlite3.connect(filename) as db:
+        return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_memory_then_disk_hits(tmp_path):
+    filename = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(filename, version="v1")
+    assert cache.get("hello  world") is None
+    cache.put("hello world", "Hello world.")
+    assert cache.get(" hello world ") == "Hello world."
+    cache.close()
+
+    reopened = ResponseCache(filename, version="v1")
+    assert reopened.get("hello world") == "Hello world."
+    assert reopened.get("hello world") == "Hello world."
+    assert reopened.stats()["diskHits"] == 1 and reopened.stats()["memoryHits"] == 1
+    reopened.close()
+
+    # Another prompt version never sees the old edits.
+    other = ResponseCache(filename, version="v2")
+    assert other.get("hello world") is None
+    other.close()
+
+
+def test_writes_are_committed_behind_in_batches(tmp_path):
+    filename = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(filename)
+    commits = cache.stats()["diskCommits"]
+    for index in range(500):
+        cache.put(f"text {index}", f"response {index}")
+    cache.flush()
+    assert rows(filename) == 500
+    # Far fewer commits than puts, the writer takes everything queued at once.
+    assert cache.stats()["diskCommits"] - commits < 500
+    cache.close()
+
+
+def test_eviction_only_over_capacity_and_least_recently_used_first(tmp_path):
+    filename = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(filename, memory_entries=1, disk_entries=100)
+    for index in range(100):
+        cache.put(f"text {index}", f"response {index}")
+    cache.flush()
+    assert rows(filename) == 100 and cache.stats()["evictions"] == 0
+
+    # Read the oldest entry from disk, so it is the most recently used one.
+    time.sleep(0.01)
+    assert cache.get("text 0") == "response 0"
+    cache.put("text 100", "response 100")
+    cache.flush()
+    # Over the limit once: down to 90% in one go.
+    assert rows(filename) == 90 and cache.stats()["evictions"] == 11
+    cache.close()
+
+    reopened = ResponseCache(filename)
+    assert reopened.get("text 0") == "response 0"
+    assert reopened.get("text 1") is None
+    reopened.close()
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=0.05)
+    cache.put("hello", "Hello.")
+    assert cache.get("hello") == "Hello."
+    time.sleep(0.06)
+    assert cache.get("hello") is None
+    cache.close()
+
+
+def test_memory_only_cache():
+    cache = ResponseCache(None, memory_entries=2)
+    for text in ("a", "b", "c"):
+        cache.put(text, text.upper())
+    assert cache.get("a") is None and cache.get("c") == "C"
+    cache.close()
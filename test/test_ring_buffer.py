@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ring_buffer import BLOCK, DROP_NEWEST, DROP_OLDEST, RingBuffer
+
+
+def drain(ring):
+    items = []
+    while True:
+        try:
+            items.append(ring.get_nowait())
+        except asyncio.QueueEmpty:
+            return items
+
+
+def test_drop_oldest_keeps_the_latest_frames():
+    ring = RingBuffer(4, DROP_OLDEST)
+    for index in range(6):
+        assert ring.put(index)
+    assert drain(ring) == [2, 3, 4, 5]
+    assert ring.stats()["dropped"] == 2 and ring.high_water_mark == 4
+
+
+def test_drop_newest_keeps_the_oldest_frames():
+    ring = RingBuffer(4, DROP_NEWEST)
+    assert [ring.put(index) for index in range(6)] == [True] * 4 + [False] * 2
+    assert drain(ring) == [0, 1, 2, 3]
+    assert ring.dropped == 2 and ring.high_water_mark == 4
+
+
+def test_block_waits_for_the_consumer_then_gives_up():
+    ring = RingBuffer(2, BLOCK, block_timeout=0.05)
+    ring.put(0)
+    ring.put(1)
+    started = time.monotonic()
+    assert not ring.put(2)
+    assert time.monotonic() - started >= 0.05 and ring.dropped == 1
+
+    # A consumer making room lets the producer through.
+    ring.block_timeout = 5
+    threading.Timer(0.05, ring.get_nowait).start()
+    assert ring.put(3)
+    assert drain(ring) == [1, 3]
+
+
+def test_close_releases_a_blocked_producer():
+    ring = RingBuffer(1, BLOCK, block_timeout=5)
+    ring.put(0)
+    threading.Timer(0.05, ring.close).start()
+    started = time.monotonic()
+    assert not ring.put(1)
+    assert time.monotonic() - started < 1
+
+
+def test_get_waits_for_the_producer_thread():
+    ring = RingBuffer(8)
+
+    async def consume():
+        threading.Timer(0.05, ring.put, ("frame",)).start()
+        return await asyncio.wait_for(ring.get(), 1)
+
+    assert asyncio.run(consume()) == "frame"
+
+
+def test_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+    with pytest.raises(ValueError):
+        RingBuffer(4, "drop_everything")
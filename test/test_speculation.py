@@ -0,0 +1,66 @@
+from speculation import Speculation, SpeculationStats, StablePrefix
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def observe_all(tracker, clock, partials, gap=0.1):
+    stable = []
+    for partial in partials:
+        clock.now += gap
+        stable.append(tracker.observe(partial))
+    return stable
+
+
+def test_prefix_is_stable_after_n_updates():
+    clock = Clock()
+    tracker = StablePrefix(updates=3, seconds=10, clock=clock)
+    assert observe_all(tracker, clock, [
+        "hello",
+        "hello there",
+        "hello there fix it",
+        "hello there fix it so",
+        "hello there fix it so more",
+    ]) == ["", "", "hello", "hello there", "hello there fix it"]
+
+
+def test_prefix_is_stable_after_t_seconds():
+    clock = Clock()
+    tracker = StablePrefix(updates=10, seconds=0.3, clock=clock)
+    assert observe_all(tracker, clock, ["one two", "one two three"]) == ["", ""]
+    clock.now += 0.5
+    assert tracker.observe("one two three four") == "one two three"
+
+
+def test_a_word_still_growing_is_not_stable():
+    clock = Clock()
+    tracker = StablePrefix(updates=2, seconds=10, clock=clock)
+    assert observe_all(tracker, clock, ["the cat", "the cats"]) == ["", "the "]
+
+
+def test_revision_shrinks_the_prefix():
+    clock = Clock()
+    tracker = StablePrefix(updates=2, seconds=10, clock=clock)
+    observe_all(tracker, clock, ["one two fix it", "one two fix it now"])
+    assert tracker.observe("one two six it now please") == "one two "
+
+
+def test_early_speculation_keeps_plain_dictation_and_cancels_on_divergence():
+    speculation = Speculation("hello there fix it", early=True)
+    assert speculation.extend("hello there fix it so more", 0.5) == " so more"
+    assert speculation.extend("hello there fix it so more words", 0.5) == " so more words"
+    # The command goes on, or the prefix the call was made for is revised.
+    assert speculation.extend("hello there fix it so more words and delete that", 0.5) is None
+    assert speculation.extend("hello there six it so more words", 0.5) is None
+
+    stats = SpeculationStats()
+    stats.record(speculation)
+    stats.record_miss()
+    assert stats.stats()["hits"] == 1 and stats.stats()["earlyHits"] == 1
+    assert stats.stats()["hitRate"] == 0.5
+    assert stats.stats()["latencySavedSeconds"] >= 0.5
@@ -0,0 +1,243 @@
+import collections
+import json
+import os
+import threading
+import time
+
+# Values are kept in buckets of 1/SUB_BUCKETS of their power of two, about 3% precision.
+SUB_BUCKETS = 32
+_LINEAR_LIMIT = 2 * SUB_BUCKETS
+_SHIFT_OFFSET = _LINEAR_LIMIT.bit_length() - 1
+
+ALL_PROVIDERS = "all"
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    Log-linear (HDR style) histogram of integer microsecond values.
+
+    Values below 64 get their own bucket, larger ones share a bucket with values
+    within ~3% of them, so memory stays small for any range and recording is a
+    couple of integer operations.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def bucket(value):
+        if value < _LINEAR_LIMIT:
+            return value
+        shift = value.bit_length() - _SHIFT_OFFSET
+        return shift * SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def bucket_range(index):
+        # Returns the lowest and highest value that land in bucket `index`.
+        if index < _LINEAR_LIMIT:
+            return index, index
+        shift = index // SUB_BUCKETS - 1
+        lowest = (index - shift * SUB_BUCKETS) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, value):
+        index = self.bucket(value) if value > 0 else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, quantile):
+        """
+        Returns the highest value equivalent to the `quantile` (0-1) sample, or None if empty.
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(round(quantile * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_range(index)[1], self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Count, mean, min, max and quantiles in seconds.
+        """
+        result = {
+            "count": self.count,
+            "mean": self.total / self.count / 1e6 if self.count else None,
+            "min": self.min / 1e6 if self.min is not None else None,
+            "max": self.max / 1e6 if self.max is not None else None,
+        }
+        for quantile in QUANTILES:
+            value = self.percentile(quantile)
+            result[f"p{quantile * 100:g}"] = value / 1e6 if value is not None else None
+        return result
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "provider", "started")
+
+    def __init__(self, tracer, stage, provider):
+        self.tracer = tracer
+        self.stage = stage
+        self.provider = provider
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record_ns(self.stage, time.perf_counter_ns() - self.started, self.provider)
+
+
+class Timeline:
+    """
+    Stamps the stages of one utterance, from captured audio to typed text.
+    Every `mark` records the time since the previous one under the stage name,
+    `finish` records the whole duration as "total".
+
+    Args:
+    - tracer: The Tracer the stages are recorded in.
+    - provider: Transcription provider, stages are kept per provider.
+    - origin: `time.perf_counter_ns()` the utterance started at, e.g. when its last
+      audio chunk was captured. Defaults to now.
+    """
+
+    def __init__(self, tracer, provider, origin=None):
+        self.tracer = tracer
+        self.provider = provider
+        self.started = origin if origin is not None else time.perf_counter_ns()
+        self.last = self.started
+        self.marks = []
+
+    def mark(self, stage):
+        now = time.perf_counter_ns()
+        self.tracer.record_ns(stage, now - self.last, self.provider)
+        self.marks.append((stage, (now - self.started) / 1e9))
+        self.last = now
+
+    def finish(self):
+        self.tracer.record_ns("total", self.last - self.started, self.provider)
+        self.tracer.timelines.append({"provider": self.provider, "stages": self.marks})
+
+    def cancel(self):
+        """
+        The utterance was superseded, its stages so far stay recorded but it has no total.
+        """
+        self.tracer.cancelled += 1
+
+
+class Tracer:
+    """
+    Per stage and provider latency histograms for the dictation pipeline.
+
+    Args:
+    - keep_timelines: How many finished utterance timelines are kept for export.
+    """
+
+    def __init__(self, keep_timelines=100):
+        self.histograms = {}
+        self.timelines = collections.deque(maxlen=keep_timelines)
+        self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def record_ns(self, stage, nanoseconds, provider=ALL_PROVIDERS):
+        key = (stage, provider)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.record(nanoseconds // 1000)
+
+    def record(self, stage, seconds, provider=ALL_PROVIDERS):
+        self.record_ns(stage, int(seconds * 1e9), provider)
+
+    def span(self, stage, provider=ALL_PROVIDERS):
+        """
+        Context manager that records the time spent in its block.
+        """
+        return _Span(self, stage, provider)
+
+    def timeline(self, provider, origin=None):
+        return Timeline(self, provider, origin)
+
+    def snapshot(self):
+        with self._lock:
+            stages = [
+                dict(stage=stage, provider=provider, **histogram.summary())
+                for (stage, provider), histogram in sorted(self.histograms.items())
+            ]
+            timelines = list(self.timelines)
+        return {"stages": stages, "cancelledUtterances": self.cancelled, "recentUtterances": timelines}
+
+    def prometheus(self):
+        lines = [
+            "# HELP dictation_stage_seconds Time spent in each dictation pipeline stage.",
+            "# TYPE dictation_stage_seconds summary",
+        ]
+        with self._lock:
+            for (stage, provider), histogram in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",provider="{provider}"'
+                for quantile in QUANTILES:
+                    lines.append(f'dictation_stage_seconds{{{labels},quantile="{quantile:g}"}} {histogram.percentile(quantile) / 1e6:.6f}')
+                lines.append(f"dictation_stage_seconds_sum{{{labels}}} {histogram.total / 1e6:.6f}")
+                lines.append(f"dictation_stage_seconds_count{{{labels}}} {histogram.count}")
+        lines.append("# TYPE dictation_cancelled_utterances_total counter")
+        lines.append(f"dictation_cancelled_utterances_total {self.cancelled}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        """
+        Writes the histograms to `filename`, in Prometheus text format for a .prom
+        file and as JSON otherwise. Returns the filename.
+        """
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, "w") as f:
+            if filename.endswith(".prom"):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        return filename
+
+
+# Shared by the whole app.
+tracer = Tracer()
+
+
+if __name__ == "__main__":
+    events = 200_000
+    benchmark = Tracer()
+    started = time.perf_counter()
+    for i in range(events):
+        benchmark.record_ns("stage", i * 997)
+    record_cost = (time.perf_counter() - started) / events
+    started = time.perf_counter()
+    for _ in range(events):
+        with benchmark.span("span"):
+            pass
+    span_cost = (time.perf_counter() - started) / events
+    started = time.perf_counter()
+    timeline = benchmark.timeline("provider")
+    for _ in range(events):
+        timeline.mark("mark")
+    mark_cost = (time.perf_counter() - started) / events
+    print(f"record {record_cost * 1e6:.2f} us, span {span_cost * 1e6:.2f} us, timeline mark {mark_cost * 1e6:.2f} us per event")
+
+    histogram = benchmark.histograms[("stage", ALL_PROVIDERS)]
+    for quantile in (0.5, 0.99):
+        exact = int(quantile * events) * 997 // 1000
+        print(f"p{quantile * 100:g}: {histogram.percentile(quantile)} us (exact {exact} us)")
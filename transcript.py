@@ -0,0 +1,73 @@
+from collections import deque
+
+# How many earlier states of the editor a Transcript keeps to go back to.
+CHECKPOINTS = 64
+
+
+class Transcript:
+    """
+    What the provider has transcribed so far (the raw transcript) and what is on the
+    editor for it, after commands. `transcript_on_editor` is (location, text): the
+    editor shows `text` for the raw transcript up to `location`, anything the raw
+    transcript has after that is typed as it is.
+
+    A new raw transcript normally continues the last one. When it does not, because
+    the provider revised words that are already typed or another provider took over,
+    `rebase` goes back to the latest state it still continues, so the differing words
+    are replaced rather than spliced in at the old location.
+    """
+
+    def __init__(self, checkpoints=CHECKPOINTS):
+        self.raw_transcript = ""
+        self.transcript_on_editor = (0, "")
+        # (raw transcript up to the location, transcript_on_editor) after every edit.
+        self.checkpoints = deque(maxlen=checkpoints)
+
+    # This will be called by the callback
+    def getTranscriptOnEditor(self):
+        return self.transcript_on_editor[1]
+
+    def setTranscriptOnEditor(self, transcript, location):
+        self.transcript_on_editor = (location, transcript)
+
+    def getRawTranscript(self):
+        return self.raw_transcript
+
+    def setRawTranscript(self, raw_transcript):
+        self.raw_transcript = raw_transcript
+
+    def transcriptAfterCommands(self, transcript_from_server):
+        transcript_from_server = self.transcript_on_editor[1] + transcript_from_server[self.transcript_on_editor[0]:]
+        return transcript_from_server
+
+    def isTranscriptProcessed(self, raw_transcript):
+        return self.raw_transcript == raw_transcript
+
+    def checkpoint(self):
+        """
+        Remembers the current state as one to go back to, once the editor shows it.
+        """
+        location = self.transcript_on_editor[0]
+        self.checkpoints.append((self.raw_transcript[:location], self.transcript_on_editor))
+
+    def continues(self, transcript_from_server):
+        return transcript_from_server.startswith(self.raw_transcript[:self.transcript_on_editor[0]])
+
+    def rebase(self, transcript_from_server):
+        """
+        Goes back to the latest checkpoint that `transcript_from_server` continues, or to
+        the start when there is none. Returns False if it already continues the current
+        state and nothing changed.
+        """
+        if self.continues(transcript_from_server):
+            return False
+        while self.checkpoints:
+            raw, transcript_on_editor = self.checkpoints[-1]
+            if transcript_from_server.startswith(raw):
+                self.transcript_on_editor = transcript_on_editor
+                self.raw_transcript = raw
+                return True
+            self.checkpoints.pop()
+        self.transcript_on_editor = (0, "")
+        self.raw_transcript = ""
+        return True
@@ -1,74 +1,94 @@
 import wave
-import json
+import mmap
+import struct
 
-def save_frames_to_file(frames, channels, sample_width, frame_rate, filename):
+class MappedWav:
     """
-    Saves audio frames to a WAV file.
+    Memory-maps a PCM WAV file and exposes its sample data as a memoryview,
+    so it can be streamed in slices without reading or copying the file.
 
     Args:
-    - frames: A list of audio frames.
-    - channels: Number of audio channels.
-    - sample_width: Sample width in bytes.
-    - frame_rate: Frame rate in Hz.
-    - filename: The name of the file to save the audio to.
+    - filename: Path to the WAV file.
     """
-    try:
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(channels)
-            wf.setsampwidth(sample_width)
-            wf.setframerate(frame_rate)
-            wf.writeframes(b''.join(frames))
-    except Exception as e:
-        print(f"Failed to save frames to file: {e}")
 
-def save_frames_and_transcription(frames, channels, sample_width, frame_rate, transcription, provider, satisfaction='y'):
-    print("The transcription is", transcription)
+    def __init__(self, filename):
+        self._file = open(filename, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files.
+            self._file.close()
+            raise wave.Error(f"{filename} is empty")
+        if self._mmap[:4] != b"RIFF" or self._mmap[8:12] != b"WAVE":
+            self.close()
+            raise wave.Error(f"{filename} is not a RIFF/WAVE file")
+
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(self._mmap):
+            chunk_id = self._mmap[offset:offset + 4]
+            chunk_size = struct.unpack("<I", self._mmap[offset + 4:offset + 8])[0]
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", self._mmap[body:body + 16])
+            elif chunk_id == b"data":
+                if fmt is None:
+                    break
+                # Crash-truncated recordings (see recorder.recover_wav) may claim zero
+                # or more data than the file holds, so fall back to the end of the file.
+                end = body + chunk_size
+                if chunk_size == 0 or end > len(self._mmap):
+                    end = len(self._mmap)
+                self.channels = fmt[1]
+                self.sample_rate = fmt[2]
+                self.sample_width = fmt[5] // 8
+                self.data = memoryview(self._mmap)[body:end]
+                return
+            offset = body + chunk_size + (chunk_size & 1)
+        self.close()
+        raise wave.Error(f"{filename} has no fmt/data chunk")
+
+    def close(self):
+        data = getattr(self, "data", None)
+        if data is not None:
+            data.release()
+            self.data = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def save_recording_and_transcription(recorder, transcription, provider, satisfaction='y', archive=None):
     """
-    Saves audio frames to a WAV file and transcription to a JSON file with camelCase naming convention.
-    The file name is derived from the transcription.
+    Finalises a SessionRecorder and adds its audio, compressed, and the full transcription
+    to the session archive (see archive.py). Returns the session id, or None if nothing was recorded.
 
     Args:
-    - frames: A list of audio frames.
-    - channels: Number of audio channels.
-    - sample_width: Sample width in bytes.
-    - frame_rate: Frame rate in Hz.
+    - recorder: The SessionRecorder that captured the session.
     - transcription: The transcription text of the audio.
+    - provider: The transcription provider used.
+    - satisfaction: The user's satisfaction flag.
+    - archive: The SessionArchive to add to, defaults to logs/archive.
     """
+    print("The transcription is", transcription)
     try:
         import os
-        from datetime import datetime
-
-        # Create a directory with the current date
-        date_directory = datetime.now().strftime("%Y-%m-%d")
-        os.makedirs(f'logs/{date_directory}', exist_ok=True)
-
-        # Generate filenames with the current hour timestamp appended
-        current_time = datetime.now().strftime("%H-%M_")
-        filename_base = ''.join(x for x in transcription.title() if not x.isspace())
-        if len(filename_base) > 250:
-            filename_base = filename_base[:248] + "..."
-        wav_filename = f'logs/{date_directory}/{current_time}{satisfaction}-{filename_base}.wav'
-        json_filename = f'logs/{date_directory}/{current_time}{satisfaction}-{filename_base}.json'
-
-        # Save the frames to a WAV file
-        save_frames_to_file(frames, channels, sample_width, frame_rate, wav_filename)
-
-        # Create a dictionary with the audio file details
-        audio_details = {
-            "channels": channels,
-            "sampleWidth": sample_width,
-            "frameRate": frame_rate,
-            "provider": provider,
-            "satisfaction": satisfaction,
-            "transcript": transcription if len(transcription) <= 250 else transcription[:248] + "..."
-        }
+        from archive import SessionArchive
 
-        # Save the dictionary to a JSON file
-        with open(json_filename, 'w') as json_file:
-            json.dump(audio_details, json_file)
+        recorded_filename = recorder.close()
+        if recorded_filename is None:
+            return None
+        archive = archive or SessionArchive()
+        session_id = archive.add(recorded_filename, transcription, provider, satisfaction)
+        os.remove(recorded_filename)
+        print(f"🟢 Session saved to the archive as {session_id[:12]}")
+        return session_id
     except Exception as e:
-        print(f"Failed to save frames and transcription: {e}")
-import pyautogui
+        print(f"Failed to save recording and transcription: {e}")
 import datetime
 import os
 
@@ -78,6 +98,7 @@ def take_screenshot():
     """
     import base64
     from io import BytesIO
+    import pyautogui
 
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     screenshot_directory = "screenshot"
@@ -0,0 +1,131 @@
+import collections
+
+import numpy as np
+
+# Analysis frame inside each captured chunk.
+FRAME_SECONDS = 0.02
+# Digital silence would otherwise drag the floor down to the log clamp and open the gate on any hiss.
+MIN_NOISE_FLOOR_DB = -70.0
+
+
+class VoiceActivityGate:
+    """
+    Energy based voice activity gate for 16-bit PCM chunks.
+
+    Every chunk is split into short frames and scored with NumPy on RMS energy (dBFS)
+    and zero-crossing rate. The noise floor follows the quietest frames, so the
+    threshold adapts to the room instead of only catching digital silence.
+    Chunks are released once speech starts, together with a pre-roll of the chunks
+    just before it, and keep flowing for a hangover period after it stops.
+
+    Args:
+    - sample_rate: Sample rate of the incoming audio.
+    - channels: Number of interleaved channels.
+    - margin_db: How far above the noise floor a frame has to be to count as speech.
+    - zcr_margin_db: Smaller margin used for noisy, high zero-crossing frames (fricatives like "s", "f").
+    - hangover: Seconds of audio still sent after the last speech frame.
+    - pre_roll: Seconds of audio before speech onset that is sent along with it.
+    - floor_db: Initial noise floor estimate, taken from the first chunk when None.
+    """
+
+    def __init__(self, sample_rate, channels=1, margin_db=12.0, zcr_margin_db=6.0, hangover=1.0, pre_roll=0.5, floor_db=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.margin_db = margin_db
+        self.zcr_margin_db = zcr_margin_db
+        self.hangover = hangover
+        self.pre_roll = pre_roll
+        self.noise_floor_db = floor_db
+        self.frame_length = max(1, int(sample_rate * FRAME_SECONDS))
+        self.in_speech = False
+        self.end_of_speech = False
+        self.speech_paused = False
+        self._silence_since_speech = 0.0
+        self._pre_roll_chunks = collections.deque()
+        self._pre_roll_seconds = 0.0
+        self.chunks_in = 0
+        self.chunks_out = 0
+
+    def _features(self, chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        if self.channels > 1:
+            samples = samples[: len(samples) - len(samples) % self.channels].reshape(-1, self.channels).mean(axis=1)
+        samples = samples.astype(np.float32) / 32768.0
+        frames = len(samples) // self.frame_length
+        if frames == 0:
+            frames, frame_length = 1, len(samples)
+        else:
+            frame_length = self.frame_length
+        framed = samples[: frames * frame_length].reshape(frames, frame_length)
+        rms = np.sqrt(np.mean(framed * framed, axis=1))
+        energy_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+        signs = np.signbit(framed)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frame_length - 1)
+        return energy_db, zcr
+
+    def _update_noise_floor(self, energy_db):
+        quietest = float(np.percentile(energy_db, 10))
+        if self.noise_floor_db is None:
+            self.noise_floor_db = quietest
+        elif quietest < self.noise_floor_db:
+            # Fall quickly when the room gets quieter.
+            self.noise_floor_db = 0.5 * self.noise_floor_db + 0.5 * quietest
+        else:
+            # Rise slowly so sustained speech does not become the floor.
+            self.noise_floor_db = 0.9 * self.noise_floor_db + 0.1 * quietest
+        self.noise_floor_db = max(self.noise_floor_db, MIN_NOISE_FLOOR_DB)
+
+    def is_speech(self, chunk):
+        """
+        Scores a chunk and updates the noise floor. Returns True if any frame looks like speech.
+        """
+        if not chunk:
+            return False
+        energy_db, zcr = self._features(chunk)
+        if self.noise_floor_db is None:
+            self._update_noise_floor(energy_db)
+        speech = (energy_db > self.noise_floor_db + self.margin_db) | (
+            (zcr > 0.25) & (energy_db > self.noise_floor_db + self.zcr_margin_db)
+        )
+        self._update_noise_floor(energy_db)
+        return bool(speech.any())
+
+    def process(self, chunk):
+        """
+        Feeds one captured chunk through the gate.
+
+        Returns the list of chunks that should be sent upstream, which is empty while
+        the gate is closed and includes the buffered pre-roll when it opens.
+        `speech_paused` is True for the first silent chunk after speech and
+        `end_of_speech` for the chunk on which the hangover ran out.
+        """
+        self.chunks_in += 1
+        self.end_of_speech = False
+        self.speech_paused = False
+        duration = len(chunk) / (2 * self.channels * self.sample_rate)
+
+        if self.is_speech(chunk):
+            self._silence_since_speech = 0.0
+            if not self.in_speech:
+                self.in_speech = True
+                output = list(self._pre_roll_chunks) + [chunk]
+                self._pre_roll_chunks.clear()
+                self._pre_roll_seconds = 0.0
+            else:
+                output = [chunk]
+        elif self.in_speech:
+            self.speech_paused = self._silence_since_speech == 0.0
+            self._silence_since_speech += duration
+            output = [chunk]
+            if self._silence_since_speech >= self.hangover:
+                self.in_speech = False
+                self.end_of_speech = True
+        else:
+            self._pre_roll_chunks.append(chunk)
+            self._pre_roll_seconds += duration
+            while len(self._pre_roll_chunks) > 1 and self._pre_roll_seconds - len(self._pre_roll_chunks[0]) / (2 * self.channels * self.sample_rate) >= self.pre_roll:
+                self._pre_roll_seconds -= len(self._pre_roll_chunks.popleft()) / (2 * self.channels * self.sample_rate)
+            output = []
+
+        self.chunks_out += len(output)
+        return output